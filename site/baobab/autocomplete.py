@@ -0,0 +1,467 @@
+"""In-process autocomplete of the names and subjects vocabularies.
+
+Each process keeps a prefix index of the vocabularies in memory: a sorted
+array of the accent folded words of each entry, searched by bisection, so
+that a suggestion costs no request to the search cluster. Each process
+holds its own copy, so only the vocabularies of
+``BAOBAB_AUTOCOMPLETE_IN_MEMORY`` are indexed; the others are searched.
+
+Indexes are built in a background thread, started by the first search of
+the vocabulary in the process; searches are sent to the search cluster
+until the index is ready. The deposit form suggests names and subjects
+through the REST API searches (``/api/names?suggest=``), whose views are
+wrapped to answer from the index as well (see :py:func:`wrap_suggest_views`).
+Changes to the vocabularies are published on a
+Redis channel once committed; each process listens to the channel from a
+background thread, and rebuilds the changed indexes once changes stop
+arriving for ``BAOBAB_AUTOCOMPLETE_REBUILD_DELAY`` seconds, while requests
+keep being served from the previous index. Without Redis, only the process
+that changed the vocabulary rebuilds its index.
+"""
+
+import json
+import re
+import threading
+import unicodedata
+from array import array
+from bisect import bisect_left
+from functools import lru_cache, wraps
+
+from flask import current_app, g, request
+from invenio_db import db
+from invenio_records_resources.proxies import current_service_registry
+from redis import StrictRedis
+from sqlalchemy import event, null
+from werkzeug.utils import import_string
+
+CHANNEL = "baobab:autocomplete"
+"""Redis channel of the changed vocabularies."""
+
+_SEPARATORS = re.compile(r"[\W_]+")
+
+_LETTERS = str.maketrans(
+    {
+        "ø": "o",
+        "ł": "l",
+        "đ": "d",
+        "ð": "d",
+        "þ": "th",
+        "æ": "ae",
+        "œ": "oe",
+        "ı": "i",
+    }
+)
+"""Letters without a decomposition to a base letter."""
+
+
+def fold(text):
+    """Fold the case and the accents of a text, and normalize its separators.
+
+    >>> fold("Gödel, Kurt")
+    'godel kurt'
+    """
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return _SEPARATORS.sub(" ", text.translate(_LETTERS)).strip()
+
+
+def name_entry(data):
+    """Get the suggestion and the indexed text of a name."""
+    hit = {
+        key: data[key]
+        for key in ("id", "name", "given_name", "family_name", "identifiers")
+        if data.get(key)
+    }
+    # vocabulary affiliations are stored by id, their name is added when found
+    affiliations = [
+        {key: a[key] for key in ("id", "name") if a.get(key)}
+        for a in data.get("affiliations", [])
+        if a.get("id") or a.get("name")
+    ]
+    if affiliations:
+        hit["affiliations"] = affiliations
+    keys = ("name", "given_name", "family_name")
+    text = " ".join(data.get(key) or "" for key in keys)
+    return hit, text
+
+
+def subject_entry(data):
+    """Get the suggestion and the indexed text of a subject."""
+    hit = {key: data.get(key) for key in ("id", "subject", "scheme")}
+    return hit, data.get("subject") or ""
+
+
+VOCABULARIES = {
+    "names": (
+        "invenio_vocabularies.contrib.names.api:Name",
+        name_entry,
+    ),
+    "subjects": (
+        "invenio_vocabularies.contrib.subjects.api:Subject",
+        subject_entry,
+    ),
+}
+"""Autocompleted vocabularies: record class and entry function."""
+
+AFFILIATIONS = "invenio_vocabularies.contrib.affiliations.api:Affiliation"
+"""Record class of the affiliations of the names."""
+
+SUGGEST_ROUTES = {"/names": "names", "/subjects": "subjects"}
+"""REST API search routes of the autocompleted vocabularies."""
+
+
+class PrefixIndex(object):
+    """Prefix index of the entries of a vocabulary.
+
+    Each folded word of an entry is a key of a sorted array; the entries of
+    a prefix are a contiguous slice of the array. Hits are kept as JSON, and
+    the words of each entry as a single string, to keep the index compact.
+
+    :param entries: Iterable of ``(hit, text)``, see :py:func:`name_entry`.
+    """
+
+    def __init__(self, entries):
+        """Build the index."""
+        self.hits = []
+        self.words = []
+        keys = []
+        for hit, text in entries:
+            words = sorted(set(fold(text).split()))
+            if not words:
+                continue
+            position = len(self.hits)
+            self.hits.append(json.dumps(hit, separators=(",", ":")))
+            self.words.append(" ".join(words))
+            keys.extend((word, position) for word in words)
+        keys.sort()
+        self.keys = [word for word, _ in keys]
+        self.positions = array("L", (position for _, position in keys))
+
+    def __len__(self):
+        """Get the number of entries."""
+        return len(self.hits)
+
+    def search(self, query, size=10, accept=None):
+        """Get the entries whose words start with each word of a query.
+
+        Entries are looked up by the longest word of the query, and ordered
+        by the indexed word it matched.
+
+        :param accept: Function filtering the hits, or ``None``.
+        :returns: List of hits, at most ``size`` long.
+        """
+        tokens = fold(query).split()
+        if not tokens:
+            return []
+        tokens.sort(key=len, reverse=True)
+        prefix, others = tokens[0], tokens[1:]
+        found, seen = [], set()
+        for index in range(bisect_left(self.keys, prefix), len(self.keys)):
+            if len(found) >= size or not self.keys[index].startswith(prefix):
+                break
+            position = self.positions[index]
+            if position in seen:
+                continue
+            seen.add(position)
+            words = self.words[position].split()
+            if not all(any(w.startswith(t) for w in words) for t in others):
+                continue
+            hit = json.loads(self.hits[position])
+            if accept is None or accept(hit):
+                found.append(hit)
+        return found
+
+
+def load_index(vocabulary):
+    """Build the index of a vocabulary from the database."""
+    record_cls, entry = VOCABULARIES[vocabulary]
+    model_cls = import_string(record_cls).model_cls
+    # the id of names is stored in a column, not in the data
+    pid_column = getattr(model_cls, "pid", null())
+    rows = db.session.query(model_cls.json, pid_column).yield_per(1000)
+    # deleted records have no data
+    return PrefixIndex(
+        entry({"id": pid, **data} if pid else data) for data, pid in rows if data
+    )
+
+
+def add_affiliation_names(hits):
+    """Add the names of the vocabulary affiliations of names hits."""
+    ids = {
+        affiliation["id"]
+        for hit in hits
+        for affiliation in hit.get("affiliations", [])
+        if "name" not in affiliation
+    }
+    if not ids:
+        return
+    model_cls = import_string(AFFILIATIONS).model_cls
+    rows = db.session.query(model_cls.pid, model_cls.json).filter(
+        model_cls.pid.in_(ids)
+    )
+    names = {pid: data.get("name") for pid, data in rows if data}
+    for hit in hits:
+        for affiliation in hit.get("affiliations", []):
+            if "name" not in affiliation and names.get(affiliation["id"]):
+                affiliation["name"] = names[affiliation["id"]]
+
+
+def suggest(vocabulary, query, size=10):
+    """Suggest entries of a vocabulary from the in-process index.
+
+    As in the search of the vocabulary, subjects can be filtered by scheme
+    with a ``scheme:`` prefix (e.g. ``MeSH,FOS:cancer``).
+
+    :returns: List of hits, or ``None`` if the vocabulary is not in
+        ``BAOBAB_AUTOCOMPLETE_IN_MEMORY`` or its index is not built yet.
+    """
+    if vocabulary not in current_app.config["BAOBAB_AUTOCOMPLETE_IN_MEMORY"]:
+        return None
+    accept = None
+    if vocabulary == "subjects" and ":" in query:
+        schemes, query = query.split(":", 1)
+        schemes = set(schemes.split(","))
+
+        def accept(hit):
+            return hit.get("scheme") in schemes
+
+    hits = get_autocomplete().search(vocabulary, query, size=size, accept=accept)
+    if hits is not None and vocabulary == "names":
+        add_affiliation_names(hits)
+    return hits
+
+
+def search_vocabulary(identity, vocabulary, query, size=10):
+    """Suggest entries of a vocabulary from the search cluster.
+
+    Hits have the same fields as the hits of the in-process index.
+    """
+    _, entry = VOCABULARIES[vocabulary]
+    result = current_service_registry.get(vocabulary).search(
+        identity, params={"suggest": query, "size": size}
+    )
+    return [entry(hit)[0] for hit in result.hits]
+
+
+class Autocomplete(object):
+    """Prefix indexes of the vocabularies of the process.
+
+    :param app: Application, to build the indexes from background threads.
+    :param redis: Redis client to publish and receive the changes.
+    :param delay: Seconds without changes before rebuilding an index.
+    """
+
+    def __init__(self, app, redis=None, delay=5):
+        """Initialize the indexes."""
+        self.app = app
+        self.redis = redis
+        self.delay = delay
+        self._indexes = {}
+        self._building = set()
+        self._lock = threading.Lock()
+        self._listener = None
+
+    def index(self, vocabulary):
+        """Get the index of a vocabulary.
+
+        The first call starts building the index in a background thread.
+
+        :returns: The :py:class:`PrefixIndex`, or ``None`` until it is built.
+        """
+        index = self._indexes.get(vocabulary)
+        if index is None:
+            self._listen()
+            self.build(vocabulary, background=True)
+        return index
+
+    def search(self, vocabulary, query, size=10, accept=None):
+        """Suggest entries of a vocabulary for a query.
+
+        :param accept: Function filtering the hits, or ``None``.
+        :returns: List of hits, or ``None`` until the index is built.
+        """
+        index = self.index(vocabulary)
+        if index is None:
+            return None
+        return index.search(query, size=size, accept=accept)
+
+    def build(self, vocabulary, background=False):
+        """Build or rebuild the index of a vocabulary.
+
+        Requests are served from the previous index in the meantime. Does
+        nothing if the index is already being built.
+        """
+        with self._lock:
+            if vocabulary in self._building:
+                return
+            self._building.add(vocabulary)
+        if background:
+            threading.Thread(
+                target=self._build,
+                args=(vocabulary,),
+                name=f"baobab-autocomplete-{vocabulary}",
+                daemon=True,
+            ).start()
+        else:
+            self._build(vocabulary)
+
+    def _build(self, vocabulary):
+        """Build the index of a vocabulary, in its own application context."""
+        try:
+            with self.app.app_context():
+                try:
+                    self._indexes[vocabulary] = load_index(vocabulary)
+                except Exception:
+                    current_app.logger.exception(
+                        f"Error building the {vocabulary} autocomplete index."
+                    )
+                finally:
+                    db.session.remove()
+        finally:
+            with self._lock:
+                self._building.discard(vocabulary)
+
+    def rebuild(self, vocabularies, background=False):
+        """Rebuild the built indexes of vocabularies."""
+        for vocabulary in vocabularies:
+            if vocabulary in self._indexes:
+                self.build(vocabulary, background=background)
+
+    def publish(self, vocabularies):
+        """Publish that vocabularies changed, to all processes."""
+        if self.redis is None:
+            self.rebuild(vocabularies, background=True)
+            return
+        for vocabulary in vocabularies:
+            self.redis.publish(CHANNEL, vocabulary)
+
+    def _listen(self):
+        """Start the listener thread of the process, if not running."""
+        if self.redis is None or (self._listener and self._listener.is_alive()):
+            return
+        with self._lock:
+            if self._listener and self._listener.is_alive():
+                return
+            self._listener = threading.Thread(
+                target=self._run, name="baobab-autocomplete", daemon=True
+            )
+            self._listener.start()
+
+    def _run(self):
+        """Rebuild the indexes of the vocabularies changed in other processes."""
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        try:
+            pubsub.subscribe(CHANNEL)
+            changed = set()
+            while True:
+                message = pubsub.get_message(timeout=self.delay)
+                if message is not None:
+                    changed.add(message["data"].decode("utf-8"))
+                elif changed:
+                    self.rebuild(changed)
+                    changed = set()
+        except Exception:
+            # restarted by the next search
+            self.app.logger.exception("Autocomplete listener stopped.")
+        finally:
+            pubsub.close()
+
+
+@lru_cache(maxsize=None)
+def _autocomplete(app, url, delay):
+    """Get the autocomplete indexes of the process."""
+    redis = StrictRedis.from_url(url) if url else None
+    return Autocomplete(app, redis=redis, delay=delay)
+
+
+def get_autocomplete():
+    """Get the autocomplete indexes of the process.
+
+    Uses ``BAOBAB_AUTOCOMPLETE_REDIS_URL``, or ``CACHE_REDIS_URL`` if not set.
+    """
+    config = current_app.config
+    url = config["BAOBAB_AUTOCOMPLETE_REDIS_URL"] or config.get("CACHE_REDIS_URL")
+    return _autocomplete(
+        current_app._get_current_object(),
+        url,
+        config["BAOBAB_AUTOCOMPLETE_REBUILD_DELAY"],
+    )
+
+
+@lru_cache(maxsize=None)
+def _changed(vocabulary):
+    """Get the mapper event receiver recording the changes of a vocabulary."""
+
+    def receiver(mapper, connection, target):
+        session = db.session()
+        changed = session.info.setdefault("baobab_autocomplete_changed", set())
+        if not changed:
+            event.listen(session, "after_commit", _publish_changed, once=True)
+            event.listen(session, "after_rollback", _discard_changed, once=True)
+        changed.add(vocabulary)
+
+    return receiver
+
+
+def _publish_changed(session):
+    """Publish the vocabularies changed by the committed transaction."""
+    changed = session.info.pop("baobab_autocomplete_changed", set())
+    try:
+        get_autocomplete().publish(changed)
+    except Exception:
+        current_app.logger.exception("Error publishing vocabulary changes.")
+
+
+def _discard_changed(session):
+    """Forget the changes of a rolled back transaction."""
+    session.info.pop("baobab_autocomplete_changed", None)
+
+
+def watch_vocabularies():
+    """Publish the changes of the autocompleted vocabularies once committed."""
+    for vocabulary, (record_cls, _) in VOCABULARIES.items():
+        model_cls = import_string(record_cls).model_cls
+        receiver = _changed(vocabulary)
+        for name in ("after_insert", "after_update", "after_delete"):
+            if not event.contains(model_cls, name, receiver):
+                event.listen(model_cls, name, receiver)
+
+
+def suggest_view(vocabulary, view):
+    """Wrap the REST API search view of a vocabulary.
+
+    Searches with only a ``suggest`` query (and ``size``) are answered from
+    the in-process index once it is built; the others go to ``view``.
+    """
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        params = request.args
+        if (
+            params.get("suggest")
+            and set(params) <= {"suggest", "size", "page"}
+            and params.get("page", "1") == "1"
+        ):
+            current_service_registry.get(vocabulary).require_permission(
+                g.identity, "search"
+            )
+            size = params.get("size", 10, type=int)
+            size = max(1, min(size, current_app.config["BAOBAB_AUTOCOMPLETE_MAX_SIZE"]))
+            hits = suggest(vocabulary, params["suggest"], size=size)
+            if hits is not None:
+                return {"hits": {"hits": hits, "total": len(hits)}}
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
+def wrap_suggest_views(app):
+    """Answer the suggestions of the REST API searches from the indexes.
+
+    Must be called once the blueprints are registered.
+    """
+    for rule in app.url_map.iter_rules():
+        vocabulary = SUGGEST_ROUTES.get(rule.rule)
+        if vocabulary is not None and "GET" in rule.methods:
+            view = app.view_functions[rule.endpoint]
+            app.view_functions[rule.endpoint] = suggest_view(vocabulary, view)
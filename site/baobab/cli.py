@@ -0,0 +1,458 @@
+"""Command line interface of BAOBAB."""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+from flask.cli import with_appcontext
+from invenio_db import db
+from invenio_pidstore.models import PersistentIdentifier, PIDStatus
+from invenio_rdm_records.proxies import current_rdm_records_service
+from invenio_search import current_search_client
+from invenio_search.engine import dsl
+
+from .oai.tasks import render_oai_records
+from .pidslink.models import ARKDrift, ARKDriftStatus, JobCheckpoint
+from .pidslink.provider import get_provider
+from .pidslink.reconcile import reconcile as reconcile_arks
+from .pidslink.retarget import retarget as retarget_arks
+from .pidslink.tasks import reconcile_arks as reconcile_arks_task
+from .pidslink.tasks import retarget_arks as retarget_arks_task
+from .pidslink_service.async_client import PIDsLinkAsyncRESTClient
+from .pidslink_service.errors import PIDsLinkError
+from .pidslink_service.ratelimit import BATCH, request_priority
+from .sitemap.tasks import generate_sitemaps, update_sitemap_entries
+
+
+@click.group()
+def baobab():
+    """BAOBAB commands."""
+
+
+@baobab.group()
+def pidslink():
+    """PIDsLink ARK commands."""
+
+
+def _records_without_ark(after=None, batch_size=500):
+    """Stream the published public records without an ARK, by batches.
+
+    Records are sorted by id and paged with ``search_after``, so that a run
+    can resume after the last processed id.
+
+    :returns: Iterator of lists of search hits.
+    """
+    index = current_rdm_records_service.record_cls.index.search_alias
+    search = (
+        dsl.Search(using=current_search_client, index=index)
+        .filter("term", is_deleted=False)
+        .filter("term", **{"access.record": "public"})
+        .exclude("exists", field="pids.ark")
+        .sort("id")
+        .source(["id", "uuid"])
+        .extra(size=batch_size)
+    )
+    while True:
+        page = search.extra(search_after=[after]) if after else search
+        hits = page.execute().hits
+        if not hits:
+            return
+        yield hits
+        after = hits[-1].id
+
+
+def _count_without_ark():
+    """Count the published public records without an ARK."""
+    index = current_rdm_records_service.record_cls.index.search_alias
+    return (
+        dsl.Search(using=current_search_client, index=index)
+        .filter("term", is_deleted=False)
+        .filter("term", **{"access.record": "public"})
+        .exclude("exists", field="pids.ark")
+        .count()
+    )
+
+
+@pidslink.command("backfill")
+@click.option("--batch-size", default=500, show_default=True, help="Records per batch.")
+@click.option(
+    "--concurrency",
+    type=int,
+    default=None,
+    help="Concurrent PIDsLink requests [default: PIDSLINK_MAX_CONCURRENCY].",
+)
+@click.option("--limit", type=int, default=None, help="Stop after this many records.")
+@click.option(
+    "--restart", is_flag=True, help="Ignore the checkpoint and start over."
+)
+@click.option(
+    "--dry-run",
+    is_flag=True,
+    help="Do not mint anything, estimate the throughput instead.",
+)
+@click.option(
+    "--checkpoint",
+    "checkpoint_name",
+    default="pidslink-backfill",
+    show_default=True,
+    help="Name of the checkpoint of the run.",
+)
+@with_appcontext
+def backfill(batch_size, concurrency, limit, restart, dry_run, checkpoint_name):
+    """Mint ARKs for the published records without one.
+
+    Records are streamed from the search index by batches. The ARKs of a
+    batch are minted concurrently, then the PIDs, records (and the drafts of
+    the records being edited) and PIDsLink outbox are written in one
+    transaction together with the checkpoint, so an interrupted run resumes
+    after the last completed batch. Records whose ARK could not be minted
+    are saved in the checkpoint, and retried first by the next run.
+    """
+    provider = get_provider()
+    client = provider.client
+    concurrency = concurrency or client.cfg("max_concurrency", 16)
+
+    if dry_run:
+        return _estimate(client, batch_size, concurrency, limit)
+
+    if restart:
+        JobCheckpoint.clear(checkpoint_name)
+        db.session.commit()
+    state = JobCheckpoint.load(checkpoint_name)
+    state.setdefault("minted", 0)
+    retry, failed = state.get("retry", []), []
+    if state.get("after"):
+        click.secho(f"Resuming after record {state['after']}.", fg="yellow")
+    if retry:
+        click.secho(f"Retrying {len(retry)} failed records first.", fg="yellow")
+
+    def _batches():
+        """Batches of ``(record uuid, record id)``, the failed records first."""
+        for start in range(0, len(retry), batch_size):
+            yield [(uuid, None) for uuid in retry[start : start + batch_size]]
+        for hits in _records_without_ark(state.get("after"), batch_size):
+            yield [(hit.uuid, hit.id) for hit in hits]
+
+    record_cls = current_rdm_records_service.record_cls
+    async_api = PIDsLinkAsyncRESTClient(
+        client.api, max_concurrency=concurrency, priority=BATCH
+    )
+    started = time.monotonic()
+    processed = 0
+    try:
+        for batch in _batches():
+            if limit is not None:
+                batch = batch[: limit - processed]
+            records = {
+                str(record.id): record
+                for record in record_cls.get_records([uuid for uuid, _ in batch])
+                # minted since it failed, e.g. by a publish
+                if "ark" not in (record.get("pids") or {})
+            }
+            arks = provider.mint_many(records, async_api=async_api)
+            items = [
+                (records[key], ark, client.landing_url(records[key]))
+                for key, ark in arks.items()
+            ]
+            _, drafts = provider.create_and_register_many(items)
+
+            processed += len(batch)
+            failed.extend(key for key in records if key not in arks)
+            state["minted"] += len(items)
+            # failed records, and the ones to retry not reached yet
+            state["retry"] = failed + retry[processed:]
+            state["failed"] = len(state["retry"])
+            ids = [record_id for _, record_id in batch if record_id is not None]
+            if ids:
+                state["after"] = ids[-1]
+            JobCheckpoint.save(checkpoint_name, state)
+            db.session.commit()
+            current_rdm_records_service.indexer.bulk_index(
+                [str(record.id) for record, _, _ in items]
+            )
+            current_rdm_records_service.draft_indexer.bulk_index(drafts)
+
+            elapsed = time.monotonic() - started
+            click.echo(
+                f"{processed} records processed, {state['minted']} ARKs minted, "
+                f"{state['failed']} failed ({processed / elapsed:.1f} records/s)."
+            )
+            if limit is not None and processed >= limit:
+                break
+    finally:
+        async_api.close()
+
+    pending = state.get("retry", [])
+    if pending:
+        click.secho(
+            f"Done: {state['minted']} ARKs minted, {len(pending)} failed. "
+            "Run again to retry the failed records.",
+            fg="yellow",
+        )
+    else:
+        click.secho(f"Done: {state['minted']} ARKs minted.", fg="green")
+
+
+@pidslink.command("retarget")
+@click.option(
+    "--batch-size",
+    type=int,
+    default=None,
+    help="ARKs per batch [default: PIDSLINK_RETARGET_BATCH_SIZE].",
+)
+@click.option(
+    "--concurrency",
+    type=int,
+    default=None,
+    help="Concurrent PIDsLink requests [default: PIDSLINK_MAX_CONCURRENCY].",
+)
+@click.option(
+    "--restart", is_flag=True, help="Ignore the checkpoint and start over."
+)
+@click.option(
+    "--dry-run", is_flag=True, help="Only count the ARKs that need retargeting."
+)
+@click.option(
+    "--background",
+    is_flag=True,
+    help="Run the job in a Celery worker instead of in this process.",
+)
+@with_appcontext
+def retarget(batch_size, concurrency, restart, dry_run, background):
+    """Point all registered ARKs to their current landing URL.
+
+    Run after changing SITE_UI_URL or PIDSLINK_LANDING_URL. Only the ARKs
+    whose PIDsLink target differs are retargeted, through the outbox, and
+    an interrupted run resumes after the last completed batch.
+    """
+    client = get_provider().client
+    batch_size = batch_size or client.cfg("retarget_batch_size", 500)
+    if background:
+        retarget_arks_task.delay(batch_size=batch_size, restart=restart)
+        click.secho("Retargeting job queued.", fg="green")
+        return
+
+    started = time.monotonic()
+    state = {"checked": 0, "retargeted": 0, "failed": 0}
+    for state in retarget_arks(
+        client,
+        batch_size=batch_size,
+        concurrency=concurrency,
+        restart=restart,
+        dry_run=dry_run,
+    ):
+        elapsed = time.monotonic() - started
+        click.echo(
+            f"{state['checked']} ARKs checked, {state['retargeted']} "
+            f"{'to retarget' if dry_run else 'queued'}, {state['failed']} "
+            f"failed ({state['checked'] / elapsed:.1f} ARKs/s)."
+        )
+    click.secho(
+        f"Done: {state['retargeted']} ARKs {'to retarget' if dry_run else 'queued'}"
+        f", {state['failed']} failed.",
+        fg="green",
+    )
+
+
+@pidslink.command("reconcile")
+@click.option(
+    "--batch-size",
+    type=int,
+    default=None,
+    help="ARKs per batch [default: PIDSLINK_RECONCILE_BATCH_SIZE].",
+)
+@click.option(
+    "--concurrency",
+    type=int,
+    default=None,
+    help="Concurrent PIDsLink requests [default: PIDSLINK_MAX_CONCURRENCY].",
+)
+@click.option(
+    "--full", is_flag=True, help="Check all the ARKs, not only the changed ones."
+)
+@click.option(
+    "--repair/--no-repair",
+    default=None,
+    help="Resend the drifted ARKs [default: PIDSLINK_RECONCILE_REPAIR].",
+)
+@click.option(
+    "--background",
+    is_flag=True,
+    help="Run the job in a Celery worker instead of in this process.",
+)
+@with_appcontext
+def reconcile(batch_size, concurrency, full, repair, background):
+    """Compare the ARKs with PIDsLink and report the drifts.
+
+    Only the ARKs changed since the previous run are checked, unless --full
+    is given. The open drifts are listed at the end.
+    """
+    provider = get_provider()
+    client = provider.client
+    if background:
+        reconcile_arks_task.delay(full=full, repair=repair)
+        click.secho("Reconciliation job queued.", fg="green")
+        return
+    if repair is None:
+        repair = client.cfg("reconcile_repair", False)
+
+    started = time.monotonic()
+    state = {"checked": 0, "drifted": 0, "repaired": 0, "failed": 0}
+    for state in reconcile_arks(
+        provider,
+        batch_size=batch_size or client.cfg("reconcile_batch_size", 500),
+        concurrency=concurrency,
+        full=full,
+        repair=repair,
+    ):
+        elapsed = time.monotonic() - started
+        click.echo(
+            f"{state['checked']} ARKs checked, {state['drifted']} drifted, "
+            f"{state['repaired']} repaired, {state['failed']} failed "
+            f"({state['checked'] / elapsed:.1f} ARKs/s)."
+        )
+
+    drifts = ARKDrift.query.filter(ARKDrift.status == ARKDriftStatus.OPEN).order_by(
+        ARKDrift.ark
+    )
+    for drift in drifts:
+        click.echo(
+            f"{drift.ark}: {drift.kind.name.lower()} "
+            f"(expected {drift.expected}, actual {drift.actual})"
+        )
+    click.secho(
+        f"Done: {state['checked']} ARKs checked, {state['drifted']} drifted, "
+        f"{state['repaired']} repaired, {state['failed']} failed.",
+        fg="green",
+    )
+
+
+@baobab.group()
+def oai():
+    """Pre-rendered OAI-PMH records commands."""
+
+
+@oai.command("render")
+@click.option("--batch-size", default=500, show_default=True, help="Records per task.")
+@with_appcontext
+def render(batch_size):
+    """Render the OAI-PMH formats of all published records.
+
+    Needed once to fill the store, and after changing the metadata formats;
+    afterwards records are rendered when they are published or updated.
+    """
+    query = (
+        db.session.query(PersistentIdentifier.id, PersistentIdentifier.object_uuid)
+        .filter(
+            PersistentIdentifier.pid_type == "recid",
+            PersistentIdentifier.object_type == "rec",
+            PersistentIdentifier.status == PIDStatus.REGISTERED,
+        )
+        .order_by(PersistentIdentifier.id)
+    )
+    after, queued = 0, 0
+    while True:
+        rows = query.filter(PersistentIdentifier.id > after).limit(batch_size).all()
+        if not rows:
+            break
+        render_oai_records.delay([str(uuid) for _, uuid in rows])
+        queued += len(rows)
+        after = rows[-1][0]
+    click.secho(f"{queued} records queued for rendering.", fg="green")
+
+
+@baobab.group()
+def sitemap():
+    """Sitemap commands."""
+
+
+@sitemap.command("build")
+@click.option("--batch-size", default=500, show_default=True, help="Records per task.")
+@with_appcontext
+def build(batch_size):
+    """Add all published records to the sitemaps.
+
+    Needed once to fill the sitemaps; afterwards entries are updated when
+    records are published or updated.
+    """
+    query = (
+        db.session.query(PersistentIdentifier.id, PersistentIdentifier.object_uuid)
+        .filter(
+            PersistentIdentifier.pid_type == "recid",
+            PersistentIdentifier.object_type == "rec",
+            PersistentIdentifier.status == PIDStatus.REGISTERED,
+        )
+        .order_by(PersistentIdentifier.id)
+    )
+    after, queued = 0, 0
+    while True:
+        rows = query.filter(PersistentIdentifier.id > after).limit(batch_size).all()
+        if not rows:
+            break
+        update_sitemap_entries.delay([str(uuid) for _, uuid in rows])
+        queued += len(rows)
+        after = rows[-1][0]
+    click.secho(f"{queued} records queued for the sitemaps.", fg="green")
+
+
+@sitemap.command("generate")
+@click.option("--full", is_flag=True, help="Rewrite all the sitemap files.")
+@with_appcontext
+def generate(full):
+    """Write the changed sitemap files now."""
+    generate_sitemaps(full=full)
+    click.secho("Sitemaps written.", fg="green")
+
+
+def _estimate(client, batch_size, concurrency, limit, probes=50):
+    """Estimate the throughput and duration of a backfill without minting.
+
+    Times the scan of the first batches of records, and the latency of
+    ``probes`` read-only PIDsLink queries sent ``concurrency`` at a time.
+    """
+    total = _count_without_ark()
+    if limit is not None:
+        total = min(total, limit)
+    click.echo(f"{total} records without an ARK.")
+    if not total:
+        return
+
+    record_cls = current_rdm_records_service.record_cls
+    started = time.monotonic()
+    scanned = 0
+    for hits in _records_without_ark(batch_size=batch_size):
+        record_cls.get_records([hit.uuid for hit in hits])
+        scanned += len(hits)
+        if scanned >= min(total, 5 * batch_size):
+            break
+    local_rate = scanned / (time.monotonic() - started)
+
+    prefix = client.cfg("prefix")
+
+    def _probe(i):
+        start = time.monotonic()
+        try:
+            # bypass the cache, unknown ARKs are as expensive as any lookup
+            with request_priority(BATCH):
+                client.api._get_pids(f"ark:/{prefix}dryrun{i}")
+        except PIDsLinkError:
+            pass
+        return time.monotonic() - start
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = sorted(executor.map(_probe, range(probes)))
+    remote_rate = probes / (time.monotonic() - started)
+
+    rate = min(local_rate, remote_rate)
+    click.echo(f"Search and database: {local_rate:.1f} records/s.")
+    click.echo(
+        f"PIDsLink: {remote_rate:.1f} requests/s with {concurrency} concurrent "
+        f"requests (median latency {latencies[len(latencies) // 2] * 1000:.0f} ms)."
+    )
+    click.secho(
+        f"Estimated throughput {rate:.1f} records/s, about "
+        f"{total / rate / 60:.1f} minutes for {total} records. Minting is "
+        "usually slower than the queries probed here.",
+        fg="green",
+    )
@@ -0,0 +1,23 @@
+from invenio_records_resources.services import ServiceComponent
+from invenio_records_resources.services.uow import TaskOp
+
+from baobab.pidslink.tasks import update_ark_index
+
+
+class ARKIndexComponent(ServiceComponent):
+    """Update the ARK index for records deleted or restored.
+
+    Deletions and restorations send no ARK signal, so the ARKs of the
+    records are added to or removed from the index once the unit of work is
+    committed.
+    """
+
+    def _update(self, record, uow):
+        if record is not None and uow is not None:
+            uow.register(TaskOp(update_ark_index, [str(record.id)]))
+
+    def delete_record(self, identity, data=None, record=None, uow=None, **kwargs):
+        self._update(record, uow)
+
+    def restore_record(self, identity, record=None, uow=None, **kwargs):
+        self._update(record, uow)
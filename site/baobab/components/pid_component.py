@@ -1,15 +1,29 @@
 from invenio_records_resources.services import ServiceComponent
-from baobab.pidslink_service.rest_client import PIDsLinkRESTClient
-from baobab.pidslink_service.errors import PIDsLinkError, PIDsLinkNoContentError, PIDsLinkServerError
-from invenio_rdm_records.services.pids.providers import PIDProvider
 
+from baobab.pidslink.provider import get_provider
+from baobab.pidslink.uow import PIDRegistrationOp
 
-class PIDComponent(ServiceComponent)
-    def create(self, identity, data, record=None, **kwargs):
-        record.pid = self.register_pid(record)
 
-    def update(self, identity, data, record=None, **kwargs)
-        record.pid = self.update_pid(record)
+class PIDComponent(ServiceComponent):
+    """Register the ARKs of records after the unit of work is committed.
 
-    def register_pid(self, record):
-        return "ark:/50962/bb67854"
\ No newline at end of file
+    The records of a unit of work (e.g. an import or a bulk accept) are
+    grouped and their ARKs minted as one concurrent batch once the
+    transaction is committed, instead of one PIDsLink call per record while
+    the transaction is open.
+    """
+
+    def create(self, identity, data=None, record=None, uow=None, **kwargs):
+        if record is not None:
+            PIDRegistrationOp.get(uow).add(record)
+
+    def update(self, identity, data=None, record=None, uow=None, **kwargs):
+        if record is None:
+            return
+        ark = (record.get("pids") or {}).get("ark")
+        if ark is None:
+            PIDRegistrationOp.get(uow).add(record)
+            return
+        # only written to the outbox, sent once the transaction is committed
+        provider = get_provider()
+        provider.update(provider.get(ark["identifier"]), record)
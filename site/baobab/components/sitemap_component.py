@@ -0,0 +1,22 @@
+from invenio_records_resources.services import ServiceComponent
+from invenio_records_resources.services.uow import TaskOp
+
+from baobab.sitemap.tasks import update_sitemap_entries
+
+
+class SitemapComponent(ServiceComponent):
+    """Update the sitemap entries of records deleted or restored.
+
+    Deletions and restorations send no ARK signal, so the entries are
+    updated from the service once the unit of work is committed.
+    """
+
+    def _update(self, record, uow):
+        if record is not None and uow is not None:
+            uow.register(TaskOp(update_sitemap_entries, [str(record.id)]))
+
+    def delete_record(self, identity, data=None, record=None, uow=None, **kwargs):
+        self._update(record, uow)
+
+    def restore_record(self, identity, record=None, uow=None, **kwargs):
+        self._update(record, uow)
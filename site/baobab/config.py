@@ -1,7 +1,74 @@
-from invenio_records_resources import ServiceConfig
+from invenio_records_resources.services import ServiceConfig
 from .components.pid_component import PIDComponent
 
+BAOBAB_AUTOCOMPLETE_IN_MEMORY = ("names", "subjects")
+"""Vocabularies autocompleted from an index in memory, the others are searched.
+
+Each worker process holds its own copy of the indexes.
+"""
+
+BAOBAB_AUTOCOMPLETE_MAX_SIZE = 50
+"""Maximum number of suggestions per autocomplete request."""
+
+BAOBAB_AUTOCOMPLETE_REBUILD_DELAY = 5
+"""Seconds without vocabulary changes before the autocomplete indexes are rebuilt."""
+
+BAOBAB_AUTOCOMPLETE_REDIS_URL = None
+"""Redis URL of the vocabulary changes, defaults to ``CACHE_REDIS_URL``."""
+
+BAOBAB_COMPONENT_TIMING = False
+"""Time the hooks of the service components (see :py:mod:`baobab.timing`)."""
+
+BAOBAB_COMPONENT_TIMING_SLOW = 0.5
+"""Duration in seconds above which a component hook is logged as slow."""
+
+BAOBAB_EXPORT_BATCH_SIZE = 1000
+"""Number of records fetched from the search index per batch of an export."""
+
+BAOBAB_EXPORT_CUSTOM_FIELDS = None
+"""Custom fields included in the exports, or ``None`` for all of them."""
+
+BAOBAB_EXPORT_TOKEN = None
+"""Bearer token required to download the exports, which are disabled if unset.
+
+Each export keeps a worker busy for the whole dump, so it is not public.
+"""
+
+BAOBAB_OAI_METADATA_FORMATS = {
+    "oai_dc": {
+        "serializer": "baobab.oai.serializers:dublincore",
+        "schema": "http://www.openarchives.org/OAI/2.0/oai_dc.xsd",
+        "namespace": "http://www.openarchives.org/OAI/2.0/oai_dc/",
+    },
+    "datacite": {
+        "serializer": "baobab.oai.serializers:datacite",
+        "schema": "http://schema.datacite.org/meta/kernel-4.3/metadata.xsd",
+        "namespace": "http://datacite.org/schema/kernel-4",
+    },
+}
+"""OAI-PMH metadata formats pre-rendered for each record (see :py:mod:`baobab.oai`).
+
+Harvests of other formats, and of sets, are redirected to the OAI-PMH
+server of Invenio.
+"""
+
+BAOBAB_OAI_PAGE_SIZE = 1000
+"""Number of records per page of the pre-rendered OAI-PMH lists."""
+
+BAOBAB_SITEMAP_DIR = None
+"""Directory of the sitemap files, served by nginx.
+
+Defaults to ``sitemaps`` in the instance path.
+"""
+
+BAOBAB_SITEMAP_SHARD_SIZE = 50000
+"""Maximum number of URLs per sitemap file (the limit of the protocol)."""
+
+BAOBAB_SITEMAP_URL = "{site_ui_url}/sitemaps"
+"""Public URL of the sitemap files, formatted with ``SITE_UI_URL``."""
+
+
 class PIDServiceConfig(ServiceConfig):
     components = [
         PIDComponent
-    ]
\ No newline at end of file
+    ]
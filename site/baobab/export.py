@@ -0,0 +1,151 @@
+"""Streaming export of the catalogue.
+
+Published public records are streamed from the search index by batches,
+sorted by id and paged with ``search_after``, and written batch by batch as
+JSON Lines or CSV, optionally gzip compressed on the fly. Memory use is
+bounded by the batch size whatever the size of the catalogue.
+
+Incremental exports (``since``) list the records updated since a date;
+records deleted or restricted since then are not part of them.
+"""
+
+import csv
+import io
+import json
+import zlib
+
+from flask import current_app
+from invenio_rdm_records.proxies import current_rdm_records_service
+from invenio_search import current_search_client
+from invenio_search.engine import dsl
+
+from .pidslink.provider.pidslink import PIDsLinkClient
+
+COLUMNS = ("id", "ark", "url", "title", "creators", "publication_date", "updated")
+"""Columns of the export, followed by the custom fields."""
+
+
+def custom_fields():
+    """Get the names of the exported custom fields.
+
+    ``BAOBAB_EXPORT_CUSTOM_FIELDS``, or all the ``RDM_CUSTOM_FIELDS``.
+    """
+    names = current_app.config.get("BAOBAB_EXPORT_CUSTOM_FIELDS")
+    if names is None:
+        fields = current_app.config.get("RDM_CUSTOM_FIELDS", [])
+        names = [field.name for field in fields]
+    return names
+
+
+def published_records(since=None, batch_size=1000):
+    """Stream the published public records, by batches.
+
+    :param since: Only return the records updated since this date (ISO 8601).
+    :returns: Iterator of lists of search hits (as dicts).
+    """
+    index = current_rdm_records_service.record_cls.index.search_alias
+    search = (
+        dsl.Search(using=current_search_client, index=index)
+        .filter("term", is_deleted=False)
+        .filter("term", **{"access.record": "public"})
+        .sort("id")
+        .source(["id", "pids", "metadata", "custom_fields", "updated"])
+        .extra(size=batch_size)
+    )
+    if since:
+        search = search.filter("range", updated={"gte": since})
+    after = None
+    while True:
+        page = search.extra(search_after=[after]) if after else search
+        hits = [hit.to_dict() for hit in page.execute().hits]
+        if not hits:
+            return
+        yield hits
+        after = hits[-1]["id"]
+
+
+def export_row(hit, client, fields):
+    """Get the exported values of a record."""
+    metadata = hit.get("metadata", {})
+    creators = [
+        creator.get("person_or_org", {}).get("name")
+        for creator in metadata.get("creators", [])
+    ]
+    row = {
+        "id": hit["id"],
+        "ark": hit.get("pids", {}).get("ark", {}).get("identifier"),
+        "url": client.record_url(hit["id"]),
+        "title": metadata.get("title"),
+        "creators": [name for name in creators if name],
+        "publication_date": metadata.get("publication_date"),
+        "updated": hit.get("updated"),
+    }
+    values = hit.get("custom_fields", {})
+    row.update({name: values.get(name) for name in fields})
+    return row
+
+
+def _jsonl(batches):
+    """Serialize batches of rows as JSON Lines, one chunk per batch."""
+    for rows in batches:
+        yield "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+
+
+def _cell(value):
+    """Format a value as a CSV cell.
+
+    Lists of plain values are joined with ``; ``, other lists and dicts
+    (e.g. nested custom fields) are written as JSON.
+    """
+    if isinstance(value, list) and not any(
+        isinstance(item, (dict, list)) for item in value
+    ):
+        return "; ".join(map(str, value))
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def _csv(batches, fields):
+    """Serialize batches of rows as CSV, one chunk per batch."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS + tuple(fields))
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    for rows in batches:
+        for row in rows:
+            writer.writerow(_cell(value) for value in row.values())
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def _gzip(chunks):
+    """Gzip compress a stream of text chunks on the fly."""
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_records(fmt, since=None, gzip=False):
+    """Stream an export of the catalogue.
+
+    :param fmt: ``jsonl`` or ``csv``.
+    :param since: Only export the records updated since this date.
+    :param gzip: Compress the export.
+    :returns: Iterator of chunks (``bytes`` if compressed, else ``str``).
+    """
+    client = PIDsLinkClient("pidslink")
+    fields = custom_fields()
+    batch_size = current_app.config["BAOBAB_EXPORT_BATCH_SIZE"]
+    batches = (
+        [export_row(hit, client, fields) for hit in hits]
+        for hits in published_records(since, batch_size)
+    )
+    chunks = _csv(batches, fields) if fmt == "csv" else _jsonl(batches)
+    return _gzip(chunks) if gzip else chunks
@@ -0,0 +1,48 @@
+"""Baobab Invenio extension."""
+
+from . import config
+from .autocomplete import watch_vocabularies, wrap_suggest_views
+from .oai.tasks import render_published_record
+from .pidslink import config as pidslink_config
+from .pidslink.resolver import index_ark
+from .pidslink.serializers import serializer_cache
+from .pidslink.signals import ark_registered, ark_updated
+from .sitemap.tasks import update_published_record
+from .timing import add_server_timing
+
+
+class Baobab(object):
+    """Baobab extension."""
+
+    def __init__(self, app=None):
+        """Extension initialization."""
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Flask application initialization."""
+        self.init_config(app)
+        serializer_cache.maxsize = app.config["PIDSLINK_SERIALIZER_CACHE_SIZE"]
+        if app.config["BAOBAB_COMPONENT_TIMING"]:
+            app.after_request(add_server_timing)
+        watch_vocabularies()
+        for signal in (ark_registered, ark_updated):
+            signal.connect(index_ark)
+            signal.connect(render_published_record)
+            signal.connect(update_published_record)
+        app.extensions["baobab"] = self
+
+    def init_config(self, app):
+        """Initialize configuration."""
+        for k in dir(config):
+            if k.startswith("BAOBAB_"):
+                app.config.setdefault(k, getattr(config, k))
+        for k in dir(pidslink_config):
+            if k.startswith("PIDSLINK_"):
+                app.config.setdefault(k, getattr(pidslink_config, k))
+
+
+def api_finalize_app(app):
+    """Finalize the REST API application, once its blueprints are registered."""
+    # suggestions of the deposit form (see baobab.autocomplete)
+    wrap_suggest_views(app)
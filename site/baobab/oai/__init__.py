@@ -0,0 +1,7 @@
+"""Pre-rendered OAI-PMH records.
+
+The metadata formats of every published record are rendered when the record
+is published or updated and kept in :py:class:`OAIRecord`, so that
+harvesting them is a matter of streaming rows (see
+:py:func:`baobab.views.oai_pmh`).
+"""
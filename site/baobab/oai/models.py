@@ -0,0 +1,66 @@
+"""Database models of the pre-rendered OAI-PMH records."""
+
+from datetime import datetime
+
+from invenio_db import db
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy_utils.types import UUIDType
+
+
+class OAIRecord(db.Model):
+    """A record rendered in an OAI-PMH metadata format.
+
+    Rows are keyed by record and metadata prefix, and harvested in
+    ``(datestamp, id)`` order. Re-rendering a record moves its datestamp
+    forward, so that incremental harvests pick it up again.
+    """
+
+    __tablename__ = "baobab_oai_record"
+
+    __table_args__ = (
+        db.UniqueConstraint(
+            "record_id", "metadata_prefix", name="uq_baobab_oai_record_prefix"
+        ),
+        db.Index("ix_baobab_oai_record_harvest", "metadata_prefix", "datestamp", "id"),
+    )
+
+    id = db.Column(db.BigInteger, primary_key=True)
+
+    record_id = db.Column(UUIDType, nullable=False)
+
+    recid = db.Column(db.String(255), nullable=False)
+    """PID of the record, from which the OAI identifier is built."""
+
+    metadata_prefix = db.Column(db.String(64), nullable=False)
+
+    datestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    deleted = db.Column(db.Boolean, nullable=False, default=False)
+    """Record was deleted or restricted; harvested as a deleted header."""
+
+    xml = db.Column(db.Text, nullable=True)
+    """Rendered metadata element, ``None`` for deleted records."""
+
+    @classmethod
+    def store_many(cls, rows):
+        """Insert or replace rendered records in the current transaction.
+
+        :param rows: Iterable of dicts with ``record_id``, ``recid``,
+            ``metadata_prefix``, ``deleted`` and ``xml``.
+        """
+        now = datetime.utcnow()
+        rows = [{**row, "datestamp": now} for row in rows]
+        if not rows:
+            return
+        table = cls.__table__
+        statement = insert(table).values(rows)
+        statement = statement.on_conflict_do_update(
+            constraint="uq_baobab_oai_record_prefix",
+            set_=dict(
+                recid=statement.excluded.recid,
+                datestamp=statement.excluded.datestamp,
+                deleted=statement.excluded.deleted,
+                xml=statement.excluded.xml,
+            ),
+        )
+        db.session.execute(statement)
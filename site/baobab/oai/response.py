@@ -0,0 +1,249 @@
+"""OAI-PMH responses streamed from the pre-rendered records.
+
+Answers ``GetRecord``, ``ListRecords``, ``ListIdentifiers`` and
+``ListMetadataFormats`` for the metadata formats of
+``BAOBAB_OAI_METADATA_FORMATS``. Lists are paged with keyset resumption
+tokens on ``(datestamp, id)``, marked with :py:data:`TOKEN_PREFIX`, and
+each page is streamed from a single query, so a response holds a handful
+of rows in memory whatever the page size.
+"""
+
+import base64
+import json
+from datetime import datetime, timedelta
+from xml.sax.saxutils import escape, quoteattr
+
+from flask import current_app, request
+from invenio_db import db
+
+from .models import OAIRecord
+
+OAI_NS = "http://www.openarchives.org/OAI/2.0/"
+
+OAI_SCHEMA = "http://www.openarchives.org/OAI/2.0/OAI-PMH.xsd"
+
+
+class OAIError(Exception):
+    """OAI-PMH error condition, returned as an ``error`` element."""
+
+    def __init__(self, code, message):
+        """Initialize the error."""
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+def format_datestamp(value):
+    """Format a datetime with the seconds granularity of OAI-PMH."""
+    return value.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def parse_datestamp(value, until=False):
+    """Parse a ``from``/``until`` argument.
+
+    :param until: Day granularity ``until`` arguments include the whole day.
+    :returns: The datetime, compared as a lower bound (inclusive) for
+        ``from`` and as an upper bound (exclusive) for ``until``.
+    """
+    granularities = (
+        ("%Y-%m-%d", timedelta(days=1)),
+        ("%Y-%m-%dT%H:%M:%SZ", timedelta(seconds=1)),
+    )
+    for fmt, step in granularities:
+        try:
+            parsed = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        return parsed + step if until else parsed
+    raise OAIError("badArgument", f"Invalid datestamp {value}.")
+
+
+TOKEN_PREFIX = "baobab."
+"""Prefix of the resumption tokens issued here.
+
+Tokens without the prefix were issued by the OAI-PMH server of Invenio, for
+the harvests redirected to it, and are redirected there as well.
+"""
+
+
+def is_own_token(token):
+    """Check if a resumption token was issued by :py:func:`encode_token`."""
+    return token.startswith(TOKEN_PREFIX)
+
+
+def encode_token(state):
+    """Encode the state of a list request as a resumption token."""
+    dump = json.dumps(state, separators=(",", ":")).encode("utf-8")
+    return TOKEN_PREFIX + base64.urlsafe_b64encode(dump).decode("ascii")
+
+
+def decode_token(token):
+    """Decode a resumption token."""
+    if not is_own_token(token):
+        raise OAIError("badResumptionToken", "Invalid resumption token.")
+    try:
+        dump = base64.urlsafe_b64decode(token[len(TOKEN_PREFIX) :].encode("ascii"))
+        state = json.loads(dump)
+        state["after"][0] = datetime.fromisoformat(state["after"][0])
+        return state
+    except (ValueError, KeyError, IndexError, TypeError):
+        raise OAIError("badResumptionToken", "Invalid resumption token.")
+
+
+def oai_identifier(recid):
+    """Get the OAI identifier of a record."""
+    return f"oai:{current_app.config['OAISERVER_ID_PREFIX']}:{recid}"
+
+
+def _envelope(args):
+    """Get the opening of a response."""
+    attributes = "".join(f" {name}={quoteattr(value)}" for name, value in args.items())
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<OAI-PMH xmlns="{OAI_NS}" '
+        'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+        f'xsi:schemaLocation="{OAI_NS} {OAI_SCHEMA}">'
+        f"<responseDate>{format_datestamp(datetime.utcnow())}</responseDate>"
+        f"<request{attributes}>{escape(request.base_url)}</request>"
+    )
+
+
+def error_response(args, error):
+    """Render an OAI-PMH error."""
+    return (
+        _envelope(args)
+        + f"<error code={quoteattr(error.code)}>{escape(error.message)}</error>"
+        + "</OAI-PMH>"
+    )
+
+
+def _header(recid, datestamp, deleted):
+    """Render the header of a record."""
+    status = ' status="deleted"' if deleted else ""
+    return (
+        f"<header{status}><identifier>{escape(oai_identifier(recid))}</identifier>"
+        f"<datestamp>{format_datestamp(datestamp)}</datestamp></header>"
+    )
+
+
+def _record(recid, datestamp, deleted, xml):
+    """Render a record."""
+    header = _header(recid, datestamp, deleted)
+    if deleted:
+        return f"<record>{header}</record>"
+    return f"<record>{header}<metadata>{xml}</metadata></record>"
+
+
+def list_metadata_formats(args):
+    """Render a ``ListMetadataFormats`` response."""
+    formats = "".join(
+        "<metadataFormat>"
+        f"<metadataPrefix>{escape(prefix)}</metadataPrefix>"
+        f"<schema>{escape(metadata_format['schema'])}</schema>"
+        f"<metadataNamespace>{escape(metadata_format['namespace'])}</metadataNamespace>"
+        "</metadataFormat>"
+        for prefix, metadata_format in current_app.config[
+            "BAOBAB_OAI_METADATA_FORMATS"
+        ].items()
+    )
+    verb = args["verb"]
+    return _envelope(args) + f"<{verb}>{formats}</{verb}></OAI-PMH>"
+
+
+def get_record(args):
+    """Render a ``GetRecord`` response."""
+    prefix = args.get("metadataPrefix")
+    identifier = args.get("identifier", "")
+    recid = identifier.rpartition(":")[2]
+    if not prefix or not recid:
+        raise OAIError("badArgument", "Missing identifier or metadataPrefix.")
+    row = (
+        db.session.query(
+            OAIRecord.recid, OAIRecord.datestamp, OAIRecord.deleted, OAIRecord.xml
+        )
+        .filter_by(metadata_prefix=prefix, recid=recid)
+        .one_or_none()
+    )
+    if row is None or identifier != oai_identifier(recid):
+        raise OAIError("idDoesNotExist", f"No record {identifier}.")
+    return _envelope(args) + f"<GetRecord>{_record(*row)}</GetRecord></OAI-PMH>"
+
+
+def list_records(args):
+    """Stream a ``ListRecords`` or ``ListIdentifiers`` response.
+
+    Errors are raised before the response starts, so that they can still be
+    returned as an ``error`` element.
+
+    :returns: Iterator of chunks of the response.
+    """
+    verb = args["verb"]
+    if "resumptionToken" in args:
+        if set(args) != {"verb", "resumptionToken"}:
+            raise OAIError("badArgument", "resumptionToken is an exclusive argument.")
+        state = decode_token(args["resumptionToken"])
+    else:
+        if "metadataPrefix" not in args:
+            raise OAIError("badArgument", "Missing metadataPrefix.")
+        state = {
+            "prefix": args["metadataPrefix"],
+            "from": args.get("from"),
+            "until": args.get("until"),
+            "after": None,
+            "cursor": 0,
+        }
+
+    headers_only = verb == "ListIdentifiers"
+    columns = [OAIRecord.id, OAIRecord.recid, OAIRecord.datestamp, OAIRecord.deleted]
+    if not headers_only:
+        columns.append(OAIRecord.xml)
+    query = db.session.query(*columns).filter(
+        OAIRecord.metadata_prefix == state["prefix"]
+    )
+    if state["from"]:
+        query = query.filter(OAIRecord.datestamp >= parse_datestamp(state["from"]))
+    if state["until"]:
+        query = query.filter(
+            OAIRecord.datestamp < parse_datestamp(state["until"], until=True)
+        )
+    if state["after"]:
+        query = query.filter(
+            db.tuple_(OAIRecord.datestamp, OAIRecord.id) > tuple(state["after"])
+        )
+    page_size = current_app.config["BAOBAB_OAI_PAGE_SIZE"]
+    rows = iter(
+        query.order_by(OAIRecord.datestamp, OAIRecord.id)
+        .limit(page_size + 1)
+        .yield_per(100)
+    )
+    first = next(rows, None)
+    if first is None:
+        raise OAIError("noRecordsMatch", "No records match the request.")
+
+    def _stream():
+        yield _envelope(args) + f"<{verb}>"
+        row, count = first, 0
+        while row is not None and count < page_size:
+            _, recid, datestamp, deleted = row[:4]
+            if headers_only:
+                yield _header(recid, datestamp, deleted)
+            else:
+                yield _record(recid, datestamp, deleted, row[4])
+            last, row, count = row, next(rows, None), count + 1
+
+        cursor = state["cursor"]
+        if row is not None:
+            token = encode_token(
+                {
+                    **state,
+                    "after": [last[2].isoformat(), last[0]],
+                    "cursor": cursor + count,
+                }
+            )
+            yield f'<resumptionToken cursor="{cursor}">{token}</resumptionToken>'
+        elif state["after"]:
+            # last page of a resumed list
+            yield f'<resumptionToken cursor="{cursor}"/>'
+        yield f"</{verb}></OAI-PMH>"
+
+    return _stream()
@@ -0,0 +1,27 @@
+"""Renderers of the OAI-PMH metadata formats.
+
+Each renderer takes the projection of a record (as returned by the records
+service) and returns its metadata element as an XML string. The ARK of the
+record is part of its ``pids``, so it is rendered as an identifier in both
+formats.
+"""
+
+from datacite import schema43
+from dcxml import simpledc
+from invenio_rdm_records.resources.serializers import (
+    DataCite43XMLSerializer,
+    DublinCoreXMLSerializer,
+)
+from lxml import etree
+
+
+def dublincore(data):
+    """Render the Dublin Core (``oai_dc``) element of a record."""
+    obj = DublinCoreXMLSerializer().dump_obj(data)
+    return etree.tostring(simpledc.dump_etree(obj), encoding="unicode")
+
+
+def datacite(data):
+    """Render the DataCite 4.3 element of a record."""
+    obj = DataCite43XMLSerializer().dump_obj(data)
+    return etree.tostring(schema43.dump_etree(obj), encoding="unicode")
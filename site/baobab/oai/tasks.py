@@ -0,0 +1,66 @@
+"""Celery tasks rendering the OAI-PMH records."""
+
+from celery import shared_task
+from flask import current_app
+from invenio_access.permissions import system_identity
+from invenio_db import db
+from invenio_rdm_records.proxies import current_rdm_records_service
+from werkzeug.utils import import_string
+
+from .models import OAIRecord
+
+
+def _is_harvestable(record):
+    """Check if a record is published and public."""
+    return (
+        not record.deletion_status.is_deleted
+        and record["access"]["record"] == "public"
+    )
+
+
+@shared_task(ignore_result=True)
+def render_oai_records(record_ids):
+    """Render the OAI-PMH metadata formats of records.
+
+    Deleted and restricted records are stored as deleted, so that
+    harvesters remove them.
+
+    :param record_ids: UUIDs of the records.
+    """
+    service = current_rdm_records_service
+    renderers = {
+        prefix: import_string(metadata_format["serializer"])
+        for prefix, metadata_format in current_app.config[
+            "BAOBAB_OAI_METADATA_FORMATS"
+        ].items()
+    }
+
+    rows = []
+    for record in service.record_cls.get_records(record_ids, with_deleted=True):
+        recid = record.pid.pid_value
+        data = None
+        if _is_harvestable(record):
+            data = service.result_item(
+                service, system_identity, record, links_tpl=service.links_item_tpl
+            ).to_dict()
+        for prefix, render in renderers.items():
+            rows.append(
+                dict(
+                    record_id=record.id,
+                    recid=recid,
+                    metadata_prefix=prefix,
+                    deleted=data is None,
+                    xml=render(data) if data is not None else None,
+                )
+            )
+    OAIRecord.store_many(rows)
+    db.session.commit()
+
+
+def render_published_record(sender, record_id, **kwargs):
+    """Render a record once its ARK is registered or updated.
+
+    Receiver of :py:data:`~baobab.pidslink.signals.ark_registered` and
+    :py:data:`~baobab.pidslink.signals.ark_updated`.
+    """
+    render_oai_records.delay([record_id])
@@ -0,0 +1,113 @@
+"""ARK syntax: parsing, normalization and validation.
+
+Everything in this module is pure string processing, so that ARKs can be
+validated without contacting PIDsLink.
+
+An ARK is made of a NAAN (Name Assigning Authority Number), a name (the
+shoulder followed by the blade) and optional qualifiers::
+
+    ark:/50962/bb67854xt5k2/files/report.pdf
+        `---' `----------'`----------------'
+        NAAN   name        qualifier
+
+Both ``ark:/NAAN/name`` and ``ark:NAAN/name`` forms are accepted. Hyphens are
+identity inert and removed, and the ``ark:`` label and the NAAN are case
+insensitive.
+"""
+
+import re
+from collections import namedtuple
+
+NOID_ALPHABET = "0123456789bcdfghjkmnpqrstvwxz"
+"""Characters of NOID generated names, in check character order."""
+
+_NOID_ORDINALS = {c: i for i, c in enumerate(NOID_ALPHABET)}
+
+_ARK_RE = re.compile(
+    r"""
+    ^(?:https?://[^/]+/)?                      # optional resolver
+    ark:/?                                     # label, old or new form
+    (?P<naan>[0-9bcdfghjkmnpqrstvwxz]{5,})/    # NAAN
+    (?P<name>[0-9a-z=~*+@_$%]+)                # shoulder and blade
+    (?P<qualifier>[/.][0-9a-z=~*+@_$%./]*)?$   # components and variants
+    """,
+    re.IGNORECASE | re.VERBOSE,
+)
+
+
+class ARK(namedtuple("ARK", ["naan", "name", "qualifier"])):
+    """A parsed and normalized ARK."""
+
+    __slots__ = ()
+
+    @property
+    def base(self):
+        """The ARK without its qualifiers."""
+        return f"ark:/{self.naan}/{self.name}"
+
+    def __str__(self):
+        """Get the normalized ARK."""
+        return self.base + self.qualifier
+
+
+def noid_check_char(value):
+    """Compute the NOID check character of ``NAAN/name``.
+
+    Each character contributes its position (starting at 1) multiplied by
+    its ordinal in :py:data:`NOID_ALPHABET`; characters outside of the
+    alphabet count as zero.
+    """
+    total = sum(
+        position * _NOID_ORDINALS.get(char, 0)
+        for position, char in enumerate(value, start=1)
+    )
+    return NOID_ALPHABET[total % len(NOID_ALPHABET)]
+
+
+def parse_ark(value):
+    """Parse and normalize an ARK.
+
+    :param value: The ARK, optionally prefixed by a resolver URL.
+    :returns: An :py:class:`ARK`.
+    :raises ValueError: If ``value`` is not a syntactically valid ARK.
+    """
+    match = _ARK_RE.match(value.strip().replace("-", ""))
+    if not match:
+        raise ValueError(f"Invalid ARK: {value}")
+
+    qualifier = (match.group("qualifier") or "").rstrip("./")
+    return ARK(match.group("naan").lower(), match.group("name"), qualifier)
+
+
+def normalize_ark(value):
+    """Get the normalized form of an ARK (see :py:func:`parse_ark`)."""
+    return str(parse_ark(value))
+
+
+def validate_ark(value, prefix=None, check_char=False):
+    """Validate an ARK.
+
+    :param value: The ARK.
+    :param prefix: ``NAAN/shoulder`` the ARK must be assigned under (e.g.
+        ``PIDSLINK_PREFIX``).
+    :param check_char: Verify the NOID check character ending the name.
+    :returns: The parsed :py:class:`ARK`.
+    :raises ValueError: If the ARK is invalid.
+    """
+    ark = parse_ark(value)
+
+    if prefix:
+        naan, _, shoulder = prefix.lower().strip("/").partition("/")
+        if ark.naan != naan:
+            raise ValueError(f"Invalid NAAN {ark.naan}, expected {naan}.")
+        if not ark.name.startswith(shoulder):
+            raise ValueError(f"ARK name must start with shoulder {shoulder}.")
+        if ark.name == shoulder:
+            raise ValueError("ARK name must not be the shoulder alone.")
+
+    if check_char:
+        expected = noid_check_char(f"{ark.naan}/{ark.name[:-1]}")
+        if ark.name[-1] != expected:
+            raise ValueError("Invalid ARK check character.")
+
+    return ark
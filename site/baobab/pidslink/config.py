@@ -1,5 +1,4 @@
 # ARK configuration settings#
-from baobab.pidslink.provider.pidslink import PIDsLinkClient
 
 PIDSLINK_ENABLED = True
 """Flag to enable/disable ARK registration."""
@@ -16,7 +15,190 @@ PIDSLINK_PREFIX = "50962/bb67854"
 PIDSLINK_TEST_MODE = True
 """PIDsLink test mode enabled."""
 
-PIDSLINK_FORMAT = ark_format"{record.pid.pid_value}"
-"""A string used for formatting the ARK or a callable.
+PIDSLINK_FORMAT = "{prefix}/{id}"
+"""A string used for formatting the ARK or a callable."""
 
-print(f"PIDSLINK_FORMAT: {PIDSLINK_FORMAT}")
\ No newline at end of file
+PIDSLINK_URL = None
+"""PIDsLink API base URL, used when test mode is disabled."""
+
+PIDSLINK_LANDING_URL = "{site_ui_url}/records/{recid}"
+"""Target URL of the ARKs, formatted with ``SITE_UI_URL`` and the record id.
+
+After changing it (or ``SITE_UI_URL``), update the registered ARKs with
+``invenio baobab pidslink retarget``.
+"""
+
+PIDSLINK_MINT_LEDGER_WAIT = 5
+"""Seconds to wait for the ARK of a record being minted by another process.
+
+A publish that finds a mint in progress for its record in the mint ledger
+waits for its result instead of minting a second ARK.
+"""
+
+PIDSLINK_RETARGET_BATCH_SIZE = 500
+"""Number of ARKs compared and retargeted per batch."""
+
+PIDSLINK_RECONCILE_BATCH_SIZE = 500
+"""Number of ARKs compared with PIDsLink per reconciliation batch."""
+
+PIDSLINK_RECONCILE_LAG = 300
+"""Seconds before a changed ARK is reconciled.
+
+ARKs changed more recently are left for the next run, so that transactions
+in flight when a run starts are not skipped by the high-water mark.
+"""
+
+PIDSLINK_RECONCILE_REPAIR = False
+"""Resend the ARKs that drifted from PIDsLink through the outbox."""
+
+PIDSLINK_TIMEOUT = (3.05, 30)
+"""Connect and read timeout in seconds for PIDsLink requests."""
+
+PIDSLINK_POOL_CONNECTIONS = 4
+"""Number of per-host connection pools kept by each process."""
+
+PIDSLINK_POOL_MAXSIZE = 10
+"""Maximum number of keep-alive connections kept per host and process.
+
+Should be at least the number of threads of a worker (``threads`` in
+``uwsgi_rest.ini``), so that no thread has to wait for a connection.
+"""
+
+PIDSLINK_POOL_BLOCK = False
+"""Block when all pooled connections are busy instead of opening a new one."""
+
+PIDSLINK_POOL_KEEPALIVE = True
+"""Enable TCP keep-alive on pooled PIDsLink connections."""
+
+PIDSLINK_MAX_CONCURRENCY = 16
+"""Maximum number of requests in flight for batch operations.
+
+Batch requests share the connection pool, so ``PIDSLINK_POOL_MAXSIZE`` should
+be at least this value in processes running batch jobs (e.g. Celery workers).
+"""
+
+PIDSLINK_RESERVE_ENABLED = False
+"""Assign ARKs from a pool of pre-minted ARKs instead of minting on publish."""
+
+PIDSLINK_RESERVE_SIZE = 100
+"""Number of available ARKs the reservation pool is refilled to."""
+
+PIDSLINK_RESERVE_LOW_WATER = 20
+"""Refill the reservation pool when fewer ARKs than this are available."""
+
+PIDSLINK_RESERVE_PLACEHOLDER_URL = None
+"""Target URL of reserved ARKs until they are bound to their record.
+
+Defaults to ``SITE_UI_URL``.
+"""
+
+PIDSLINK_OUTBOX_BATCH_SIZE = 100
+"""Number of outbox operations sent per task run."""
+
+PIDSLINK_OUTBOX_MAX_ATTEMPTS = 10
+"""Attempts after which an outbox operation is moved to the dead-letter state."""
+
+PIDSLINK_OUTBOX_RETRY_DELAY = 60
+"""Base delay in seconds before retrying a failed outbox operation.
+
+The delay doubles with every failed attempt.
+"""
+
+PIDSLINK_OUTBOX_QUIET_WINDOW = 10
+"""Seconds without changes to an ARK before its updates are sent.
+
+Updates of the same ARK written within the window are merged into one.
+"""
+
+PIDSLINK_OUTBOX_MAX_DELAY = 120
+"""Maximum delay in seconds of a debounced update, for ARKs that keep changing."""
+
+PIDSLINK_OUTBOX_RETENTION = 30
+"""Days sent outbox operations are kept for auditing before being purged."""
+
+PIDSLINK_REDIS_URL = None
+"""Redis URL for state shared by all processes. Defaults to ``CACHE_REDIS_URL``."""
+
+PIDSLINK_RETRY_MAX_ATTEMPTS = 3
+"""Maximum number of attempts of a PIDsLink request, including the first one."""
+
+PIDSLINK_RETRY_BACKOFF_BASE = 0.5
+"""Backoff in seconds before the first retry; it doubles with every retry."""
+
+PIDSLINK_RETRY_BACKOFF_MAX = 8
+"""Maximum backoff in seconds between two attempts."""
+
+PIDSLINK_RETRY_DEADLINE = 30
+"""Time budget in seconds for a PIDsLink request and all its retries."""
+
+PIDSLINK_RETRY_BUDGET = 0.2
+"""Retries allowed per PIDsLink request, averaged over each process."""
+
+PIDSLINK_BREAKER_FAILURE_THRESHOLD = 5
+"""Failures within the failure window that open the circuit breaker."""
+
+PIDSLINK_BREAKER_FAILURE_WINDOW = 60
+"""Period in seconds in which failures are counted."""
+
+PIDSLINK_BREAKER_RESET_TIMEOUT = 30
+"""Time in seconds PIDsLink is not contacted once the circuit is open."""
+
+PIDSLINK_RATE_LIMIT = None
+"""PIDsLink requests per second, shared by all processes, or ``None``.
+
+Every request (including retries) takes a token from a bucket kept in Redis
+(see ``PIDSLINK_REDIS_URL``), so bursts of batch jobs do not get throttled
+by PIDsLink.
+"""
+
+PIDSLINK_RATE_LIMIT_BURST = 20
+"""Maximum number of requests sent in a burst."""
+
+PIDSLINK_RATE_LIMIT_RESERVE = 5
+"""Tokens of the bucket kept for interactive requests.
+
+Batch jobs (backfill, retargeting, reconciliation, reservation refill) only
+send requests while more tokens are left, so they never slow down publishes.
+"""
+
+PIDSLINK_RATE_LIMIT_MAX_WAIT = {"interactive": 5, "batch": 60}
+"""Time in seconds a request waits for a token, by priority, before failing."""
+
+PIDSLINK_CACHE_ENABLED = True
+"""Cache PIDsLink query results in process and in Redis."""
+
+PIDSLINK_CACHE_SIZE = 4096
+"""Maximum number of query results cached in each process."""
+
+PIDSLINK_CACHE_LOCAL_TTL = 30
+"""Time in seconds query results are cached in each process.
+
+Invalidations only reach other processes through Redis, so this bounds how
+long a process may serve a stale result.
+"""
+
+PIDSLINK_CACHE_TTL = 3600
+"""Time in seconds query results are cached in Redis."""
+
+PIDSLINK_CACHE_NEGATIVE_TTL = 60
+"""Time in seconds unknown identifiers are cached."""
+
+PIDSLINK_CHECK_CHAR = False
+"""Require ARK names to end with a valid NOID check character."""
+
+PIDSLINK_SERIALIZER_CACHE_SIZE = 1024
+"""Maximum number of serialized records kept by each process."""
+
+PIDSLINK_METRICS_ENABLED = True
+"""Record the latency and errors of PIDsLink calls.
+
+Metrics are aggregated in Redis (see ``PIDSLINK_REDIS_URL``) and exposed in
+Prometheus text format at ``/pidslink/metrics``.
+"""
+
+PIDSLINK_METRICS_TOKEN = None
+"""Bearer token required to read the metrics, which are disabled if unset.
+
+The metrics reveal the PIDsLink error classes and the outbox backlog, so
+they are not public.
+"""
@@ -0,0 +1,659 @@
+"""Database models for PIDsLink ARKs."""
+
+import hashlib
+import json
+from datetime import datetime, timedelta
+from enum import Enum
+
+from flask import current_app
+from invenio_db import db
+from sqlalchemy import event
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy_utils.models import Timestamp
+from sqlalchemy_utils.types import ChoiceType
+
+
+class ARKReservationStatus(Enum):
+    """Status of a reserved ARK."""
+
+    AVAILABLE = "A"
+    """ARK is minted and can be assigned to a record."""
+
+    CLAIMED = "C"
+    """ARK was assigned to a record."""
+
+
+class ARKReservation(db.Model, Timestamp):
+    """ARK minted in advance, waiting to be assigned to a record.
+
+    Publishing takes an ARK from this pool instead of minting one with
+    PIDsLink, and the ARK target URL is bound after the record is published.
+    """
+
+    __tablename__ = "baobab_pidslink_ark_reservation"
+
+    __table_args__ = (
+        db.Index("idx_baobab_ark_reservation_prefix", "prefix", "status"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    ark = db.Column(db.String(255), nullable=False, unique=True)
+    """Minted ARK."""
+
+    prefix = db.Column(db.String(255), nullable=False)
+    """NAAN/shoulder the ARK was minted under."""
+
+    status = db.Column(
+        ChoiceType(ARKReservationStatus, impl=db.CHAR(1)),
+        nullable=False,
+        default=ARKReservationStatus.AVAILABLE,
+    )
+
+    recid = db.Column(db.String(255), nullable=True)
+    """Record the ARK was assigned to."""
+
+    @classmethod
+    def claim(cls, prefix, recid):
+        """Atomically assign an available ARK to a record.
+
+        Concurrent claims skip rows locked by each other, so they never wait
+        on or get the same ARK. The claim is part of the current transaction:
+        if it is rolled back the ARK goes back to the pool.
+
+        :param prefix: NAAN/shoulder of the ARK.
+        :param recid: Record the ARK is assigned to.
+        :returns: The claimed :py:class:`ARKReservation` or ``None`` if the
+            pool is empty.
+        """
+        with db.session.begin_nested():
+            reservation = (
+                cls.query.filter_by(
+                    prefix=prefix, status=ARKReservationStatus.AVAILABLE
+                )
+                .order_by(cls.id)
+                .with_for_update(skip_locked=True)
+                .first()
+            )
+            if reservation is None:
+                return None
+            reservation.status = ARKReservationStatus.CLAIMED
+            reservation.recid = recid
+        return reservation
+
+    @classmethod
+    def count_available(cls, prefix):
+        """Get the number of available ARKs for a prefix."""
+        return cls.query.filter_by(
+            prefix=prefix, status=ARKReservationStatus.AVAILABLE
+        ).count()
+
+
+class ARKMintLedger(db.Model, Timestamp):
+    """Idempotency ledger of the ARKs minted for records.
+
+    An intent is written before an ARK is minted for a record, and the
+    minted ARK once PIDsLink answers. Both writes are committed in their own
+    transaction, so they survive the rollback of a publish that times out
+    after PIDsLink minted: the retried publish reuses the ARK instead of
+    minting another one. Entries are unique and looked up by record and
+    shoulder.
+    """
+
+    __tablename__ = "baobab_pidslink_mint_ledger"
+
+    __table_args__ = (
+        db.UniqueConstraint(
+            "record_pid", "shoulder", name="uq_baobab_mint_ledger_record_shoulder"
+        ),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    record_pid = db.Column(db.String(255), nullable=False)
+    """Record the ARK is minted for."""
+
+    shoulder = db.Column(db.String(255), nullable=False)
+    """NAAN/shoulder the ARK is minted under."""
+
+    ark = db.Column(db.String(255), nullable=True)
+    """Minted ARK, ``None`` while the mint is in progress (or failed)."""
+
+    @classmethod
+    def get_many(cls, record_pids, shoulder):
+        """Get the ledger entries of records with a single query.
+
+        :returns: Dict of ``{record pid: (ark, updated)}``; ``ark`` is
+            ``None`` for mints in progress.
+        """
+        if not record_pids:
+            return {}
+        rows = db.session.query(cls.record_pid, cls.ark, cls.updated).filter(
+            cls.shoulder == shoulder, cls.record_pid.in_(record_pids)
+        )
+        return {record_pid: (ark, updated) for record_pid, ark, updated in rows}
+
+    @classmethod
+    def intend(cls, record_pids, shoulder, stale=None):
+        """Claim the minting of the ARKs of records, in its own transaction.
+
+        A record is claimed by a single process: the one that inserts its
+        entry, or the one that takes over an entry left in progress for more
+        than ``stale`` seconds (by a process that died while minting).
+        Records whose ARK is minted or being minted by another process are
+        not claimed.
+
+        :returns: Set of the claimed record pids.
+        """
+        now = datetime.utcnow()
+        rows = [
+            dict(
+                record_pid=record_pid,
+                shoulder=shoulder,
+                ark=None,
+                created=now,
+                updated=now,
+            )
+            for record_pid in record_pids
+        ]
+        if not rows:
+            return set()
+        table = cls.__table__
+        statement = (
+            insert(table)
+            .values(rows)
+            .on_conflict_do_nothing(constraint="uq_baobab_mint_ledger_record_shoulder")
+            .returning(table.c.record_pid)
+        )
+        with db.engine.begin() as connection:
+            claimed = {row[0] for row in connection.execute(statement)}
+            others = [pid for pid in record_pids if pid not in claimed]
+            if others and stale is not None:
+                # the row lock makes a single process take over the entry
+                statement = (
+                    table.update()
+                    .where(
+                        table.c.shoulder == shoulder,
+                        table.c.record_pid.in_(others),
+                        table.c.ark.is_(None),
+                        table.c.updated < now - timedelta(seconds=stale),
+                    )
+                    .values(updated=now)
+                    .returning(table.c.record_pid)
+                )
+                claimed.update(row[0] for row in connection.execute(statement))
+        return claimed
+
+    @classmethod
+    def record(cls, arks, shoulder):
+        """Record minted ARKs, in its own transaction.
+
+        :param arks: Dict of ``{record pid: ark}``.
+        """
+        if not arks:
+            return
+        table = cls.__table__
+        statement = (
+            table.update()
+            .where(
+                table.c.record_pid == db.bindparam("b_record_pid"),
+                table.c.shoulder == shoulder,
+            )
+            .values(ark=db.bindparam("b_ark"), updated=datetime.utcnow())
+        )
+        with db.engine.begin() as connection:
+            connection.execute(
+                statement,
+                [
+                    {"b_record_pid": record_pid, "b_ark": ark}
+                    for record_pid, ark in arks.items()
+                ],
+            )
+
+    @classmethod
+    def release(cls, record_pids, shoulder):
+        """Forget the failed mints of records, in its own transaction.
+
+        So that retries mint right away instead of waiting for them.
+        """
+        if not record_pids:
+            return
+        table = cls.__table__
+        with db.engine.begin() as connection:
+            connection.execute(
+                table.delete().where(
+                    table.c.shoulder == shoulder,
+                    table.c.record_pid.in_(record_pids),
+                    table.c.ark.is_(None),
+                )
+            )
+
+
+class OutboxOperation(Enum):
+    """PIDsLink operation recorded in the outbox."""
+
+    REGISTER = "R"
+    """Bind the ARK to its landing page and register its metadata."""
+
+    UPDATE = "U"
+    """Update the ARK metadata and make it findable."""
+
+    HIDE = "H"
+    """Hide the ARK (e.g. the record became restricted)."""
+
+
+class OutboxStatus(Enum):
+    """Status of an outbox entry."""
+
+    PENDING = "P"
+    """Operation waits to be sent to PIDsLink."""
+
+    DONE = "D"
+    """Operation was acknowledged by PIDsLink."""
+
+    DEAD = "X"
+    """Operation failed permanently and needs manual attention."""
+
+
+class PIDsLinkOutbox(db.Model, Timestamp):
+    """PIDsLink operation waiting to be sent.
+
+    Operations are written in the same transaction as the record change, and
+    sent to PIDsLink by the :py:func:`baobab.pidslink.tasks.process_outbox`
+    task once committed. Operations on the same ARK are sent one at a time,
+    in the order they were written. Each operation carries the full state to
+    send, so replaying an operation that was already sent is harmless.
+
+    Updates are debounced: an update or hide is only sent once the ARK has
+    not changed for ``PIDSLINK_OUTBOX_QUIET_WINDOW`` seconds, and is merged
+    into the latest operation of the ARK while that one was not attempted
+    yet, so that a burst of edits ends up as a single call carrying the last
+    metadata, URL and visibility. Ordering guarantees:
+
+    * operations on an ARK are sent in the order they were written, one at a
+      time, and a merged operation keeps the position of the operation it
+      was merged into;
+    * an operation is never merged into one that is being sent or was
+      attempted already, it is queued after it instead;
+    * a hide is never merged into a registration, so that the ARK is bound
+      before being hidden;
+    * debouncing delays an operation by at most ``PIDSLINK_OUTBOX_MAX_DELAY``
+      seconds after it was first written, even if the ARK keeps changing.
+    """
+
+    __tablename__ = "baobab_pidslink_outbox"
+
+    __table_args__ = (
+        db.Index("idx_baobab_pidslink_outbox_status", "status", "ark", "id"),
+        # latest operation of each ARK, whatever its status
+        db.Index("idx_baobab_pidslink_outbox_ark", "ark", "id"),
+    )
+
+    id = db.Column(
+        db.BigInteger().with_variant(db.Integer, "sqlite"), primary_key=True
+    )
+
+    ark = db.Column(db.String(255), nullable=False)
+
+    operation = db.Column(
+        ChoiceType(OutboxOperation, impl=db.CHAR(1)), nullable=False
+    )
+
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    """Keyword arguments of the operation (e.g. ``url`` and ``metadata``)."""
+
+    status = db.Column(
+        ChoiceType(OutboxStatus, impl=db.CHAR(1)),
+        nullable=False,
+        default=OutboxStatus.PENDING,
+    )
+
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+
+    available_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    """Time before which the operation is not retried."""
+
+    last_error = db.Column(db.Text, nullable=True)
+
+    @classmethod
+    def add(cls, ark, operation, payload=None):
+        """Record an operation in the current transaction.
+
+        Updates and hides are merged into the latest operation of the ARK if
+        it is still pending and was not attempted yet (see the ordering
+        guarantees above). The outbox is processed once the transaction is
+        committed and the quiet window has elapsed.
+        """
+        tails = {}
+        if operation != OutboxOperation.REGISTER:
+            tails = cls._pending_tails([ark])
+        return cls._add(ark, operation, payload, tails.get(ark))
+
+    @classmethod
+    def add_many(cls, operations):
+        """Record many operations in the current transaction.
+
+        Same as :py:meth:`add`, but the latest operations of all the ARKs are
+        loaded with a single query.
+
+        :param operations: Iterable of ``(ark, operation, payload)``.
+        :returns: The list of entries, in the order of ``operations``.
+        """
+        operations = list(operations)
+        tails = cls._pending_tails(
+            {
+                ark
+                for ark, operation, _ in operations
+                if operation != OutboxOperation.REGISTER
+            }
+        )
+        entries = []
+        for ark, operation, payload in operations:
+            tail = tails.get(ark) if operation != OutboxOperation.REGISTER else None
+            entry = cls._add(ark, operation, payload, tail)
+            tails[ark] = entry
+            entries.append(entry)
+        return entries
+
+    @classmethod
+    def _add(cls, ark, operation, payload, tail):
+        """Merge an operation into ``tail`` if possible, or add it."""
+        payload = payload or {}
+        now = datetime.utcnow()
+        available_at = now
+        if operation != OutboxOperation.REGISTER:
+            available_at += timedelta(
+                seconds=current_app.config.get("PIDSLINK_OUTBOX_QUIET_WINDOW", 0)
+            )
+
+        # the ARK must be bound before being hidden
+        if tail is not None and not (
+            tail.operation == OutboxOperation.REGISTER
+            and operation == OutboxOperation.HIDE
+        ):
+            max_delay = timedelta(
+                seconds=current_app.config.get("PIDSLINK_OUTBOX_MAX_DELAY", 120)
+            )
+            tail.payload = {**tail.payload, **payload}
+            if tail.operation != OutboxOperation.REGISTER:
+                tail.operation = operation
+            tail.available_at = max(
+                tail.available_at, min(available_at, (tail.created or now) + max_delay)
+            )
+            entry = tail
+        else:
+            entry = cls(
+                ark=ark,
+                operation=operation,
+                payload=payload,
+                available_at=available_at,
+            )
+            db.session.add(entry)
+
+        session = db.session()
+        if not session.info.get("pidslink_outbox"):
+            session.info["pidslink_outbox"] = True
+            event.listen(session, "after_commit", _process_outbox, once=True)
+        return entry
+
+    @classmethod
+    def _pending_tails(cls, arks):
+        """Get the latest operation of ARKs that operations can be merged in.
+
+        Only operations that are pending and were not attempted yet are
+        returned, skipping those locked by a running
+        :py:func:`~baobab.pidslink.tasks.process_outbox` task.
+
+        :returns: Dict of the entries by ARK.
+        """
+        if not arks:
+            return {}
+        latest = (
+            db.select(db.func.max(cls.id))
+            .where(cls.ark.in_(arks))
+            .group_by(cls.ark)
+        )
+        entries = (
+            cls.query.filter(
+                cls.id.in_(latest),
+                cls.status == OutboxStatus.PENDING,
+                cls.attempts == 0,
+            )
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        return {entry.ark: entry for entry in entries}
+
+    @classmethod
+    def pending_operations(cls, arks):
+        """Get the latest pending operation of ARKs, with a single query.
+
+        :returns: Dict of the operations by ARK, for the ARKs with pending
+            operations only.
+        """
+        if not arks:
+            return {}
+        latest = (
+            db.select(db.func.max(cls.id))
+            .where(cls.ark.in_(arks), cls.status == OutboxStatus.PENDING)
+            .group_by(cls.ark)
+        )
+        rows = db.session.query(cls.ark, cls.operation).filter(cls.id.in_(latest))
+        return dict(rows.all())
+
+    @classmethod
+    def purge(cls, before, batch_size=1000):
+        """Delete the operations sent before a date, by batches.
+
+        Each batch is deleted in its own transaction.
+
+        :returns: The number of deleted operations.
+        """
+        deleted = 0
+        while True:
+            ids = (
+                db.select(cls.id)
+                .where(cls.status == OutboxStatus.DONE, cls.updated < before)
+                .limit(batch_size)
+            )
+            count = cls.query.filter(cls.id.in_(ids)).delete(
+                synchronize_session=False
+            )
+            db.session.commit()
+            deleted += count
+            if count < batch_size:
+                return deleted
+
+
+class ARKState(db.Model, Timestamp):
+    """State of an ARK last acknowledged by PIDsLink.
+
+    Keeps a fingerprint of each field sent with the ARK (e.g. ``url`` and
+    ``metadata``) and whether the ARK is hidden, so that record edits that do
+    not change what PIDsLink holds are not sent at all, and other edits only
+    send the fields that changed. The state is recorded when an outbox
+    operation is acknowledged (see
+    :py:func:`~baobab.pidslink.tasks.process_outbox`), so it never holds
+    what PIDsLink was not sent yet.
+    """
+
+    __tablename__ = "baobab_pidslink_ark_state"
+
+    ark = db.Column(db.String(255), primary_key=True)
+
+    fingerprints = db.Column(db.JSON, nullable=False, default=dict)
+    """Fingerprint of each field last sent, by field name."""
+
+    hidden = db.Column(db.Boolean, nullable=False, default=False)
+
+    @staticmethod
+    def fingerprint(value):
+        """Compute the fingerprint of a field value."""
+        dump = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(dump.encode("utf-8")).hexdigest()
+
+    def changes(self, fields):
+        """Get the fields whose value differs from the one last sent."""
+        return {
+            name: value
+            for name, value in fields.items()
+            if self.fingerprints.get(name) != self.fingerprint(value)
+        }
+
+    @classmethod
+    def get_many(cls, arks):
+        """Get the states of ARKs with a single query, by ARK."""
+        if not arks:
+            return {}
+        return {state.ark: state for state in cls.query.filter(cls.ark.in_(arks))}
+
+    @classmethod
+    def record(cls, ark, fields=None, hidden=False, state=None):
+        """Record the fields acknowledged for an ARK in the current transaction.
+
+        :param state: The current state of the ARK, if already loaded (see
+            :py:meth:`get_many`).
+        """
+        if state is None:
+            state = cls.query.get(ark) or cls(ark=ark, fingerprints={})
+        state.fingerprints = {
+            **state.fingerprints,
+            **{name: cls.fingerprint(value) for name, value in (fields or {}).items()},
+        }
+        state.hidden = hidden
+        db.session.add(state)
+        return state
+
+    @classmethod
+    def forget(cls, ark):
+        """Forget the state of an ARK, so that the next update sends it all."""
+        cls.query.filter_by(ark=ark).delete()
+
+
+class JobCheckpoint(db.Model, Timestamp):
+    """Progress of a resumable batch job (e.g. the ARK backfill)."""
+
+    __tablename__ = "baobab_job_checkpoint"
+
+    name = db.Column(db.String(255), primary_key=True)
+
+    state = db.Column(db.JSON, nullable=False, default=dict)
+    """Job specific progress (e.g. the last processed record)."""
+
+    @classmethod
+    def load(cls, name):
+        """Get the saved state of a job, or an empty state."""
+        checkpoint = cls.query.get(name)
+        return dict(checkpoint.state) if checkpoint is not None else {}
+
+    @classmethod
+    def save(cls, name, state):
+        """Save the state of a job in the current transaction."""
+        checkpoint = cls.query.get(name) or cls(name=name)
+        checkpoint.state = state
+        db.session.add(checkpoint)
+        return checkpoint
+
+    @classmethod
+    def clear(cls, name):
+        """Forget the state of a job, so that it starts over."""
+        cls.query.filter_by(name=name).delete()
+
+
+class ARKDriftKind(Enum):
+    """Kind of difference between an ARK and its PIDsLink state."""
+
+    MISSING = "M"
+    """ARK is registered locally but unknown to PIDsLink."""
+
+    TARGET = "T"
+    """ARK does not point to the landing URL of its record."""
+
+    VISIBILITY = "V"
+    """ARK is hidden in PIDsLink but not locally, or the other way round."""
+
+
+class ARKDriftStatus(Enum):
+    """Status of a detected drift."""
+
+    OPEN = "O"
+    """Drift was detected and not repaired yet."""
+
+    REPAIRING = "R"
+    """Repair was written to the outbox."""
+
+    RESOLVED = "S"
+    """Drift was not detected anymore by a later reconciliation."""
+
+
+class ARKDrift(db.Model, Timestamp):
+    """Difference between an ARK and its PIDsLink state.
+
+    Written by the reconciliation job (see
+    :py:mod:`baobab.pidslink.reconcile`). An ARK has at most one unresolved
+    drift of each kind, which is updated by later runs until it is resolved.
+    """
+
+    __tablename__ = "baobab_pidslink_ark_drift"
+
+    __table_args__ = (db.Index("ix_pidslink_ark_drift_ark_status", "ark", "status"),)
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    ark = db.Column(db.String(255), nullable=False)
+
+    kind = db.Column(
+        ChoiceType(ARKDriftKind, impl=db.CHAR(1)),
+        nullable=False,
+    )
+
+    status = db.Column(
+        ChoiceType(ARKDriftStatus, impl=db.CHAR(1)),
+        nullable=False,
+        default=ARKDriftStatus.OPEN,
+    )
+
+    expected = db.Column(db.JSON, nullable=True)
+    """What PIDsLink should hold (e.g. ``{"url": ...}``)."""
+
+    actual = db.Column(db.JSON, nullable=True)
+    """What PIDsLink holds, ``None`` if the ARK is missing."""
+
+    @classmethod
+    def unresolved(cls, arks):
+        """Get the unresolved drifts of ARKs with a single query.
+
+        :returns: Dict of ``{(ark, kind): drift}``.
+        """
+        if not arks:
+            return {}
+        drifts = cls.query.filter(
+            cls.ark.in_(arks), cls.status != ARKDriftStatus.RESOLVED
+        )
+        return {(drift.ark, drift.kind): drift for drift in drifts}
+
+    @classmethod
+    def report(cls, ark, kind, expected, actual, drift=None):
+        """Record a drift in the current transaction.
+
+        :param drift: The unresolved drift of the same kind, if any (see
+            :py:meth:`unresolved`); it is updated instead of adding a row.
+        """
+        if drift is None:
+            drift = cls(ark=ark, kind=kind, status=ARKDriftStatus.OPEN)
+        drift.expected = expected
+        drift.actual = actual
+        db.session.add(drift)
+        return drift
+
+
+def _process_outbox(session):
+    """Process the outbox once the operations are committed."""
+    # avoid circular import
+    from .tasks import process_outbox
+
+    session.info.pop("pidslink_outbox", None)
+    # debounced operations are not available before the quiet window ends
+    process_outbox.apply_async(
+        countdown=current_app.config.get("PIDSLINK_OUTBOX_QUIET_WINDOW", 0)
+    )
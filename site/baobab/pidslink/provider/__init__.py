@@ -1,9 +1,11 @@
 from .pidslink import PIDsLinkClient
 from .pidslink import PIDsLinkPIDProvider
+from .pidslink import get_provider
 
 
 
 __all__ = (
     "PIDsLinkClient",
     "PIDsLinkPIDProvider",
+    "get_provider",
 )
\ No newline at end of file
@@ -9,14 +9,97 @@
 
 """PIDsLink ARK Provider."""
 import json
+import time
 import warnings
-import requests
-from flask import current_app
-from invenio_pidstore.models import PIDStatus
+from datetime import datetime, timedelta
+from functools import lru_cache
+from json import JSONDecodeError
 
+from redis import StrictRedis
+from flask import current_app
+from invenio_i18n import lazy_gettext as _
+from invenio_pidstore.models import PersistentIdentifier, PIDStatus
+from invenio_rdm_records.proxies import current_rdm_records_service
+from sqlalchemy.orm.attributes import set_committed_value
+
+from baobab.pidslink_service.async_client import PIDsLinkAsyncRESTClient, collect
+from baobab.pidslink_service.breaker import (
+    CircuitBreaker,
+    LocalBreakerStore,
+    RedisBreakerStore,
+)
+from baobab.pidslink_service.cache import ResolutionCache
+from baobab.pidslink_service.metrics import MetricsRegistry
+from baobab.pidslink_service.ratelimit import (
+    LocalRateLimitStore,
+    RateLimiter,
+    RedisRateLimitStore,
+)
 from baobab.pidslink_service.rest_client import PIDsLinkRESTClient
+from baobab.pidslink_service.retry import RetryBudget, RetryPolicy
+from baobab.pidslink_service.session import get_session_pool
 from baobab.pidslink_service.errors import PIDsLinkError, PIDsLinkNoContentError, PIDsLinkServerError
 from invenio_rdm_records.services.pids.providers import PIDProvider
+from invenio_rdm_records.utils import ChainObject
+
+from ..ark import validate_ark
+from ..models import (
+    ARKMintLedger,
+    ARKReservation,
+    ARKState,
+    OutboxOperation,
+    PIDsLinkOutbox,
+)
+from ..serializers import CachedSerializer, ERCSerializer
+from ..signals import ark_registered, ark_updated, send_after_commit
+
+
+@lru_cache(maxsize=None)
+def _redis_client(url):
+    """Get the Redis client of the process for a URL."""
+    return StrictRedis.from_url(url)
+
+
+@lru_cache(maxsize=None)
+def _resolution_cache(redis, maxsize, local_ttl, ttl, negative_ttl):
+    """Get the resolution cache shared by all clients of the process."""
+    return ResolutionCache(
+        redis=redis,
+        maxsize=maxsize,
+        local_ttl=local_ttl,
+        ttl=ttl,
+        negative_ttl=negative_ttl,
+    )
+
+
+@lru_cache(maxsize=None)
+def _rate_limit_store(redis):
+    """Get the token bucket shared by all clients of the process."""
+    return RedisRateLimitStore(redis) if redis is not None else LocalRateLimitStore()
+
+
+@lru_cache(maxsize=None)
+def _metrics_registry(redis):
+    """Get the metrics registry shared by all clients of the process."""
+    return MetricsRegistry(redis=redis)
+
+
+@lru_cache(maxsize=None)
+def _retry_budget(ratio):
+    """Get the retry budget shared by all clients of the process."""
+    return RetryBudget(ratio=ratio)
+
+
+def get_provider(name="ark"):
+    """Get the configured PIDsLink provider.
+
+    :param name: Name of the provider in ``RDM_PERSISTENT_IDENTIFIER_PROVIDERS``.
+    :raises KeyError: If no PIDsLink provider is configured with that name.
+    """
+    for provider in current_app.config.get("RDM_PERSISTENT_IDENTIFIER_PROVIDERS", []):
+        if isinstance(provider, PIDsLinkPIDProvider) and provider.name == name:
+            return provider
+    raise KeyError(f"No PIDsLink provider named {name} is configured.")
 
 
 class PIDsLinkClient:
@@ -26,50 +109,84 @@ class PIDsLinkClient:
         """Constructor."""
         self.name = name
         self._config_prefix = config_prefix or "PIDSLINK"
-        self._api = "None"
-        print(f"[INIT] Initialized PIDsLinkClient with name: {self.name}, config_prefix: {self._config_prefix}")
+        self._api = None
+        self._async_api = None
 
     def cfgkey(self, key):
         """Generate a configuration key."""
-        config_key = f"{self._config_prefix}_{key.upper()}"
-        print(f"[CFGKEY] Generated config key: {config_key}")
         return f"{self._config_prefix}_{key.upper()}"
 
     def cfg(self, key, default=None):
         """Get an application config value."""
         return current_app.config.get(self.cfgkey(key), default)
 
-    def generate_ark(record):
+    def generate_ark(self, record):
         """Generate an ARK identifier."""
-        print(f"[GENERATE_ARK] Starting ARK generation for record: {record}")
-        
-
-        url = f"https://baobabtest.wacren.net/records/{record.pid.pid_value}"
-        print(f"[GENERATE_ARK] Generated record URL: {url}")
-
-        body = {
-            'naan': "50962",
-            'shoulder': "/bb67854",
-            'url': url,
-            'metadata': "",
-            'type': "",
-            'commitment': "",
-            'identifier': "",
-            'format': "",
-            'relation': "",
-            'source': url
-        }
-        print(f"[GENERATE_ARK] Prepared request body: {body}")
-
-        base_
-        response_data = response
-        ark_format = response_data.ark
+        return self.mint_ark(self.landing_url(record))
+
+    def landing_url(self, record):
+        """Get the URL of the landing page of a record."""
+        return self.record_url(record.pid.pid_value)
+
+    def record_url(self, recid):
+        """Get the URL of the landing page of a record from its id.
+
+        Built from ``PIDSLINK_LANDING_URL`` and ``SITE_UI_URL``.
+        """
+        return self.cfg("landing_url", "{site_ui_url}/records/{recid}").format(
+            site_ui_url=current_app.config["SITE_UI_URL"], recid=recid
+        )
+
+    def mint_data(self, url):
+        """Build the PIDsLink mint request for an ARK targeting ``url``."""
+        naan, shoulder = self.cfg("prefix").split("/", 1)
+        return dict(
+            naan=naan,
+            shoulder=f"/{shoulder}",
+            url=url,
+            metadata="",
+            type_="",
+            commitment="",
+            identifier="",
+            format_="",
+            relation="",
+            source=url,
+        )
+
+    def mint_ark(self, url):
+        """Mint a new ARK targeting ``url``."""
+        response_data = self.api.post_pids(**self.mint_data(url))
+        ark_format = response_data.get("ark")
 
         if not ark_format:
             raise RuntimeError("ARK format not found in the response.")
 
         return ark_format
 
+    def update_data(self, url=None, metadata=None):
+        """Build the PIDsLink patch request of :py:meth:`update_ark`."""
+        return dict(url=url, metadata=metadata, source=url)
+
+    def hide_data(self, url=None):
+        """Build the PIDsLink patch request of :py:meth:`hide_ark`."""
+        return dict(url=url, metadata={"event": "hide"}, source=url, operation="hide")
+
+    def update_ark(self, ark, url=None, metadata=None):
+        """Point an ARK to ``url`` and/or update its metadata."""
+        return self.api.patch_pids(ark, **self.update_data(url, metadata))
+
+    def hide_ark(self, ark, url=None):
+        """Hide an ARK, e.g. when its record becomes restricted.
+
+        :param url: New target of the ARK, if it changed too.
+        """
+        return self.api.patch_pids(ark, **self.hide_data(url))
+
+    def invalidate_ark(self, ark):
+        """Forget the cached PIDsLink state of an ARK."""
+        if self.api.cache is not None:
+            self.api.cache.invalidate(ark)
+
     def check_credentials(self, **kwargs):
         """Check if the client has the necessary credentials set up.
 
@@ -93,9 +210,93 @@ class PIDsLinkClient:
                 self.cfg("password"),
                 self.cfg("prefix"),
                 self.cfg("test_mode", True),
+                url=self.cfg("url"),
+                timeout=self.cfg("timeout"),
+                session_pool=get_session_pool(
+                    pool_connections=self.cfg("pool_connections", 4),
+                    pool_maxsize=self.cfg("pool_maxsize", 10),
+                    pool_block=self.cfg("pool_block", False),
+                    keepalive=self.cfg("pool_keepalive", True),
+                ),
+                retry_policy=RetryPolicy(
+                    max_attempts=self.cfg("retry_max_attempts", 3),
+                    backoff_base=self.cfg("retry_backoff_base", 0.5),
+                    backoff_max=self.cfg("retry_backoff_max", 8),
+                    deadline=self.cfg("retry_deadline", 30),
+                    budget=_retry_budget(self.cfg("retry_budget", 0.2)),
+                ),
+                circuit_breaker=CircuitBreaker(
+                    store=(
+                        RedisBreakerStore(self.redis)
+                        if self.redis is not None
+                        else LocalBreakerStore()
+                    ),
+                    failure_threshold=self.cfg("breaker_failure_threshold", 5),
+                    failure_window=self.cfg("breaker_failure_window", 60),
+                    reset_timeout=self.cfg("breaker_reset_timeout", 30),
+                ),
+                cache=(
+                    _resolution_cache(
+                        self.redis,
+                        self.cfg("cache_size", 4096),
+                        self.cfg("cache_local_ttl", 30),
+                        self.cfg("cache_ttl", 3600),
+                        self.cfg("cache_negative_ttl", 60),
+                    )
+                    if self.cfg("cache_enabled", True)
+                    else None
+                ),
+                rate_limiter=(
+                    RateLimiter(
+                        store=_rate_limit_store(self.redis),
+                        rate=self.cfg("rate_limit"),
+                        burst=self.cfg("rate_limit_burst", 20),
+                        reserve=self.cfg("rate_limit_reserve", 5),
+                        max_wait=self.cfg("rate_limit_max_wait"),
+                        metrics=self.metrics,
+                    )
+                    if self.cfg("rate_limit")
+                    else None
+                ),
+                metrics=self.metrics,
             )
         return self._api
 
+    @property
+    def redis(self):
+        """Redis client for state shared by all processes.
+
+        Uses ``PIDSLINK_REDIS_URL``, or ``CACHE_REDIS_URL`` if not set.
+        """
+        url = self.cfg("redis_url") or current_app.config.get("CACHE_REDIS_URL")
+        return _redis_client(url) if url else None
+
+    @property
+    def metrics(self):
+        """Metrics registry of the PIDsLink calls, if enabled."""
+        if not self.cfg("metrics_enabled", True):
+            return None
+        return _metrics_registry(self.redis)
+
+    @property
+    def async_api(self):
+        """PIDsLink asyncio REST API client instance.
+
+        Shares the pooled sessions of :py:attr:`api`, for batch jobs that
+        keep many requests in flight.
+        """
+        if self._async_api is None:
+            self._async_api = PIDsLinkAsyncRESTClient(
+                self.api, max_concurrency=self.cfg("max_concurrency", 16)
+            )
+        return self._async_api
+
+    def close(self):
+        """Shut down the thread pool of :py:attr:`async_api`, if created."""
+        if self._async_api is not None:
+            self._async_api.close()
+            self._async_api = None
+
 
 class PIDsLinkPIDProvider(PIDProvider):
     """PIDsLink Provider class.
@@ -111,6 +312,7 @@ class PIDsLinkPIDProvider(PIDProvider):
         self,
         id_,
         client=None,
+        serializer=None,
         pid_type="ark",
         default_status=PIDStatus.NEW,
         **kwargs,
@@ -119,6 +321,7 @@ class PIDsLinkPIDProvider(PIDProvider):
         super().__init__(
             id_,
             client=(client or PIDsLinkClient("pidslink", config_prefix="PIDSLINK")),
+            serializer=(serializer or CachedSerializer(ERCSerializer())),
             pid_type=pid_type,
             default_status=PIDStatus.NEW,
             managed=True,
@@ -148,13 +351,136 @@ class PIDsLinkPIDProvider(PIDProvider):
                 error_prefix = f"Error in `{field}`: " if field else "Error: "
                 current_app.logger.error(f"{error_prefix}{reason}")
 
-    
-    # LOGGING_FS_LEVEL="DEBUG"
-    # current_app.logger.debug("My message")
     def generate_id(self, record, **kwargs):
-        """Generate a unique ARK."""
-        # Delegate to client
-        return self.client.generate_ark(record)
+        """Generate a unique ARK.
+
+        When ``PIDSLINK_RESERVE_ENABLED`` is set, the ARK is taken from the
+        pool of pre-minted ARKs so that publishing does not wait on PIDsLink.
+        An ARK is only minted inline when the pool is empty, through the
+        mint ledger (see :py:class:`ARKMintLedger`): a retried publish gets
+        the ARK minted by the failed attempt back without calling PIDsLink.
+        """
+        shoulder = self.client.cfg("prefix")
+        record_pid = record.pid.pid_value
+        # a retried or concurrent publish reuses the ARK minted for the record
+        ark = self._minted_arks([record_pid], shoulder).get(record_pid)
+        if ark:
+            return ark
+
+        if self.client.cfg("reserve_enabled", False):
+            # avoid circular import
+            from ..tasks import refill_ark_reservations
+
+            reservation = ARKReservation.claim(shoulder, record_pid)
+            low_water = self.client.cfg("reserve_low_water", 20)
+            if ARKReservation.count_available(shoulder) < low_water:
+                refill_ark_reservations.delay()
+            if reservation is not None:
+                return reservation.ark
+            current_app.logger.warning(
+                "PIDsLink ARK reservation pool is empty, minting inline."
+            )
+
+        wait = self.client.cfg("mint_ledger_wait", 5)
+        if not ARKMintLedger.intend([record_pid], shoulder, stale=wait):
+            # claimed by a concurrent publish since the ledger was checked
+            ark = self._minted_arks([record_pid], shoulder).get(record_pid)
+            if ark:
+                return ark
+            raise RuntimeError(f"ARK of record {record_pid} is being minted.")
+        try:
+            ark = self.client.generate_ark(record)
+        except Exception:
+            ARKMintLedger.release([record_pid], shoulder)
+            raise
+        ARKMintLedger.record({record_pid: ark}, shoulder)
+        return ark
+
+    def _minted_arks(self, record_pids, shoulder):
+        """Get the ARKs already minted for records from the mint ledger.
+
+        If other processes are minting the ARKs of some records, waits up to
+        ``PIDSLINK_MINT_LEDGER_WAIT`` seconds for their result.
+
+        :returns: Dict of ``{record pid: ark}`` of the minted ARKs.
+        """
+        wait = self.client.cfg("mint_ledger_wait", 5)
+        deadline = time.monotonic() + wait
+        while True:
+            ledger = ARKMintLedger.get_many(record_pids, shoulder)
+            arks = {pid: ark for pid, (ark, _) in ledger.items() if ark}
+            # intents left for longer by a process that died while minting
+            stale = datetime.utcnow() - timedelta(seconds=wait)
+            pending = [
+                pid
+                for pid, (ark, updated) in ledger.items()
+                if not ark and updated >= stale
+            ]
+            if not pending or time.monotonic() >= deadline:
+                return arks
+            time.sleep(0.1)
+
+    def mint_many(self, records, async_api=None):
+        """Mint the ARKs of many records concurrently.
+
+        Goes through the mint ledger as :py:meth:`generate_id` does: records
+        that already had an ARK minted get it back without calling PIDsLink.
+
+        :param records: Dict of ``{key: record}``.
+        :param async_api: The :py:class:`PIDsLinkAsyncRESTClient` to use,
+            defaults to the one of the client.
+        :returns: Dict of ``{key: ark}``; records whose ARK could not be
+            minted are logged and left out.
+        """
+        async_api = async_api or self.client.async_api
+        shoulder = self.client.cfg("prefix")
+        wait = self.client.cfg("mint_ledger_wait", 5)
+        record_pids = {key: record.pid.pid_value for key, record in records.items()}
+        ledger = ARKMintLedger.get_many(list(record_pids.values()), shoulder)
+
+        arks = {}
+        for key, record_pid in record_pids.items():
+            ark, _ = ledger.get(record_pid, (None, None))
+            if ark:
+                arks[key] = ark
+        missing = [key for key in records if key not in arks]
+        claimed = ARKMintLedger.intend(
+            [record_pids[key] for key in missing], shoulder, stale=wait
+        )
+        # ARKs minted concurrently by other processes are waited for
+        others = [key for key in missing if record_pids[key] not in claimed]
+        if others:
+            waited = self._minted_arks([record_pids[key] for key in others], shoulder)
+            for key in others:
+                if record_pids[key] in waited:
+                    arks[key] = waited[record_pids[key]]
+                else:
+                    current_app.logger.warning(
+                        f"ARK of record {key} is being minted by another process."
+                    )
+        missing = [key for key in missing if record_pids[key] in claimed]
+
+        minted, failed = {}, []
+        results = collect(
+            async_api.mint_many(
+                (key, self.client.mint_data(self.client.landing_url(records[key])))
+                for key in missing
+            )
+        )
+        for result in results:
+            ark = result.value.get("ark") if result.error is None else None
+            if not ark:
+                failed.append(record_pids[result.key])
+                current_app.logger.warning(
+                    f"PIDsLink error when minting ARK of record {result.key}: "
+                    f"{result.error}"
+                )
+                continue
+            minted[record_pids[result.key]] = ark
+            arks[result.key] = ark
+        ARKMintLedger.record(minted, shoulder)
+        ARKMintLedger.release(failed, shoulder)
+        return arks
 
     @classmethod
     def is_enabled(cls, app):
@@ -165,73 +491,241 @@ class PIDsLinkPIDProvider(PIDProvider):
         """Checks if the PID can be modified."""
         return not pid.is_registered() and not pid.is_reserved()
 
+    @staticmethod
+    def _is_restricted(record):
+        """Check if the record (or draft/parent chain of records) is restricted."""
+        if isinstance(record, ChainObject):
+            return record._child["access"]["record"] == "restricted"
+        return record["access"]["record"] == "restricted"
+
+    def _get_pids(self, records):
+        """Get the ARKs of records with a single PIDStore query, by record id."""
+        ids = [record.id for record in records]
+        if not ids:
+            return {}
+        pids = PersistentIdentifier.query.filter(
+            PersistentIdentifier.pid_type == self.pid_type,
+            PersistentIdentifier.object_type == "rec",
+            PersistentIdentifier.object_uuid.in_(ids),
+        )
+        return {str(pid.object_uuid): pid for pid in pids}
+
+    @staticmethod
+    def _set_status(pids, status):
+        """Set the status of PIDs with a single UPDATE statement."""
+        if not pids:
+            return
+        PersistentIdentifier.query.filter(
+            PersistentIdentifier.id.in_([pid.id for pid in pids])
+        ).update({"status": status}, synchronize_session=False)
+        for pid in pids:
+            set_committed_value(pid, "status", status)
+
+    def _update_operation(self, record, url, state, pending=False):
+        """Get the outbox operation bringing an ARK up to date, if any.
+
+        Only the fields that changed since the last acknowledged operation
+        are sent, and nothing is sent if neither the fields PIDsLink holds
+        nor the visibility of the ARK changed.
+
+        :param state: The :py:class:`ARKState` of the ARK, or ``None``.
+        :param pending: Whether the ARK has pending outbox operations, in
+            which case what PIDsLink will hold is not known and everything
+            is sent.
+        :returns: ``(operation, payload)`` or ``None``.
+        """
+        if pending:
+            state = None
+        if self._is_restricted(record):
+            if state is None or not state.hidden:
+                return OutboxOperation.HIDE, {}
+            return None
+
+        doc = self.serializer.dump_obj(record)
+        fields = {"url": url, "metadata": doc} if url else {"metadata": doc}
+        changes = state.changes(fields) if state is not None else dict(fields)
+        if state is None or state.hidden:
+            # Required for ARK to make the ARK findable in the case it was hidden before.
+            changes["metadata"] = {**doc, "event": "publish"}
+        if not changes:
+            return None
+        return OutboxOperation.UPDATE, changes
+
+    @staticmethod
+    def _send(signal, pid, record):
+        """Send an ARK signal once the transaction is committed."""
+        send_after_commit(
+            signal,
+            ark=pid.pid_value,
+            recid=record.pid.pid_value,
+            record_id=str(record.id),
+        )
+
     def register(self, pid, record, **kwargs):
         """Register an ARK via the PIDsLink API.
 
+        The PIDsLink call is written to the outbox and sent by a Celery task
+        after the transaction is committed.
+
         :param pid: the PID to register.
         :param record: the record metadata for the ARK.
         :returns: `True` if it is registered successfully.
         """
-        if isinstance(record, ChainObject):
-            if record._child["access"]["record"] == "restricted":
-                return False
-        elif record["access"]["record"] == "restricted":
+        if self._is_restricted(record):
             return False
 
         local_success = super().register(pid)
         if not local_success:
             return False
 
-        try:
-            doc = self.serializer.dump_obj(record)
-            url = kwargs["url"]
-            self.client.api.post(metadata=doc, url=url, ark=pid.pid_value)
-            return True
-        except PIDsLinkError as e:
-            current_app.logger.warning(
-                f"PIDsLink provider error when registering ARK for {pid.pid_value}"
-            )
-            self._log_errors(e)
+        # The ARK is bound to its landing page once the transaction is
+        # committed, so that publishing does not wait on PIDsLink.
+        fields = {"url": kwargs["url"], "metadata": self.serializer.dump_obj(record)}
+        PIDsLinkOutbox.add(pid.pid_value, OutboxOperation.REGISTER, fields)
+        self._send(ark_registered, pid, record)
+        return True
 
-            return False
+    def register_many(self, items):
+        """Register the ARKs of many records.
+
+        Same as :py:meth:`register`, with one query to load the ARKs, one
+        to register them and one to look up their pending outbox
+        operations, whatever the number of records. The PIDsLink calls are
+        sent concurrently by :py:func:`~baobab.pidslink.tasks.process_outbox`.
+
+        :param items: Iterable of ``(record, url)``.
+        :returns: Dict of ``{record id: registered}``.
+        """
+        items = list(items)
+        pids = self._get_pids(record for record, _ in items)
+
+        results = {}
+        registered = []
+        for record, url in items:
+            key = str(record.id)
+            pid = pids.get(key)
+            if pid is None or pid.is_deleted() or self._is_restricted(record):
+                results[key] = False
+                continue
+            registered.append((pid, record, url))
+            results[key] = True
+
+        self._set_status([pid for pid, _, _ in registered], PIDStatus.REGISTERED)
+
+        operations = []
+        for pid, record, url in registered:
+            fields = {"url": url, "metadata": self.serializer.dump_obj(record)}
+            operations.append((pid.pid_value, OutboxOperation.REGISTER, fields))
+        PIDsLinkOutbox.add_many(operations)
+        for pid, record, _ in registered:
+            self._send(ark_registered, pid, record)
+        return results
+
+    def create_and_register_many(self, items):
+        """Assign already minted ARKs to records and register them.
+
+        Creates the PIDs, stores them in the records and in the open drafts
+        of the records, and registers them with :py:meth:`register_many`.
+        Drafts must hold the ARK too, as publishing a draft sets the PIDs of
+        the record from the draft. The records and drafts still need to be
+        reindexed.
+
+        :param items: Iterable of ``(record, ark, url)``.
+        :returns: ``(registered, drafts)``: dict of ``{record id:
+            registered}``, and the ids of the drafts the ARKs were stored in.
+        """
+        items = list(items)
+        arks = {}
+        for record, ark, _ in items:
+            self.create(record, pid_value=ark)
+            pid_attrs = {"identifier": ark, "provider": self.name}
+            if self.client:
+                pid_attrs["client"] = self.client.name
+            record.pids["ark"] = pid_attrs
+            record.commit()
+            arks[str(record.id)] = pid_attrs
+
+        # only the records being edited have a draft
+        drafts = current_rdm_records_service.draft_cls.get_records(list(arks))
+        draft_ids = []
+        for draft in drafts:
+            draft.pids = {**(draft.pids or {}), "ark": arks[str(draft.id)]}
+            draft.commit()
+            draft_ids.append(str(draft.id))
+
+        registered = self.register_many((record, url) for record, _, url in items)
+        return registered, draft_ids
 
     def update(self, pid, record, url=None, **kwargs):
         """Update metadata associated with an ARK.
 
-        This can be called before/after an ARK is registered.
+        This can be called before/after an ARK is registered. As for
+        :py:meth:`register`, the PIDsLink call goes through the outbox.
+        Nothing is sent if neither the fields PIDsLink holds nor the
+        visibility of the ARK changed; otherwise only the changed fields
+        are sent.
         :param pid: the PID to register.
         :param record: the record metadata for the ARK.
         :returns: `True` if it is updated successfully.
         """
-        hide = False
-        if isinstance(record, ChainObject):
-            if record._child["access"]["record"] == "restricted":
-                hide = True
-        elif record["access"]["record"] == "restricted":
-            hide = True
-
-        try:
-            if hide:
-                self.client.api.hide_ark(ark=pid.pid_value)
-            else:
-                doc = self.serializer.dump_obj(record)
-                doc["event"] = (
-                    "publish"  # Required for ARK to make the ARK findable in the case it was hidden before.
-                )
-                self.client.api.update_ark(metadata=doc, ark=pid.pid_value, url=url)
-        except PIDsLinkError as e:
-            current_app.logger.warning(
-                f"PIDsLink provider error when updating ARK for {pid.pid_value}"
-            )
-            self._log_errors(e)
-
-            return False
+        state = ARKState.query.get(pid.pid_value)
+        pending = PIDsLinkOutbox.pending_operations([pid.pid_value])
+        update = self._update_operation(record, url, state, pid.pid_value in pending)
+        if update is not None:
+            operation, payload = update
+            self.client.invalidate_ark(pid.pid_value)
+            PIDsLinkOutbox.add(pid.pid_value, operation, payload)
+        self._send(ark_updated, pid, record)
 
         if pid.is_deleted():
             return pid.sync_status(PIDStatus.REGISTERED)
 
         return True
 
+    def update_many(self, items):
+        """Update the ARKs of many records.
+
+        Same as :py:meth:`update`, with one query each to load the ARKs,
+        their last acknowledged states, the ARKs with pending operations and
+        the pending outbox operations, and one to restore deleted ARKs,
+        whatever the number of records.
+
+        :param items: Iterable of ``(record, url)``; ``url`` may be ``None``.
+        :returns: Dict of ``{record id: updated}``; records without an ARK
+            are not updated.
+        """
+        items = list(items)
+        pids = self._get_pids(record for record, _ in items)
+        arks = [pid.pid_value for pid in pids.values()]
+        states = ARKState.get_many(arks)
+        pending = PIDsLinkOutbox.pending_operations(arks)
+
+        results = {}
+        operations = []
+        for record, url in items:
+            key = str(record.id)
+            pid = pids.get(key)
+            results[key] = pid is not None
+            if pid is None:
+                continue
+            ark = pid.pid_value
+            self._send(ark_updated, pid, record)
+            update = self._update_operation(
+                record, url, states.get(ark), ark in pending
+            )
+            if update is not None:
+                operation, payload = update
+                self.client.invalidate_ark(ark)
+                operations.append((ark, operation, payload))
+                # a later item of the same ARK must not assume it is up to date
+                pending[ark] = operation
+
+        PIDsLinkOutbox.add_many(operations)
+
+        self._set_status(
+            [pid for pid in pids.values() if pid.is_deleted()], PIDStatus.REGISTERED
+        )
+        return results
 
     def validate(self, record, identifier=None, provider=None, **kwargs):
         """Validate the attributes of the identifier.
@@ -249,9 +743,13 @@ class PIDsLinkPIDProvider(PIDProvider):
         # this point will have an ARK identifier (and that is fine in the case of initial
         # creation)
         if identifier is not None:
-            # Format check
+            # Format check, done offline so that validation does no I/O
             try:
-                self.client.api.check_ark(identifier)
+                validate_ark(
+                    identifier,
+                    prefix=self.client.cfg("prefix"),
+                    check_char=self.client.cfg("check_char", False),
+                )
             except ValueError as e:
                 # modifies the error in errors in-place
                 self._insert_pid_type_error_msg(errors, str(e))
@@ -286,207 +784,3 @@ class PIDsLinkPIDProvider(PIDProvider):
             if self.client:
                 pid_attrs["client"] = self.client.name
             record.pids["ark"] = pid_attrs
-
-
-# class PIDsLinkClient:
-#     """PIDsLink Client."""
-
-#     def __init__(self, name, config_prefix=None, **kwargs):
-#         """Constructor."""
-#         self.name = name
-#         self._config_prefix = config_prefix or "PIDSLINK"
-#         self._api = None
-#         print(f"[INIT] Initialized PIDsLinkClient with name: {self.name}, config_prefix: {self._config_prefix}")
-
-#     def cfgkey(self, key):
-#         """Generate a configuration key."""
-#         config_key = f"{self._config_prefix}_{key.upper()}"
-#         print(f"[CFGKEY] Generated config key: {config_key}")
-#         return config_key
-
-#     def cfg(self, key, default=None):
-#         """Get an application config value."""
-#         value = current_app.config.get(self.cfgkey(key), default)
-#         print(f"[CFG] Retrieved config value for key: {key}, value: {value}")
-#         return value
-
-#     def generate_ark(self, record):
-#         """Generate an ARK identifier."""
-#         print(f"[GENERATE_ARK] Starting ARK generation for record: {record}")
-        
-#         # Prepare the URL for the ARK identifier
-#         url = f"https://baobabtest.wacren.net/records/{record.pid.pid_value}"
-#         print(f"[GENERATE_ARK] Generated record URL: {url}")
-
-#         # Prepare the request body
-#         body = {
-#             'naan': "50962",
-#             'shoulder': "/bb67854",
-#             'url': url,
-#             'metadata': "",
-#             'type': "",
-#             'commitment': "",
-#             'identifier': "",
-#             'format': "",
-#             'relation': "",
-#             'source': url
-#         }
-#         print(f"[GENERATE_ARK] Prepared request body: {body}")
-
-#         # Make a POST request to mint a new ARK
-#         base_url = "https://pidslinkapi.ren.africa/api/pids/mint/baobab"
-#         print(f"[GENERATE_ARK] Sending POST request to: {base_url}")
-#         response = requests.post(base_url, json=body)
-
-#         print(f"[GENERATE_ARK] Response Status Code: {response.status_code}")
-#         try:
-#             response_data = response.json()  # Try to parse the response as JSON
-#             print(f"[GENERATE_ARK] Response JSON: {response_data}")
-#         except ValueError:
-#             raise RuntimeError(f"[GENERATE_ARK] Failed to decode JSON. Response: {response.text}")
-
-#         # Check for a successful response
-#         if response.status_code != 200:
-#             raise RuntimeError(f"[GENERATE_ARK] Failed to generate ARK. Status code: {response.status_code}, Response: {response.text}")
-
-#         # Extract the ARK from the response
-#         ark_format = response_data.get("ark")
-#         print(f"[GENERATE_ARK] Extracted ARK format: {ark_format}")
-
-#         if not ark_format:
-#             raise RuntimeError("[GENERATE_ARK] ARK format not found in the response.")
-        
-#         print(f"[GENERATE_ARK] Successfully generated ARK: {ark_format}")
-#         return ark_format
-
-#     def update_ark(self, pids_id, record, url=None):
-#         """Update metadata for an existing ARK."""
-#         print(f"[UPDATE_ARK] Starting update for ARK with PID ID: {pids_id}, URL: {url}")
-
-#         # Prepare the update request body
-#         body = {
-#             'url': url,
-#             'metadata': "",  # Add necessary metadata fields
-#             'type': "",
-#             'commitment': "",
-#             'identifier': "",
-#             'format': "",
-#             'relation': "",
-#             'source': url
-#         }
-#         print(f"[UPDATE_ARK] Prepared request body: {body}")
-
-#         # Make a PUT request to update the ARK
-#         update_url = f"https://pidslinkapi.ren.africa/api/pids/update/{pids_id}"
-#         print(f"[UPDATE_ARK] Sending PUT request to: {update_url}")
-#         response = requests.put(update_url, json=body)
-
-#         print(f"[UPDATE_ARK] Response Status Code: {response.status_code}")
-#         if response.status_code != 200:
-#             raise RuntimeError(f"[UPDATE_ARK] Failed to update ARK. Status code: {response.status_code}, Response: {response.text}")
-
-#         print(f"[UPDATE_ARK] Successfully updated ARK with PID ID: {pids_id}")
-#         return True
-
-#     def check_credentials(self, **kwargs):
-#         """Check if the client has the necessary credentials set up.
-
-#         If the client is running in test mode, credentials are not required.
-#         """
-#         print(f"[CHECK_CREDENTIALS] Checking credentials...")
-#         if not (self.cfg("username") and self.cfg("password") and self.cfg("prefix")):
-#             warnings.warn(
-#                 f"[CHECK_CREDENTIALS] The {self.__class__.__name__} is misconfigured. Please set "
-#                 f"{self.cfgkey('username')}, {self.cfgkey('password')}, and {self.cfgkey('prefix')} "
-#                 "in your configuration.",
-#                 UserWarning,
-#             )
-#         print(f"[CHECK_CREDENTIALS] Credentials check complete.")
-
-#     @property
-#     def api(self):
-#         """PIDsLink REST API client instance."""
-#         if self._api is None:
-#             print(f"[API] Initializing PIDsLinkRESTClient...")
-#             self.check_credentials()
-#             self._api = PIDsLinkRESTClient(
-#                 self.cfg("username"),
-#                 self.cfg("password"),
-#                 self.cfg("prefix"),
-#                 self.cfg("test_mode", True),
-#             )
-#             print(f"[API] PIDsLinkRESTClient initialized.")
-#         return self._api
-
-
-
-# class PIDsLinkPIDProvider(PIDProvider):
-#     """PIDsLink Provider class."""
-
-#     name = "ark"
-
-#     def __init__(
-#         self,
-#         id_,
-#         client=None,
-#         pid_type="ark",
-#         default_status=PIDStatus.NEW,
-#         **kwargs,
-#     ):
-#         """Constructor."""
-#         super().__init__(
-#             id_,
-#             client=(client or PIDsLinkClient("pidslink", config_prefix="PIDSLINK")),
-#             pid_type=pid_type,
-#             default_status=PIDStatus.NEW,
-#             managed=True,
-#             **kwargs
-#         )
-
-#     def generate_id(self, record, **kwargs):
-#         print("[GENERATE_ID] generate_id method called")
-#         pid_value = self.client.generate_ark(record)
-#         print(f"[GENERATE_ID] Generated PID value: {pid_value}")
-#         return pid_value
-
-#     @classmethod
-#     def is_enabled(cls, app):
-#         """Determine if pidslink is enabled or not."""
-#         return app.config.get("PIDSLINK_ENABLED", True)
-
-#     def register(self, pid, record, **kwargs):
-#         print(f"[REGISTER] Attempting to register PID: {pid.pid_value}")
-#         local_success = super().register(pid)
-#         print(f"[REGISTER] super().register(pid) returned: {local_success}")
-#         if not local_success:
-#             print("[REGISTER] Registration failed at super().register(pid)")
-#             return False
-
-#         try:
-#             url = f"https://baobabtest.wacren.net/records/{pid.pid_value}"
-#             print(f"[REGISTER] Generated URL: {url}", flush=True)
-#             print(f"[REGISTER] Calling generate_ark with record: {record}")
-#             ark = self.client.generate_ark(record)
-#             print(f"[REGISTER] Received ARK: {ark}", flush=True)
-#             current_app.logger.info(f"Successfully registered ARK: {ark}")
-#             return True
-#         except Exception as e:
-#             print(f"[REGISTER] Exception occurred: {e}", flush=True)
-#             current_app.logger.warning(
-#                 f"PIDsLink provider error when registering ARK for {pid.pid_value}"
-#             )
-#             self._log_errors(e)
-#             return False
-
-#     def update(self, pid, record, url, **kwargs):
-#         """Update metadata associated with an ARK."""
-#         try:
-#             self.client.update_ark(pid.pid_value, record, url)
-#             return True
-#         except PIDsLinkError as e:
-#             current_app.logger.warning(
-#                 f"PIDsLink provider error when updating ARK for {pid.pid_value}"
-#             )
-#             self._log_errors(e)
-#             return False
-
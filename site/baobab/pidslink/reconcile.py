@@ -0,0 +1,206 @@
+"""Incremental reconciliation of the ARKs with PIDsLink.
+
+The reconciliation job compares what PIDsLink holds for the registered ARKs
+with what it should hold, and records the differences as
+:py:class:`ARKDrift`. Each run only looks at the ARKs whose PID changed
+since the previous run: the ``updated`` timestamp and id of the last checked
+PID are kept as a high-water mark in a :py:class:`JobCheckpoint`. PIDs
+changed in the last ``PIDSLINK_RECONCILE_LAG`` seconds are left for the next
+run, so that transactions still in flight when the run starts are not
+skipped.
+
+The remote state is fetched with bounded concurrency, bypassing the
+resolution cache. ARKs with pending outbox operations are skipped, as
+PIDsLink is expected to lag behind for them, and so are ARKs whose query
+failed (they are logged; run a full reconciliation to check them again).
+Drifts can optionally be repaired by resending the ARK through the outbox.
+"""
+
+from datetime import datetime, timedelta
+
+from flask import current_app
+from invenio_db import db
+from invenio_pidstore.models import PersistentIdentifier, PIDStatus
+from invenio_rdm_records.proxies import current_rdm_records_service
+from sqlalchemy.orm import aliased
+
+from baobab.pidslink_service.async_client import PIDsLinkAsyncRESTClient, collect
+from baobab.pidslink_service.errors import PIDsLinkGoneError, PIDsLinkNotFoundError
+from baobab.pidslink_service.ratelimit import BATCH
+
+from .models import (
+    ARKDrift,
+    ARKDriftKind,
+    ARKDriftStatus,
+    ARKState,
+    JobCheckpoint,
+    PIDsLinkOutbox,
+)
+
+
+def changed_arks(since=None, after=None, until=None, batch_size=500):
+    """Stream the registered ARKs changed in a time range, by batches.
+
+    Uses keyset pagination on ``(updated, id)`` of the ARK PIDs.
+
+    :param since: Only return the ARKs updated after this time, or at this
+        time with an id greater than ``after``.
+    :param until: Only return the ARKs updated before this time.
+    :returns: Iterator of lists of ``(ark pid, recid)``.
+    """
+    ark = aliased(PersistentIdentifier)
+    recid = aliased(PersistentIdentifier)
+    query = (
+        db.session.query(ark, recid.pid_value)
+        .join(
+            recid,
+            db.and_(
+                recid.object_uuid == ark.object_uuid,
+                recid.object_type == "rec",
+                recid.pid_type == "recid",
+            ),
+        )
+        .filter(
+            ark.pid_type == "ark",
+            ark.object_type == "rec",
+            ark.status == PIDStatus.REGISTERED,
+        )
+        .order_by(ark.updated, ark.id)
+    )
+    if until is not None:
+        query = query.filter(ark.updated < until)
+    while True:
+        page = query
+        if since is not None:
+            page = query.filter(
+                db.or_(
+                    ark.updated > since,
+                    db.and_(ark.updated == since, ark.id > (after or 0)),
+                )
+            )
+        rows = page.limit(batch_size).all()
+        if not rows:
+            return
+        yield rows
+        since, after = rows[-1][0].updated, rows[-1][0].id
+
+
+def _remote_hidden(value):
+    """Check if the PIDsLink state of an ARK is hidden."""
+    metadata = value.get("metadata")
+    return isinstance(metadata, dict) and metadata.get("event") == "hide"
+
+
+def _repair(provider, pids, urls):
+    """Resend ARKs through the outbox.
+
+    The last sent states are forgotten, so that the full metadata, the
+    target and the visibility of the ARKs are sent again.
+    """
+    records = current_rdm_records_service.record_cls.get_records(
+        [pid.object_uuid for pid in pids.values()]
+    )
+    by_uuid = {str(record.id): record for record in records}
+    for ark, pid in pids.items():
+        ARKState.forget(ark)
+        provider.update(pid, by_uuid[str(pid.object_uuid)], url=urls[ark])
+
+
+def reconcile(
+    provider,
+    batch_size=500,
+    concurrency=None,
+    checkpoint="pidslink-reconcile",
+    full=False,
+    repair=False,
+):
+    """Compare the ARKs changed since the last run with PIDsLink.
+
+    :param provider: The :py:class:`PIDsLinkPIDProvider`.
+    :param batch_size: Number of ARKs per batch.
+    :param concurrency: Maximum number of PIDsLink requests in flight;
+        defaults to ``PIDSLINK_MAX_CONCURRENCY``.
+    :param checkpoint: Name of the :py:class:`JobCheckpoint` of the job.
+    :param full: Ignore the high-water mark and check all the ARKs.
+    :param repair: Resend the drifted ARKs through the outbox. ARKs missing
+        from PIDsLink cannot be resent and are only reported.
+    :returns: Iterator of the progress (``checked``, ``drifted``,
+        ``repaired`` and ``failed``) after each batch.
+    """
+    client = provider.client
+    mark = {} if full else JobCheckpoint.load(checkpoint)
+    since = mark.get("since")
+    since = datetime.fromisoformat(since) if since else None
+    until = datetime.utcnow() - timedelta(seconds=client.cfg("reconcile_lag", 300))
+    state = {"checked": 0, "drifted": 0, "repaired": 0, "failed": 0}
+
+    async_api = PIDsLinkAsyncRESTClient(
+        client.api,
+        max_concurrency=concurrency or client.cfg("max_concurrency", 16),
+        priority=BATCH,
+    )
+    try:
+        batches = changed_arks(since, mark.get("after"), until, batch_size)
+        for rows in batches:
+            pids = {pid.pid_value: pid for pid, _ in rows}
+            urls = {pid.pid_value: client.record_url(recid) for pid, recid in rows}
+            pending = PIDsLinkOutbox.pending_operations(list(pids))
+            checked = [ark for ark in pids if ark not in pending]
+            for ark in checked:
+                client.invalidate_ark(ark)
+
+            states = ARKState.get_many(checked)
+            drifts = ARKDrift.unresolved(checked)
+            found = {}
+            for result in collect(async_api.query_many(checked)):
+                ark, value, error = result
+                expected = {"url": urls[ark]}
+                if isinstance(error, (PIDsLinkNotFoundError, PIDsLinkGoneError)):
+                    found[ark, ARKDriftKind.MISSING] = (expected, None)
+                    continue
+                if error is not None:
+                    state["failed"] += 1
+                    current_app.logger.warning(
+                        f"PIDsLink error when reconciling ARK {ark}: {error}"
+                    )
+                    checked.remove(ark)
+                    continue
+
+                actual = {"url": value.get("url"), "hidden": _remote_hidden(value)}
+                if actual["url"] != expected["url"]:
+                    found[ark, ARKDriftKind.TARGET] = (expected, actual)
+                local = states.get(ark)
+                # without a last sent state the expected visibility is unknown
+                if local is not None and local.hidden != actual["hidden"]:
+                    found[ark, ARKDriftKind.VISIBILITY] = (
+                        {"hidden": local.hidden},
+                        actual,
+                    )
+
+            for (ark, kind), (expected, actual) in found.items():
+                drift = ARKDrift.report(
+                    ark, kind, expected, actual, drift=drifts.get((ark, kind))
+                )
+                if repair and kind != ARKDriftKind.MISSING:
+                    drift.status = ARKDriftStatus.REPAIRING
+            for (ark, kind), drift in drifts.items():
+                if ark in checked and (ark, kind) not in found:
+                    drift.status = ARKDriftStatus.RESOLVED
+
+            if repair:
+                repaired = {ark for ark, kind in found if kind != ARKDriftKind.MISSING}
+                _repair(provider, {ark: pids[ark] for ark in repaired}, urls)
+                state["repaired"] += len(repaired)
+
+            state["checked"] += len(checked)
+            state["drifted"] += len({ark for ark, _ in found})
+            last = rows[-1][0]
+            if not full:
+                JobCheckpoint.save(
+                    checkpoint,
+                    {"since": last.updated.isoformat(), "after": last.id},
+                )
+            db.session.commit()
+            yield dict(state)
+    finally:
+        async_api.close()
@@ -0,0 +1,220 @@
+"""Local resolution of ARKs to records.
+
+Each process keeps an index of the registered ARKs of published, public
+records to the PID of their record, so that finding the record of an ARK
+costs a single dict lookup. The index is shared through a Redis hash:
+
+* a process loads the whole hash the first time it resolves an ARK, and the
+  hash is built from the database by the first process that needs it;
+* ARKs registered or updated afterwards are added to or removed from the
+  hash (and the index of the process that changed them) by the
+  :py:data:`ark_registered` and :py:data:`ark_updated` receiver, and the ARKs
+  of deleted or restored records by the
+  :py:func:`~baobab.pidslink.tasks.update_ark_index` task;
+* other processes find new ARKs in the hash on their first lookup, and keep
+  them from then on.
+
+As the index of other processes may still hold removed ARKs, the record is
+checked with :py:func:`is_resolvable` before redirecting to it. Without
+Redis, each process builds its index from the database and looks up unknown
+ARKs in the database.
+"""
+
+import threading
+from functools import lru_cache
+
+from invenio_db import db
+from invenio_pidstore.models import PersistentIdentifier, PIDStatus
+from invenio_rdm_records.proxies import current_rdm_records_service
+from invenio_rdm_records.records.systemfields.deletion_status import (
+    RecordDeletionStatusEnum,
+)
+from sqlalchemy.orm import aliased
+
+from .ark import parse_ark
+from .provider.pidslink import PIDsLinkClient
+
+BUILT = "built"
+"""Field of the Redis hash marking it as complete (ARKs start with ``ark:``)."""
+
+
+def _resolvable(query, record_id):
+    """Filter a query on the published and public records."""
+    model = current_rdm_records_service.record_cls.model_cls
+    return query.join(model, model.id == record_id).filter(
+        model.deletion_status == RecordDeletionStatusEnum.PUBLISHED,
+        model.json["access"]["record"].as_string() == "public",
+    )
+
+
+def is_resolvable(recid):
+    """Check if the record of a PID is published and public.
+
+    :param recid: The record PID.
+    """
+    pid = aliased(PersistentIdentifier)
+    query = db.session.query(pid.id).filter(
+        pid.pid_type == "recid",
+        pid.object_type == "rec",
+        pid.pid_value == recid,
+    )
+    return _resolvable(query, pid.object_uuid).first() is not None
+
+
+class ARKIndex(object):
+    """Index of the registered ARKs of resolvable records to their PID.
+
+    ARKs are indexed by their normalized form (see
+    :py:func:`~baobab.pidslink.ark.parse_ark`).
+
+    :param redis: Redis client sharing the index between processes.
+    :param key: Key of the Redis hash.
+    """
+
+    def __init__(self, redis=None, key="pidslink:ark-index"):
+        """Initialize the index."""
+        self.redis = redis
+        self.key = key
+        self._lock = threading.Lock()
+        self._arks = None
+
+    @staticmethod
+    def _query(arks=None):
+        """Query the registered ARKs of resolvable records with their PID."""
+        ark = aliased(PersistentIdentifier)
+        recid = aliased(PersistentIdentifier)
+        query = db.session.query(ark.pid_value, recid.pid_value).join(
+            recid,
+            db.and_(
+                recid.object_uuid == ark.object_uuid,
+                recid.object_type == "rec",
+                recid.pid_type == "recid",
+            ),
+        )
+        query = _resolvable(query, ark.object_uuid).filter(
+            ark.pid_type == "ark",
+            ark.object_type == "rec",
+            ark.status == PIDStatus.REGISTERED,
+        )
+        if arks is not None:
+            query = query.filter(ark.pid_value.in_(arks))
+        return {str(parse_ark(value)): recid for value, recid in query}
+
+    def _load(self):
+        """Load the index of the process."""
+        arks = None
+        if self.redis is not None:
+            arks = {
+                key.decode("utf-8"): value.decode("utf-8")
+                for key, value in self.redis.hgetall(self.key).items()
+            }
+            # the hash is marked as built once complete
+            if arks.pop(BUILT, None) is None:
+                arks = None
+        if arks is None:
+            arks = self._query()
+            if self.redis is not None:
+                self.redis.hset(self.key, mapping={**arks, BUILT: "1"})
+        with self._lock:
+            self._arks = arks
+
+    @property
+    def arks(self):
+        """ARKs of the index of the process, by normalized base."""
+        if self._arks is None:
+            self._load()
+        return self._arks
+
+    def refresh(self, arks):
+        """Add or remove ARKs from the index, in this process and in Redis.
+
+        The registered ARKs of resolvable records are added, the others are
+        removed.
+        """
+        found = self._query(arks)
+        removed = {str(parse_ark(ark)) for ark in arks} - set(found)
+        if self.redis is not None:
+            pipe = self.redis.pipeline(transaction=False)
+            if found:
+                pipe.hset(self.key, mapping=found)
+            if removed:
+                pipe.hdel(self.key, *removed)
+            pipe.execute()
+        if self._arks is not None:
+            with self._lock:
+                self._arks.update(found)
+                for ark in removed:
+                    self._arks.pop(ark, None)
+
+    def get(self, ark):
+        """Get the PID of the record of an ARK.
+
+        :param ark: The normalized ARK.
+        :returns: The record PID or ``None``.
+        """
+        recid = self.arks.get(ark)
+        if recid is not None:
+            return recid
+
+        # registered by another process since the index was loaded
+        if self.redis is not None:
+            recid = self.redis.hget(self.key, ark)
+            recid = recid.decode("utf-8") if recid is not None else None
+        else:
+            recid = self._query([ark]).get(ark)
+        if recid is not None:
+            with self._lock:
+                self._arks[ark] = recid
+        return recid
+
+    def resolve(self, value):
+        """Resolve an ARK to the PID of its record.
+
+        The ARK resolves through the longest indexed ARK it starts with,
+        peeling its qualifiers off one at a time; the peeled part is returned
+        as qualifier. Truncated or mistyped ARKs do not resolve.
+
+        :param value: The ARK, optionally prefixed by a resolver URL.
+        :returns: ``(recid, qualifier)``; ``recid`` is ``None`` if the ARK
+            is unknown.
+        :raises ValueError: If ``value`` is not a syntactically valid ARK.
+        """
+        ark = parse_ark(value)
+        full = str(ark)
+        candidates = [full]
+        while True:
+            cut = max(candidates[-1].rfind("/"), candidates[-1].rfind("."))
+            if cut < len(ark.base):
+                break
+            candidates.append(candidates[-1][:cut])
+
+        # ARKs of the index of the process first, Redis or the database after
+        arks = self.arks
+        for candidate in candidates:
+            if candidate in arks:
+                return arks[candidate], full[len(candidate) :]
+        for candidate in candidates:
+            recid = self.get(candidate)
+            if recid is not None:
+                return recid, full[len(candidate) :]
+        return None, ark.qualifier
+
+
+@lru_cache(maxsize=None)
+def _ark_index(redis):
+    """Get the ARK index shared by all requests of the process."""
+    return ARKIndex(redis=redis)
+
+
+def get_ark_index():
+    """Get the ARK index of the process."""
+    return _ark_index(PIDsLinkClient("pidslink").redis)
+
+
+def index_ark(sender, ark, **kwargs):
+    """Refresh a registered or updated ARK in the index.
+
+    Receiver of :py:data:`~baobab.pidslink.signals.ark_registered` and
+    :py:data:`~baobab.pidslink.signals.ark_updated`.
+    """
+    get_ark_index().refresh([ark])
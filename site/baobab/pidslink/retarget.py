@@ -0,0 +1,139 @@
+"""Bulk retargeting of registered ARKs.
+
+When the landing URL of the records changes (e.g. ``SITE_UI_URL`` moves to a
+new host), every registered ARK must be pointed to its new target. The
+retargeting job streams the registered ARKs with the id of their record,
+compares the target PIDsLink holds (served from the resolution cache when
+possible) with the expected landing URL, and only retargets the ARKs that
+differ. Retargets are queued in the :py:class:`~.models.PIDsLinkOutbox`,
+in the same transaction as the checkpoint of the batch, so they are sent
+in order with the other operations on the ARKs (e.g. a record update
+written meanwhile). Progress is checkpointed after each batch, so an
+interrupted job resumes where it stopped.
+"""
+
+from flask import current_app
+from invenio_db import db
+from invenio_pidstore.models import PersistentIdentifier, PIDStatus
+from sqlalchemy.orm import aliased
+
+from baobab.pidslink_service.async_client import PIDsLinkAsyncRESTClient, collect
+from baobab.pidslink_service.ratelimit import BATCH
+
+from .models import ARKState, JobCheckpoint, OutboxOperation, PIDsLinkOutbox
+
+
+def registered_arks(after=None, batch_size=500):
+    """Stream the registered ARKs with the id of their record, by batches.
+
+    Uses keyset pagination on the ARK, so that each batch is a single
+    indexed query whatever the size of the catalogue.
+
+    :param after: Only return the ARKs sorted after this one.
+    :returns: Iterator of lists of ``(ark, recid)``.
+    """
+    ark = aliased(PersistentIdentifier)
+    recid = aliased(PersistentIdentifier)
+    query = (
+        db.session.query(ark.pid_value, recid.pid_value)
+        .join(
+            recid,
+            db.and_(
+                recid.object_uuid == ark.object_uuid,
+                recid.object_type == "rec",
+                recid.pid_type == "recid",
+            ),
+        )
+        .filter(
+            ark.pid_type == "ark",
+            ark.object_type == "rec",
+            ark.status == PIDStatus.REGISTERED,
+        )
+        .order_by(ark.pid_value)
+    )
+    while True:
+        page = query.filter(ark.pid_value > after) if after else query
+        rows = page.limit(batch_size).all()
+        if not rows:
+            return
+        yield rows
+        after = rows[-1][0]
+
+
+def retarget(
+    client,
+    batch_size=500,
+    concurrency=None,
+    checkpoint="pidslink-retarget",
+    restart=False,
+    dry_run=False,
+):
+    """Point all registered ARKs to their current landing URL.
+
+    :param client: The :py:class:`PIDsLinkClient`.
+    :param batch_size: Number of ARKs per batch.
+    :param concurrency: Maximum number of PIDsLink requests in flight;
+        defaults to ``PIDSLINK_MAX_CONCURRENCY``.
+    :param checkpoint: Name of the :py:class:`JobCheckpoint` of the job.
+    :param restart: Ignore the checkpoint and start over.
+    :param dry_run: Only compare the targets, do not retarget (nor
+        checkpoint).
+    :returns: Iterator of the progress (``checked``, ``retargeted``,
+        ``failed`` and ``after``) after each batch; ``retargeted`` counts
+        the ARKs queued for retargeting, ``failed`` the ARKs that could not
+        be queried.
+    """
+    if restart and not dry_run:
+        JobCheckpoint.clear(checkpoint)
+        db.session.commit()
+    state = {} if dry_run else JobCheckpoint.load(checkpoint)
+    for counter in ("checked", "retargeted", "failed"):
+        state.setdefault(counter, 0)
+
+    async_api = PIDsLinkAsyncRESTClient(
+        client.api,
+        max_concurrency=concurrency or client.cfg("max_concurrency", 16),
+        priority=BATCH,
+    )
+    try:
+        for rows in registered_arks(state.get("after"), batch_size):
+            targets = {ark: client.record_url(recid) for ark, recid in rows}
+
+            stale = {}
+            for result in collect(async_api.query_many(targets)):
+                if result.error is not None:
+                    state["failed"] += 1
+                    current_app.logger.warning(
+                        f"PIDsLink error when querying ARK {result.key}: "
+                        f"{result.error}"
+                    )
+                elif result.value.get("url") != targets[result.key]:
+                    stale[result.key] = targets[result.key]
+
+            if stale and not dry_run:
+                states = ARKState.get_many(list(stale))
+                pending = PIDsLinkOutbox.pending_operations(list(stale))
+                operations = []
+                for ark, url in stale.items():
+                    current = states.get(ark)
+                    hidden = current is not None and current.hidden
+                    if ark in pending:
+                        # the retarget may be merged into the pending operation
+                        hidden = pending[ark] == OutboxOperation.HIDE
+                    # hidden ARKs are retargeted without becoming findable
+                    operation = (
+                        OutboxOperation.HIDE if hidden else OutboxOperation.UPDATE
+                    )
+                    operations.append((ark, operation, {"url": url}))
+                    client.invalidate_ark(ark)
+                PIDsLinkOutbox.add_many(operations)
+            state["retargeted"] += len(stale)
+
+            state["checked"] += len(rows)
+            state["after"] = rows[-1][0]
+            if not dry_run:
+                JobCheckpoint.save(checkpoint, state)
+                db.session.commit()
+            yield dict(state)
+    finally:
+        async_api.close()
@@ -0,0 +1,98 @@
+"""Serializers for the metadata registered with ARKs."""
+
+from invenio_rdm_records.utils import ChainObject
+
+from baobab.pidslink_service.cache import MISSING, LRUCache
+
+serializer_cache = LRUCache(maxsize=1024)
+"""Serialized records shared by all :py:class:`CachedSerializer` instances."""
+
+
+class ERCSerializer:
+    """Serialize a record to the ERC kernel stored with its ARK.
+
+    The Electronic Resource Citation kernel (who, what, when) describes the
+    object an ARK identifies. The "where" element is the ARK target URL,
+    which is sent separately.
+    """
+
+    def dump_obj(self, record):
+        """Dump a record (or a draft/parent chain of records)."""
+        try:
+            metadata = record["metadata"]
+        except KeyError:
+            metadata = {}
+
+        creators = [
+            creator.get("person_or_org", {}).get("name")
+            for creator in metadata.get("creators", [])
+        ]
+        return {
+            "who": "; ".join(name for name in creators if name),
+            "what": metadata.get("title", ""),
+            "when": metadata.get("publication_date", ""),
+            "publisher": metadata.get("publisher", ""),
+        }
+
+
+class CachedSerializer:
+    """Memoize the output of a serializer per record revision.
+
+    Entries are keyed by record id, revision id and serializer class, so the
+    same record revision is only serialized once, whichever provider or
+    export path asks for it. A draft/parent chain of records is keyed by
+    the revisions of both records. Records without a revision (not yet
+    stored) are always serialized. The cache is bounded and evicts the least
+    recently used entries.
+
+    :param serializer: Serializer to memoize.
+    :param cache: :py:class:`LRUCache` holding the serialized records;
+        defaults to :py:data:`serializer_cache`.
+    """
+
+    def __init__(self, serializer, cache=None):
+        """Constructor."""
+        self.serializer = serializer
+        self.cache = cache if cache is not None else serializer_cache
+        serializer_cls = type(serializer)
+        self._name = f"{serializer_cls.__module__}.{serializer_cls.__qualname__}"
+
+    @staticmethod
+    def revision(record):
+        """Get the ids and revisions of a record, or ``None`` if not stored."""
+        if isinstance(record, ChainObject):
+            records = (record._parent, record._child)
+        else:
+            records = (record,)
+        key = ()
+        for obj in records:
+            record_id = getattr(obj, "id", None)
+            revision_id = getattr(obj, "revision_id", None)
+            if record_id is None or revision_id is None:
+                return None
+            key += (str(record_id), revision_id)
+        return key
+
+    def dump_obj(self, record):
+        """Dump a record, from the cache if this revision was already dumped."""
+        revision = self.revision(record)
+        if revision is None:
+            return self.serializer.dump_obj(record)
+
+        key = (revision, self._name)
+        obj = self.cache.get(key)
+        if obj is MISSING:
+            obj = self.serializer.dump_obj(record)
+            self.cache.set(key, obj)
+        # callers may add or replace keys of the dump
+        return dict(obj)
+
+
+def serializer_cache_stats():
+    """Get the hit and miss counters of :py:data:`serializer_cache`."""
+    return {
+        "size": len(serializer_cache),
+        "maxsize": serializer_cache.maxsize,
+        "hits": serializer_cache.hits,
+        "misses": serializer_cache.misses,
+    }
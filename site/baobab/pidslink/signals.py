@@ -0,0 +1,46 @@
+"""Signals sent when the ARKs of records change.
+
+Signals are sent with the application as sender, once the transaction that
+changed the ARKs is committed, so that receivers never see changes that are
+rolled back. Keyword arguments are ``ark``, ``recid`` (the record PID) and
+``record_id`` (the record UUID).
+"""
+
+from blinker import Namespace
+from flask import current_app
+from invenio_db import db
+from sqlalchemy import event
+
+_signals = Namespace()
+
+ark_registered = _signals.signal("ark-registered")
+"""An ARK was registered for a record, i.e. the record was published."""
+
+ark_updated = _signals.signal("ark-updated")
+"""The record of a registered ARK was updated (metadata or access)."""
+
+
+def send_after_commit(signal, **kwargs):
+    """Send a signal once the current transaction is committed."""
+    session = db.session()
+    pending = session.info.setdefault("baobab_ark_signals", [])
+    if not pending:
+        event.listen(session, "after_commit", _send_pending, once=True)
+        event.listen(session, "after_rollback", _discard_pending, once=True)
+    pending.append((signal, kwargs))
+
+
+def _send_pending(session):
+    """Send the signals of the committed transaction."""
+    pending = session.info.pop("baobab_ark_signals", [])
+    sender = current_app._get_current_object()
+    for signal, kwargs in pending:
+        try:
+            signal.send(sender, **kwargs)
+        except Exception:
+            current_app.logger.exception(f"Error in a receiver of {signal.name}.")
+
+
+def _discard_pending(session):
+    """Forget the signals of a rolled back transaction."""
+    session.info.pop("baobab_ark_signals", None)
@@ -0,0 +1,333 @@
+"""Celery tasks for PIDsLink ARKs."""
+
+from datetime import datetime, timedelta
+
+from celery import shared_task
+from flask import current_app
+from invenio_db import db
+from invenio_rdm_records.proxies import current_rdm_records_service
+from sqlalchemy import exists
+from sqlalchemy.orm import aliased
+
+from baobab.pidslink_service.async_client import collect
+from baobab.pidslink_service.errors import (
+    HttpError,
+    PIDsLinkError,
+    PIDsLinkRequestError,
+    PIDsLinkTooManyRequestsError,
+)
+from baobab.pidslink_service.ratelimit import BATCH, request_priority
+
+from .models import (
+    ARKMintLedger,
+    ARKReservation,
+    ARKState,
+    OutboxOperation,
+    OutboxStatus,
+    PIDsLinkOutbox,
+)
+from .provider.pidslink import PIDsLinkClient, PIDsLinkPIDProvider, get_provider
+from .reconcile import reconcile
+from .resolver import get_ark_index
+from .retarget import retarget
+
+
+@shared_task(ignore_result=True)
+def refill_ark_reservations():
+    """Mint ARKs until the reservation pool is back to its target size.
+
+    Reserved ARKs target a placeholder URL until they are bound to their
+    record when it is registered. Overlapping runs may overfill the pool by
+    one batch, which is harmless as the extra ARKs are used later on.
+    """
+    client = PIDsLinkClient("pidslink")
+    prefix = client.cfg("prefix")
+    missing = client.cfg("reserve_size", 100) - ARKReservation.count_available(
+        prefix
+    )
+    if missing <= 0:
+        return
+
+    url = client.cfg("reserve_placeholder_url") or current_app.config["SITE_UI_URL"]
+    data = client.mint_data(url)
+    try:
+        with request_priority(BATCH):
+            results = collect(
+                client.async_api.mint_many((i, data) for i in range(missing))
+            )
+    finally:
+        client.close()
+    for result in results:
+        ark = result.value.get("ark") if result.error is None else None
+        if not ark:
+            current_app.logger.warning(
+                f"PIDsLink error when minting reserved ARK: {result.error}"
+            )
+            continue
+        db.session.add(ARKReservation(ark=ark, prefix=prefix))
+    db.session.commit()
+
+
+@shared_task(ignore_result=True)
+def register_record_pids(record_ids):
+    """Register the ARKs of records committed together.
+
+    ARKs are claimed from the reservation pool when it is enabled, and the
+    remaining ones are minted concurrently in a single batch, through the
+    mint ledger so that a retry reuses the ARKs already minted. Records that
+    already have an ARK are skipped, so the task can be safely retried.
+    Records whose ARK could not be minted are logged and keep no ARK.
+
+    :param record_ids: IDs of the records.
+    """
+    provider = get_provider()
+    client = provider.client
+    record_cls = current_rdm_records_service.record_cls
+
+    records = {}
+    for record_id in record_ids:
+        record = record_cls.get_record(record_id)
+        if "ark" not in (record.get("pids") or {}):
+            records[str(record.id)] = record
+    if not records:
+        return
+
+    urls = {key: client.landing_url(record) for key, record in records.items()}
+
+    # ARKs minted by a previous attempt are reused before claiming any
+    prefix = client.cfg("prefix")
+    ledger = ARKMintLedger.get_many(
+        [record.pid.pid_value for record in records.values()], prefix
+    )
+    arks = {}
+    for key, record in records.items():
+        ark, _ = ledger.get(record.pid.pid_value, (None, None))
+        if ark:
+            arks[key] = ark
+
+    if client.cfg("reserve_enabled", False):
+        for key, record in records.items():
+            if key in arks:
+                continue
+            reservation = ARKReservation.claim(prefix, record.pid.pid_value)
+            if reservation is None:
+                break
+            arks[key] = reservation.ark
+        if ARKReservation.count_available(prefix) < client.cfg("reserve_low_water", 20):
+            refill_ark_reservations.delay()
+
+    arks.update(
+        provider.mint_many({key: r for key, r in records.items() if key not in arks})
+    )
+
+    # binds the ARKs to the records (and their open drafts) and sends their
+    # metadata through the outbox
+    _, drafts = provider.create_and_register_many(
+        (records[key], ark, urls[key]) for key, ark in arks.items()
+    )
+    db.session.commit()
+
+    current_rdm_records_service.indexer.bulk_index(list(arks))
+    current_rdm_records_service.draft_indexer.bulk_index(drafts)
+
+
+@shared_task(ignore_result=True)
+def retarget_arks(batch_size=None, restart=False):
+    """Point all registered ARKs to their current landing URL.
+
+    See :py:mod:`baobab.pidslink.retarget`. Resumes from the checkpoint of
+    the previous run unless ``restart`` is set.
+    """
+    client = PIDsLinkClient("pidslink")
+    batch_size = batch_size or client.cfg("retarget_batch_size", 500)
+    for state in retarget(client, batch_size=batch_size, restart=restart):
+        current_app.logger.info(
+            f"PIDsLink retargeting: {state['checked']} ARKs checked, "
+            f"{state['retargeted']} queued, {state['failed']} failed."
+        )
+
+
+@shared_task(ignore_result=True)
+def reconcile_arks(full=False, repair=None):
+    """Compare the ARKs changed since the previous run with PIDsLink.
+
+    See :py:mod:`baobab.pidslink.reconcile`.
+
+    :param repair: Resend the drifted ARKs; defaults to
+        ``PIDSLINK_RECONCILE_REPAIR``.
+    """
+    provider = get_provider()
+    client = provider.client
+    if repair is None:
+        repair = client.cfg("reconcile_repair", False)
+    for state in reconcile(
+        provider,
+        batch_size=client.cfg("reconcile_batch_size", 500),
+        full=full,
+        repair=repair,
+    ):
+        current_app.logger.info(
+            f"PIDsLink reconciliation: {state['checked']} ARKs checked, "
+            f"{state['drifted']} drifted, {state['repaired']} repaired, "
+            f"{state['failed']} failed."
+        )
+
+
+@shared_task(ignore_result=True)
+def update_ark_index(record_ids):
+    """Add or remove the ARKs of records from the ARK index.
+
+    See :py:mod:`baobab.pidslink.resolver`.
+
+    :param record_ids: UUIDs of the records.
+    """
+    records = current_rdm_records_service.record_cls.get_records(
+        record_ids, with_deleted=True
+    )
+    arks = [
+        record["pids"]["ark"]["identifier"]
+        for record in records
+        if "ark" in (record.get("pids") or {})
+    ]
+    if arks:
+        get_ark_index().refresh(arks)
+
+
+@shared_task(ignore_result=True)
+def process_outbox():
+    """Send pending outbox operations to PIDsLink.
+
+    Only the oldest pending operation of each ARK is picked, so operations on
+    an ARK are applied in order, and the operations of a batch are sent
+    concurrently with the asyncio client. Failed operations are retried with
+    exponential backoff; client errors (4xx but 429) and operations exceeding
+    ``PIDSLINK_OUTBOX_MAX_ATTEMPTS`` are moved to the dead-letter state, which
+    unblocks the following operations of the ARK. Errors are handled per
+    operation, so the batch is always committed. The :py:class:`ARKState` of
+    an ARK is only recorded once PIDsLink acknowledged the operation.
+    """
+    client = PIDsLinkClient("pidslink")
+    batch_size = client.cfg("outbox_batch_size", 100)
+    max_attempts = client.cfg("outbox_max_attempts", 10)
+    retry_delay = client.cfg("outbox_retry_delay", 60)
+
+    now = datetime.utcnow()
+    earlier = aliased(PIDsLinkOutbox)
+    entries = (
+        PIDsLinkOutbox.query.filter(
+            PIDsLinkOutbox.status == OutboxStatus.PENDING,
+            PIDsLinkOutbox.available_at <= now,
+            ~exists().where(
+                earlier.ark == PIDsLinkOutbox.ark,
+                earlier.status == OutboxStatus.PENDING,
+                earlier.id < PIDsLinkOutbox.id,
+            ),
+        )
+        .order_by(PIDsLinkOutbox.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+
+    # an operation that cannot be built fails on its own, not the whole batch
+    patches, errors = {}, {}
+    for entry in entries:
+        try:
+            patches[entry.ark] = _patch_data(client, entry)
+        except Exception as e:
+            errors[entry.ark] = e
+
+    # ARKs are unique in the batch, so their operations can be sent concurrently
+    by_ark = {entry.ark: entry for entry in entries}
+    done = []
+    try:
+        results = collect(client.async_api.patch_many(patches.items()))
+        errors.update((result.key, result.error) for result in results)
+    except Exception as e:
+        errors.update((ark, e) for ark in patches)
+    finally:
+        client.close()
+    for ark, e in errors.items():
+        entry = by_ark[ark]
+        entry.attempts += 1
+        if e is None:
+            entry.status = OutboxStatus.DONE
+            entry.last_error = None
+            done.append(entry)
+            continue
+
+        entry.last_error = str(e) or repr(e)
+        permanent = isinstance(e, PIDsLinkRequestError) and not isinstance(
+            e, PIDsLinkTooManyRequestsError
+        )
+        if isinstance(e, PIDsLinkError):
+            PIDsLinkPIDProvider._log_errors(e)
+        elif not isinstance(e, HttpError):
+            # unexpected errors are retried, and dead-lettered like the others
+            current_app.logger.error(
+                f"Error in PIDsLink {entry.operation.name} of ARK {entry.ark}.",
+                exc_info=e,
+            )
+        if permanent or entry.attempts >= max_attempts:
+            entry.status = OutboxStatus.DEAD
+            # PIDsLink may not hold what was recorded as sent
+            ARKState.forget(entry.ark)
+            current_app.logger.error(
+                f"PIDsLink {entry.operation.name} of ARK {entry.ark} failed "
+                f"permanently after {entry.attempts} attempt(s)."
+            )
+        else:
+            delay = retry_delay * 2 ** (entry.attempts - 1)
+            entry.available_at = now + timedelta(seconds=delay)
+
+    states = ARKState.get_many([entry.ark for entry in done])
+    for entry in done:
+        ARKState.record(
+            entry.ark,
+            _sent_fields(entry),
+            hidden=entry.operation == OutboxOperation.HIDE,
+            state=states.get(entry.ark) or ARKState(ark=entry.ark, fingerprints={}),
+        )
+    db.session.commit()
+
+    if len(entries) == batch_size:
+        process_outbox.delay()
+
+
+@shared_task(ignore_result=True)
+def purge_outbox():
+    """Delete the sent outbox operations older than the retention period.
+
+    Operations are kept ``PIDSLINK_OUTBOX_RETENTION`` days for auditing;
+    dead-lettered operations are kept until they are handled manually.
+    """
+    retention = current_app.config.get("PIDSLINK_OUTBOX_RETENTION", 30)
+    before = datetime.utcnow() - timedelta(days=retention)
+    deleted = PIDsLinkOutbox.purge(before)
+    current_app.logger.info(f"{deleted} sent PIDsLink outbox operations purged.")
+
+
+def _patch_data(client, entry):
+    """Build the PIDsLink patch request of an outbox operation."""
+    if entry.operation == OutboxOperation.HIDE:
+        # updates merged into the hide only keep their target, the metadata is
+        # sent in full when the ARK is published again
+        return client.hide_data(url=entry.payload.get("url"))
+    return client.update_data(**entry.payload)
+
+
+def _sent_fields(entry):
+    """Get the fields PIDsLink holds once an outbox operation is acknowledged."""
+    if entry.operation == OutboxOperation.HIDE:
+        # see _patch_data
+        url = entry.payload.get("url")
+        return {"url": url} if url else {}
+    fields = dict(entry.payload)
+    if "metadata" in fields:
+        # the event only changes the visibility of the ARK
+        fields["metadata"] = {
+            name: value
+            for name, value in fields["metadata"].items()
+            if name != "event"
+        }
+    return fields
@@ -0,0 +1,41 @@
+"""Unit of work operations for PIDsLink ARKs."""
+
+from invenio_records_resources.services.uow import Operation
+
+from .tasks import register_record_pids
+
+
+class PIDRegistrationOp(Operation):
+    """Register the ARKs of the records of a unit of work after its commit.
+
+    A single operation is registered per unit of work: records added to it
+    are registered together by one
+    :py:func:`~baobab.pidslink.tasks.register_record_pids` task, which mints
+    their ARKs concurrently. No PIDsLink call is made while the transaction
+    is open.
+    """
+
+    def __init__(self):
+        """Constructor."""
+        self.record_ids = []
+
+    @classmethod
+    def get(cls, uow):
+        """Get the operation of a unit of work, registering it if needed."""
+        op = getattr(uow, "_pidslink_registration", None)
+        if op is None:
+            op = cls()
+            uow._pidslink_registration = op
+            uow.register(op)
+        return op
+
+    def add(self, record):
+        """Register the ARK of a record once the unit of work is committed."""
+        record_id = str(record.id)
+        if record_id not in self.record_ids:
+            self.record_ids.append(record_id)
+
+    def on_post_commit(self, uow):
+        """Send the records to PIDsLink as one batch."""
+        if self.record_ids:
+            register_record_pids.delay(self.record_ids)
@@ -1,7 +1,38 @@
 """Python API wrapper for the PIDsLink API."""
 
+from .async_client import PIDsLinkAsyncRESTClient, PIDsLinkResult
+from .breaker import CircuitBreaker, LocalBreakerStore, RedisBreakerStore
+from .cache import LRUCache, ResolutionCache
+from .metrics import MetricsRegistry
+from .ratelimit import (
+    LocalRateLimitStore,
+    RateLimiter,
+    RedisRateLimitStore,
+    request_priority,
+)
 from .rest_client import PIDsLinkRESTClient
+from .retry import RetryBudget, RetryPolicy
+from .session import PIDsLinkSessionPool, get_session_pool
 
 __version__ = '1.1.4'
 
-__all__ = ("__version__", "PIDsLinkRESTClient")
+__all__ = (
+    "__version__",
+    "CircuitBreaker",
+    "get_session_pool",
+    "LocalBreakerStore",
+    "LocalRateLimitStore",
+    "LRUCache",
+    "MetricsRegistry",
+    "PIDsLinkAsyncRESTClient",
+    "PIDsLinkRESTClient",
+    "PIDsLinkResult",
+    "PIDsLinkSessionPool",
+    "RateLimiter",
+    "RedisBreakerStore",
+    "RedisRateLimitStore",
+    "request_priority",
+    "ResolutionCache",
+    "RetryBudget",
+    "RetryPolicy",
+)
@@ -0,0 +1,174 @@
+"""Asyncio client for the PIDsLink API.
+
+The asyncio client runs the calls of a :py:class:`PIDsLinkRESTClient` on a
+bounded thread pool. Requests therefore share the pooled keep-alive sessions
+of the blocking client, and errors are mapped in exactly the same way through
+:py:meth:`PIDsLinkError.factory`.
+"""
+
+import asyncio
+import contextvars
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from .ratelimit import request_priority
+
+PIDsLinkResult = namedtuple("PIDsLinkResult", ["key", "value", "error"])
+"""Outcome of a batch operation.
+
+``key`` identifies the item of the batch, ``value`` holds the return value
+of the call and ``error`` the raised exception (``None`` on success).
+"""
+
+
+class PIDsLinkAsyncRESTClient(object):
+    """Asyncio PIDsLink REST API client wrapper.
+
+    :param client: The :py:class:`PIDsLinkRESTClient` performing the calls.
+    :param max_concurrency: Maximum number of requests in flight. The
+        session pool of the client should allow as many connections per
+        host (``pool_maxsize``) to avoid opening throwaway connections.
+    :param priority: Rate limiting priority of the requests (see
+        :py:mod:`baobab.pidslink_service.ratelimit`), e.g. ``batch`` for bulk
+        jobs. Defaults to the priority of the calling context.
+    """
+
+    def __init__(self, client, max_concurrency=16, priority=None):
+        """Initialize the asyncio client wrapper."""
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self.priority = priority
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix="pidslink"
+        )
+
+    def __repr__(self):
+        """Create string representation of object."""
+        return "<PIDsLinkAsyncRESTClient: {0}>".format(self.client.username)
+
+    async def __aenter__(self):
+        """Enter the async context."""
+        return self
+
+    async def __aexit__(self, *exc_info):
+        """Exit the async context, shutting down the thread pool."""
+        self.close()
+
+    def close(self):
+        """Shut down the thread pool."""
+        self._executor.shutdown(wait=True)
+
+    async def _call(self, func, *args, **kwargs):
+        """Run a blocking client call on the thread pool.
+
+        The call runs in a copy of the current context, so that context
+        variables (e.g. the request priority) reach the worker thread.
+        """
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(
+            self._executor, partial(context.run, self._run, func, *args, **kwargs)
+        )
+
+    def _run(self, func, *args, **kwargs):
+        """Run a blocking client call with the priority of the client."""
+        if self.priority is None:
+            return func(*args, **kwargs)
+        with request_priority(self.priority):
+            return func(*args, **kwargs)
+
+    async def get_pids(self, pidsId):
+        """Get details of a PIDs (see :py:meth:`PIDsLinkRESTClient.get_pids`)."""
+        return await self._call(self.client.get_pids, pidsId)
+
+    async def post_pids(self, **kwargs):
+        """Mint PIDs (see :py:meth:`PIDsLinkRESTClient.post_pids`)."""
+        return await self._call(self.client.post_pids, **kwargs)
+
+    async def patch_pids(self, pidsId, **kwargs):
+        """Patch PIDs (see :py:meth:`PIDsLinkRESTClient.patch_pids`)."""
+        return await self._call(self.client.patch_pids, pidsId, **kwargs)
+
+    async def as_completed(self, calls):
+        """Run calls concurrently and yield their results as they complete.
+
+        At most ``max_concurrency`` calls are in flight at any time, and
+        ``calls`` is consumed lazily, so arbitrarily large batches run with
+        constant memory.
+
+        :param calls: Iterable of ``(key, coroutine_function, args, kwargs)``.
+        :returns: Async iterator of :py:class:`PIDsLinkResult`.
+        """
+        calls = iter(calls)
+        pending = {}
+
+        def _schedule():
+            for key, func, args, kwargs in calls:
+                task = asyncio.ensure_future(func(*args, **kwargs))
+                pending[task] = key
+                if len(pending) >= self.max_concurrency:
+                    return
+
+        _schedule()
+        while pending:
+            done, _ = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                key = pending.pop(task)
+                error = task.exception()
+                if error is None:
+                    yield PIDsLinkResult(key, task.result(), None)
+                else:
+                    yield PIDsLinkResult(key, None, error)
+            _schedule()
+
+    def query_many(self, pids_ids):
+        """Query many PIDs concurrently.
+
+        :param pids_ids: Iterable of PIDs IDs.
+        :returns: Async iterator of :py:class:`PIDsLinkResult` keyed by PIDs ID.
+        """
+        return self.as_completed(
+            (pids_id, self.get_pids, (pids_id,), {}) for pids_id in pids_ids
+        )
+
+    def mint_many(self, items):
+        """Mint many PIDs concurrently.
+
+        :param items: Iterable of ``(key, data)`` tuples, where ``data`` holds
+            the keyword arguments of :py:meth:`PIDsLinkRESTClient.post_pids`
+            and ``key`` identifies the item (e.g. the record id).
+        :returns: Async iterator of :py:class:`PIDsLinkResult`.
+        """
+        return self.as_completed(
+            (key, self.post_pids, (), data) for key, data in items
+        )
+
+    def patch_many(self, items):
+        """Patch many PIDs concurrently.
+
+        :param items: Iterable of ``(pids_id, data)`` tuples, where ``data``
+            holds the keyword arguments of
+            :py:meth:`PIDsLinkRESTClient.patch_pids`.
+        :returns: Async iterator of :py:class:`PIDsLinkResult` keyed by PIDs ID.
+        """
+        return self.as_completed(
+            (pids_id, self.patch_pids, (pids_id,), data) for pids_id, data in items
+        )
+
+
+def collect(results):
+    """Consume an async iterator of results from blocking code.
+
+    Convenience for Celery tasks and CLI commands, e.g.
+    ``collect(client.mint_many(items))``.
+
+    :returns: List of :py:class:`PIDsLinkResult` in completion order.
+    """
+
+    async def _collect():
+        return [result async for result in results]
+
+    return asyncio.run(_collect())
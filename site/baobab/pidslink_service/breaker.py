@@ -0,0 +1,156 @@
+"""Circuit breaker for PIDsLink requests."""
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class LocalBreakerStore(object):
+    """Circuit breaker state kept in the memory of the process."""
+
+    def __init__(self):
+        """Initialize the store."""
+        self._lock = threading.Lock()
+        self._failures = []
+        self._open_until = None
+        self._probe_until = None
+
+    def add_failure(self, window):
+        """Record a failure; returns the number of failures in the window."""
+        now = time.time()
+        with self._lock:
+            self._failures = [t for t in self._failures if t > now - window]
+            self._failures.append(now)
+            return len(self._failures)
+
+    def open_until(self):
+        """Get the time until which the circuit is open, if it is."""
+        return self._open_until
+
+    def trip(self, until):
+        """Open the circuit until the given time."""
+        with self._lock:
+            self._open_until = until
+            self._probe_until = None
+
+    def acquire_probe(self, timeout):
+        """Let a single caller probe a half-open circuit."""
+        now = time.time()
+        with self._lock:
+            if self._probe_until is not None and self._probe_until > now:
+                return False
+            self._probe_until = now + timeout
+            return True
+
+    def reset(self):
+        """Close the circuit."""
+        with self._lock:
+            self._failures = []
+            self._open_until = None
+            self._probe_until = None
+
+
+class RedisBreakerStore(object):
+    """Circuit breaker state shared by all processes through Redis.
+
+    :param redis: Redis client.
+    :param key: Key prefix of the breaker state.
+    """
+
+    def __init__(self, redis, key="pidslink:breaker"):
+        """Initialize the store."""
+        self.redis = redis
+        self.key = key
+
+    def add_failure(self, window):
+        """Record a failure; returns the number of failures in the window."""
+        failures = self.redis.incr(f"{self.key}:failures")
+        if failures == 1:
+            self.redis.expire(f"{self.key}:failures", max(1, int(window)))
+        return failures
+
+    def open_until(self):
+        """Get the time until which the circuit is open, if it is."""
+        value = self.redis.get(f"{self.key}:open_until")
+        return float(value) if value is not None else None
+
+    def trip(self, until):
+        """Open the circuit until the given time."""
+        pipe = self.redis.pipeline()
+        pipe.set(f"{self.key}:open_until", until)
+        pipe.delete(f"{self.key}:probe")
+        pipe.execute()
+
+    def acquire_probe(self, timeout):
+        """Let a single caller probe a half-open circuit."""
+        return bool(
+            self.redis.set(f"{self.key}:probe", 1, nx=True, ex=max(1, int(timeout)))
+        )
+
+    def reset(self):
+        """Close the circuit."""
+        self.redis.delete(
+            f"{self.key}:failures", f"{self.key}:open_until", f"{self.key}:probe"
+        )
+
+
+class CircuitBreaker(object):
+    """Fail fast while PIDsLink is unavailable.
+
+    After ``failure_threshold`` failures (5xx, 429, timeouts or connection
+    errors) within ``failure_window`` seconds the circuit opens, and calls
+    are rejected without contacting PIDsLink for ``reset_timeout`` seconds.
+    The circuit is then half-open: a single call probes PIDsLink and closes
+    the circuit on success, or opens it again on failure.
+
+    With a :py:class:`RedisBreakerStore`, the state is shared by all uWSGI
+    and Celery processes. Errors of the store never fail a request: the
+    circuit is considered closed if its state cannot be read.
+
+    :param store: Breaker state store.
+    :param failure_threshold: Failures that open the circuit.
+    :param failure_window: Period in seconds in which failures are counted.
+    :param reset_timeout: Time in seconds the circuit stays open.
+    """
+
+    def __init__(
+        self, store=None, failure_threshold=5, failure_window=60, reset_timeout=30
+    ):
+        """Initialize the circuit breaker."""
+        self.store = store or LocalBreakerStore()
+        self.failure_threshold = failure_threshold
+        self.failure_window = failure_window
+        self.reset_timeout = reset_timeout
+
+    def allow(self):
+        """Check if a call may be made."""
+        try:
+            open_until = self.store.open_until()
+            if open_until is None:
+                return True
+            if time.time() < open_until:
+                return False
+            return self.store.acquire_probe(self.reset_timeout)
+        except Exception:
+            logger.exception("Could not read the PIDsLink circuit breaker state.")
+            return True
+
+    def record_success(self):
+        """Record a successful call."""
+        try:
+            if self.store.open_until() is not None:
+                self.store.reset()
+        except Exception:
+            logger.exception("Could not update the PIDsLink circuit breaker state.")
+
+    def record_failure(self):
+        """Record a failed call, opening the circuit if needed."""
+        try:
+            half_open = self.store.open_until() is not None
+            failures = self.store.add_failure(self.failure_window)
+            if half_open or failures >= self.failure_threshold:
+                self.store.trip(time.time() + self.reset_timeout)
+        except Exception:
+            logger.exception("Could not update the PIDsLink circuit breaker state.")
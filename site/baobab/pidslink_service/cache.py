@@ -0,0 +1,170 @@
+"""Caches for PIDsLink query results."""
+
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from .errors import PIDsLinkNotFoundError
+
+logger = logging.getLogger(__name__)
+
+MISSING = object()
+"""Sentinel returned by :py:meth:`LRUCache.get` for missing entries."""
+
+
+class LRUCache(object):
+    """Thread-safe in-process LRU cache with expiring entries.
+
+    :param maxsize: Maximum number of entries; the least recently used entry
+        is evicted when the cache is full.
+    :param ttl: Default time to live of the entries in seconds, or ``None``
+        for entries that never expire.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        """Initialize the cache."""
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """Get the number of entries."""
+        return len(self._data)
+
+    def get(self, key, default=MISSING):
+        """Get an entry, marking it as recently used."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                value, expires = item
+                if expires is None or expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        """Add or replace an entry."""
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        """Remove an entry."""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """Remove all entries."""
+        with self._lock:
+            self._data.clear()
+
+
+class ResolutionCache(object):
+    """Two-tier read-through cache of PIDsLink query results.
+
+    Lookups go to an in-process :py:class:`LRUCache`, then to Redis (shared
+    by all processes), and only then to PIDsLink. Unknown identifiers are
+    cached for ``negative_ttl`` seconds, so that repeated lookups of a
+    missing ARK do not reach PIDsLink either.
+
+    Invalidation removes the entry from Redis and from the local tier of the
+    current process. Other processes may serve their local copy until it
+    expires, which is why ``local_ttl`` is kept short.
+
+    :param redis: Redis client of the shared tier, or ``None`` to only cache
+        in process.
+    :param maxsize: Maximum number of entries of the local tier.
+    :param local_ttl: Time to live of local entries in seconds.
+    :param ttl: Time to live of shared entries in seconds.
+    :param negative_ttl: Time to live of unknown identifiers in seconds.
+    :param key_prefix: Prefix of the Redis keys.
+    """
+
+    def __init__(
+        self,
+        redis=None,
+        maxsize=4096,
+        local_ttl=30,
+        ttl=3600,
+        negative_ttl=60,
+        key_prefix="pidslink:pids:",
+    ):
+        """Initialize the cache."""
+        self.redis = redis
+        self.local = LRUCache(maxsize=maxsize, ttl=local_ttl)
+        self.local_ttl = local_ttl
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.key_prefix = key_prefix
+
+    def _resolve(self, entry):
+        """Get the cached data, raising for cached unknown identifiers."""
+        if not entry["found"]:
+            raise PIDsLinkNotFoundError(entry["error"])
+        return entry["data"]
+
+    def _ttl(self, entry):
+        """Get the time to live of an entry in the shared tier."""
+        return self.ttl if entry["found"] else self.negative_ttl
+
+    def _store(self, pids_id, entry):
+        """Store an entry in both tiers."""
+        ttl = self._ttl(entry)
+        self.local.set(pids_id, entry, ttl=min(self.local_ttl, ttl))
+        if self.redis is not None:
+            try:
+                self.redis.set(self.key_prefix + pids_id, json.dumps(entry), ex=ttl)
+            except Exception:
+                logger.exception("Could not write PIDsLink cache entry.")
+
+    def get(self, pids_id, fetch):
+        """Get the query result of a PIDs, fetching it on a cache miss.
+
+        :param pids_id: ID of the PIDs.
+        :param fetch: Callable querying PIDsLink for ``pids_id``.
+        """
+        entry = self.local.get(pids_id)
+        if entry is not MISSING:
+            return self._resolve(entry)
+
+        if self.redis is not None:
+            try:
+                raw = self.redis.get(self.key_prefix + pids_id)
+            except Exception:
+                logger.exception("Could not read PIDsLink cache entry.")
+                raw = None
+            if raw is not None:
+                entry = json.loads(raw)
+                self.local.set(
+                    pids_id, entry, ttl=min(self.local_ttl, self._ttl(entry))
+                )
+                return self._resolve(entry)
+
+        try:
+            data = fetch(pids_id)
+        except PIDsLinkNotFoundError as e:
+            self._store(pids_id, {"found": False, "error": str(e)})
+            raise
+        self._store(pids_id, {"found": True, "data": data})
+        return data
+
+    def invalidate(self, pids_id):
+        """Forget the cached query result of a PIDs."""
+        self.local.delete(pids_id)
+        if self.redis is not None:
+            try:
+                self.redis.delete(self.key_prefix + pids_id)
+            except Exception:
+                logger.exception("Could not invalidate PIDsLink cache entry.")
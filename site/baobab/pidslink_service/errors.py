@@ -19,6 +19,10 @@ class HttpError(Exception):
     """Exception raised when a connection problem happens."""
 
 
+class PIDsLinkCircuitOpenError(HttpError):
+    """PIDsLink failed repeatedly and is not contacted for a while."""
+
+
 class PIDsLinkError(Exception):
     """Exception raised when the server returns a known HTTP error code.
 
@@ -30,6 +34,7 @@ class PIDsLinkError(Exception):
     * 403 Forbidden
     * 404 Not Found
     * 410 Gone (deleted)
+    * 429 Too Many Requests
     """
 
     @staticmethod
@@ -49,6 +54,8 @@ class PIDsLinkError(Exception):
             return PIDsLinkGoneError(*args)
         elif err_code == 412:
             return PIDsLinkPreconditionError(*args)
+        elif err_code == 429:
+            return PIDsLinkTooManyRequestsError(*args)
         else:
             return PIDsLinkServerError(*args)
 
@@ -81,6 +88,15 @@ class PIDsLinkBadRequestError(PIDsLinkRequestError):
     Request body must be correctly formatted for PIDsLink requests.
     """
 
+
+class PIDsLinkUnauthorizedError(PIDsLinkRequestError):
+    """Bad username or password."""
+
+
+class PIDsLinkForbiddenError(PIDsLinkRequestError):
+    """Login problem, record belongs to another party or quota exceeded."""
+
+
 class PIDsLinkNotFoundError(PIDsLinkRequestError):
     """PIDsLink identifier does not exist in the database."""
 
@@ -91,3 +107,7 @@ class PIDsLinkGoneError(PIDsLinkRequestError):
 
 class PIDsLinkPreconditionError(PIDsLinkRequestError):
     """Metadata must be uploaded first before performing this operation."""
+
+
+class PIDsLinkTooManyRequestsError(PIDsLinkRequestError):
+    """Too many requests were sent to PIDsLink. Try later."""
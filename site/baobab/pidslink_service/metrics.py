@@ -0,0 +1,298 @@
+"""Metrics of the PIDsLink client, in Prometheus text format.
+
+Samples are aggregated in Redis so that every process of the deployment
+(uWSGI workers, Celery workers) contributes to the same series, and any of
+them can serve the metrics:
+
+* counters and histograms are incremented in a single Redis hash;
+* gauges are kept per process in a hash that expires when the process stops
+  updating it, and are summed when collected.
+
+Without Redis, metrics are only aggregated in process.
+"""
+
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+COUNTER = "counter"
+GAUGE = "gauge"
+HISTOGRAM = "histogram"
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+"""Buckets of the latency histograms in seconds."""
+
+METRICS = {
+    "pidslink_request_duration_seconds": (
+        HISTOGRAM,
+        "Duration of PIDsLink operations, including retries.",
+    ),
+    "pidslink_errors_total": (
+        COUNTER,
+        "PIDsLink operations that failed, by operation and exception class.",
+    ),
+    "pidslink_retries_total": (
+        COUNTER,
+        "PIDsLink requests retried after a failed attempt.",
+    ),
+    "pidslink_throttled_total": (
+        COUNTER,
+        "PIDsLink requests that waited for the rate limiter, by priority.",
+    ),
+    "pidslink_connections_in_use": (
+        GAUGE,
+        "Pooled connections to PIDsLink with a request in flight.",
+    ),
+    "pidslink_outbox_entries": (
+        GAUGE,
+        "PIDsLink operations in the outbox, by status.",
+    ),
+    "pidslink_serializer_cache_hits_total": (
+        COUNTER,
+        "Serialized records served from the cache, by process.",
+    ),
+    "pidslink_serializer_cache_misses_total": (
+        COUNTER,
+        "Records serialized because they were not cached, by process.",
+    ),
+    "pidslink_serializer_cache_entries": (
+        GAUGE,
+        "Serialized records held in the cache, by process.",
+    ),
+}
+"""Type and description of the metrics, by name."""
+
+
+def _escape(value):
+    """Escape a label value."""
+    return str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def _series(name, labels):
+    """Get the key of a series."""
+    return json.dumps([name, sorted(labels.items())])
+
+
+def _format(name, labels):
+    """Format a series name and labels."""
+    if not labels:
+        return name
+    pairs = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+    return f"{name}{{{pairs}}}"
+
+
+class MetricsRegistry(object):
+    """Record and expose PIDsLink client metrics.
+
+    Recording never raises: Redis errors are logged and the sample is lost.
+
+    :param redis: Redis client aggregating the samples of all processes, or
+        ``None`` to only aggregate in process.
+    :param key_prefix: Prefix of the Redis keys.
+    :param buckets: Upper bounds of the histogram buckets.
+    :param gauge_ttl: Seconds after which the gauges of a process that
+        stopped reporting are dropped.
+    """
+
+    def __init__(
+        self,
+        redis=None,
+        key_prefix="pidslink:metrics:",
+        buckets=DEFAULT_BUCKETS,
+        gauge_ttl=60,
+    ):
+        """Initialize the registry."""
+        self.redis = redis
+        self.key_prefix = key_prefix
+        self.buckets = tuple(sorted(buckets))
+        self.gauge_ttl = gauge_ttl
+        self._samples = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+
+    @property
+    def _counters_key(self):
+        """Redis hash holding counters and histograms."""
+        return self.key_prefix + "counters"
+
+    @property
+    def _gauges_key(self):
+        """Redis hash holding the gauges of this process."""
+        return f"{self.key_prefix}gauges:{socket.gethostname()}:{os.getpid()}"
+
+    def _increment(self, increments):
+        """Add values to counter series."""
+        if self.redis is None:
+            with self._lock:
+                for series, value in increments:
+                    self._samples[series] = self._samples.get(series, 0) + value
+            return
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for series, value in increments:
+                pipe.hincrbyfloat(self._counters_key, series, value)
+            pipe.execute()
+        except Exception:
+            logger.exception("Could not record PIDsLink metrics.")
+
+    def inc(self, name, value=1, **labels):
+        """Increment a counter."""
+        self._increment([(_series(name, labels), value)])
+
+    def _observation(self, name, value, labels):
+        """Get the counter increments of a histogram observation."""
+        increments = [
+            (_series(f"{name}_bucket", {**labels, "le": str(bound)}), 1)
+            for bound in self.buckets
+            if value <= bound
+        ]
+        return increments + [
+            (_series(f"{name}_bucket", {**labels, "le": "+Inf"}), 1),
+            (_series(f"{name}_sum", labels), value),
+            (_series(f"{name}_count", labels), 1),
+        ]
+
+    def observe(self, name, value, **labels):
+        """Record an observation in a histogram."""
+        self._increment(self._observation(name, value, labels))
+
+    def gauge_add(self, name, delta, **labels):
+        """Add ``delta`` to a gauge of this process."""
+        series = _series(name, labels)
+        with self._lock:
+            value = self._gauges.get(series, 0) + delta
+            self._gauges[series] = value
+        if self.redis is None:
+            return
+        # Redis is written outside the lock, so a concurrent update may have
+        # written a newer value first: write again until the value written
+        # is the latest one
+        while True:
+            try:
+                pipe = self.redis.pipeline(transaction=False)
+                pipe.hset(self._gauges_key, series, value)
+                pipe.expire(self._gauges_key, self.gauge_ttl)
+                pipe.execute()
+            except Exception:
+                logger.exception("Could not record PIDsLink metrics.")
+                return
+            with self._lock:
+                latest = self._gauges[series]
+            if latest == value:
+                return
+            value = latest
+
+    @contextmanager
+    def track(self, operation):
+        """Time a PIDsLink operation and count the errors it raises.
+
+        The duration and the error are recorded with a single Redis
+        round trip.
+        """
+        start = time.monotonic()
+        increments = []
+        try:
+            yield
+        except Exception as e:
+            labels = {"operation": operation, "error": type(e).__name__}
+            increments.append((_series("pidslink_errors_total", labels), 1))
+            raise
+        finally:
+            increments += self._observation(
+                "pidslink_request_duration_seconds",
+                time.monotonic() - start,
+                {"operation": operation},
+            )
+            self._increment(increments)
+
+    @contextmanager
+    def in_flight(self, name="pidslink_connections_in_use", **labels):
+        """Count a request in flight in a gauge."""
+        self.gauge_add(name, 1, **labels)
+        try:
+            yield
+        finally:
+            self.gauge_add(name, -1, **labels)
+
+    def collect(self):
+        """Get the value of every series of all processes.
+
+        :returns: Dict of ``{(name, ((label, value), ...)): value}``.
+        """
+        if self.redis is None:
+            with self._lock:
+                raw = dict(self._samples)
+                for series, value in self._gauges.items():
+                    raw[series] = raw.get(series, 0) + value
+        else:
+            raw = {}
+            try:
+                for series, value in self.redis.hgetall(self._counters_key).items():
+                    raw[series] = float(value)
+                for key in self.redis.scan_iter(self.key_prefix + "gauges:*"):
+                    for series, value in self.redis.hgetall(key).items():
+                        raw[series] = raw.get(series, 0) + float(value)
+            except Exception:
+                logger.exception("Could not collect PIDsLink metrics.")
+
+        samples = {}
+        for series, value in raw.items():
+            if isinstance(series, bytes):
+                series = series.decode("utf-8")
+            name, labels = json.loads(series)
+            samples[(name, tuple(tuple(label) for label in labels))] = value
+        return samples
+
+    def render(self, extra=None):
+        """Render the metrics in Prometheus text format.
+
+        :param extra: Additional samples computed when rendering (e.g. the
+            outbox depth), in the format returned by :py:meth:`collect`.
+        """
+        samples = self.collect()
+        samples.update(extra or {})
+
+        # buckets nothing fell in yet are not stored, but must be exposed
+        bounds = [str(bound) for bound in self.buckets] + ["+Inf"]
+        for name, labels in list(samples):
+            base = name[: -len("_count")]
+            if name.endswith("_count") and METRICS.get(base, ("",))[0] == HISTOGRAM:
+                for le in bounds:
+                    bucket = tuple(sorted(labels + (("le", le),)))
+                    samples.setdefault((f"{base}_bucket", bucket), 0)
+
+        def _family(name):
+            for suffix in ("_bucket", "_sum", "_count"):
+                base = name[: -len(suffix)]
+                if name.endswith(suffix) and METRICS.get(base, ("",))[0] == HISTOGRAM:
+                    return base
+            return name
+
+        def _order(sample):
+            (name, labels), _ = sample
+            le = dict(labels).get("le")
+            bound = float("inf") if le in (None, "+Inf") else float(le)
+            return (
+                _family(name),
+                tuple(label for label in labels if label[0] != "le"),
+                name,
+                bound,
+            )
+
+        lines = []
+        family = None
+        for (name, labels), value in sorted(samples.items(), key=_order):
+            if _family(name) != family:
+                family = _family(name)
+                type_, help_ = METRICS.get(family, ("untyped", ""))
+                lines.append(f"# HELP {family} {help_}")
+                lines.append(f"# TYPE {family} {type_}")
+            value = int(value) if float(value).is_integer() else value
+            lines.append(f"{_format(name, labels)} {value}")
+        return "\n".join(lines) + "\n"
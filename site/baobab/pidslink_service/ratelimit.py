@@ -0,0 +1,196 @@
+"""Rate limiting of PIDsLink requests.
+
+All processes take their requests from a single token bucket: tokens are
+added at ``rate`` per second up to ``burst``, and every request (including
+retries) takes one. Requests have a priority:
+
+* ``interactive`` requests (publishes, record updates) may take every token;
+* ``batch`` requests (backfills, retargeting, reconciliation) only take a
+  token while more than ``reserve`` tokens are left.
+
+So bulk work runs on the spare capacity, and user-facing requests always
+find ``reserve`` tokens without waiting behind a batch. Batch jobs set their
+priority with :py:func:`request_priority`; requests are interactive by
+default.
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from .errors import HttpError
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+
+_priority = ContextVar("pidslink_request_priority", default=INTERACTIVE)
+
+
+def get_request_priority():
+    """Get the priority of the PIDsLink requests of the current context."""
+    return _priority.get()
+
+
+@contextmanager
+def request_priority(priority):
+    """Set the priority of the PIDsLink requests sent in the block.
+
+    Calls of :py:class:`PIDsLinkAsyncRESTClient` run in the context they
+    are scheduled from, so the priority also applies to them.
+
+    :param priority: :py:data:`INTERACTIVE` or :py:data:`BATCH`.
+    """
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class PIDsLinkRateLimitError(HttpError):
+    """No PIDsLink request token became available in time."""
+
+
+class LocalRateLimitStore(object):
+    """Token bucket kept in the memory of the process."""
+
+    def __init__(self):
+        """Initialize the store."""
+        self._lock = threading.Lock()
+        self._tokens = None
+        self._updated = None
+
+    def take(self, rate, burst, floor):
+        """Take a token if more than ``floor`` are left.
+
+        :returns: ``0`` if a token was taken, otherwise the time in seconds
+            until one should be available.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._tokens is None:
+                self._tokens = float(burst)
+            else:
+                elapsed = max(0.0, now - self._updated)
+                self._tokens = min(float(burst), self._tokens + elapsed * rate)
+            self._updated = now
+            if self._tokens - 1 >= floor:
+                self._tokens -= 1
+                return 0
+            return (floor + 1 - self._tokens) / rate
+
+
+class RedisRateLimitStore(object):
+    """Token bucket shared by all processes through Redis.
+
+    The bucket is refilled and taken from in a single Lua script, using the
+    clock of the Redis server, so processes never race nor depend on their
+    own clocks.
+
+    :param redis: Redis client.
+    :param key: Key of the bucket.
+    """
+
+    SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local floor = tonumber(ARGV[3])
+local clock = redis.call("TIME")
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call("HMGET", KEYS[1], "tokens", "updated")
+local tokens = tonumber(state[1])
+if tokens == nil then
+  tokens = burst
+else
+  tokens = math.min(burst, tokens + math.max(0, now - tonumber(state[2])) * rate)
+end
+local wait = 0
+if tokens - 1 >= floor then
+  tokens = tokens - 1
+else
+  wait = (floor + 1 - tokens) / rate
+end
+redis.call("HSET", KEYS[1], "tokens", tokens, "updated", now)
+redis.call("EXPIRE", KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+    def __init__(self, redis, key="pidslink:ratelimit"):
+        """Initialize the store."""
+        self.redis = redis
+        self.key = key
+        self._take = redis.register_script(self.SCRIPT)
+
+    def take(self, rate, burst, floor):
+        """Take a token if more than ``floor`` are left.
+
+        :returns: ``0`` if a token was taken, otherwise the time in seconds
+            until one should be available.
+        """
+        return float(self._take(keys=[self.key], args=[rate, burst, floor]))
+
+
+class RateLimiter(object):
+    """Token bucket limiting the rate of PIDsLink requests.
+
+    With a :py:class:`RedisRateLimitStore`, the bucket is shared by all uWSGI
+    and Celery processes. Errors of the store never fail a request: the
+    request is sent if the bucket cannot be read.
+
+    :param store: Token bucket store.
+    :param rate: Requests per second.
+    :param burst: Maximum number of tokens in the bucket.
+    :param reserve: Tokens that only interactive requests may take.
+    :param max_wait: Time in seconds to wait for a token, by priority, before
+        raising :py:exc:`PIDsLinkRateLimitError`.
+    :param metrics: :py:class:`MetricsRegistry` counting throttled requests.
+    """
+
+    def __init__(
+        self,
+        store=None,
+        rate=10,
+        burst=20,
+        reserve=5,
+        max_wait=None,
+        metrics=None,
+    ):
+        """Initialize the rate limiter."""
+        self.store = store or LocalRateLimitStore()
+        self.rate = rate
+        self.burst = burst
+        self.reserve = min(reserve, burst - 1)
+        self.max_wait = {INTERACTIVE: 5, BATCH: 60, **(max_wait or {})}
+        self.metrics = metrics
+
+    def acquire(self, priority=None):
+        """Wait until a request may be sent.
+
+        :param priority: Priority of the request, defaults to the one of the
+            current context (see :py:func:`request_priority`).
+        """
+        priority = priority or get_request_priority()
+        floor = 0 if priority == INTERACTIVE else self.reserve
+        deadline = time.monotonic() + self.max_wait.get(priority, 0)
+        throttled = False
+        while True:
+            try:
+                wait = self.store.take(self.rate, self.burst, floor)
+            except Exception:
+                logger.exception("Could not read the PIDsLink rate limit bucket.")
+                return
+            if not wait:
+                return
+            if not throttled and self.metrics:
+                self.metrics.inc("pidslink_throttled_total", priority=priority)
+            throttled = True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise PIDsLinkRateLimitError(
+                    f"No PIDsLink request token available for a {priority} request."
+                )
+            time.sleep(min(wait, remaining))
@@ -1,15 +1,22 @@
 import ssl
-import requests
+import time
+
 from requests.auth import HTTPBasicAuth
 from requests.exceptions import RequestException
-import json  # Ensure json is imported
 
-from .errors import HttpError
+from .errors import HttpError, PIDsLinkCircuitOpenError
+from .retry import RETRY_STATUSES
+from .session import get_session_pool
 
 
 class PIDsLinkRequest(object):
     """Helper class for making requests.
 
+    Requests are sent through a pooled keep-alive session (see
+    :py:mod:`baobab.pidslink_service.session`), so that consecutive calls
+    reuse open connections. Instances hold no per-request state and can be
+    shared between threads.
+
     :param base_url: Base URL for all requests.
     :param username: HTTP Basic Authentication Username
     :param password: HTTP Basic Authentication Password
@@ -17,6 +24,14 @@ class PIDsLinkRequest(object):
         query string on all requests.
     :param timeout: Connect and read timeout in seconds. Specify a tuple
         (connect, read) to specify each timeout individually.
+    :param session_pool: The :py:class:`PIDsLinkSessionPool` to send requests
+        through. Defaults to the process-wide pool.
+    :param retry_policy: :py:class:`RetryPolicy` for failed requests. Requests
+        are not retried if not set.
+    :param circuit_breaker: :py:class:`CircuitBreaker` guarding PIDsLink.
+    :param rate_limiter: :py:class:`RateLimiter` shared by all processes.
+    :param metrics: :py:class:`MetricsRegistry` counting retries and
+        connections in use.
     """
 
     def __init__(
@@ -26,6 +41,11 @@ class PIDsLinkRequest(object):
         password=None,
         default_params=None,
         timeout=None,
+        session_pool=None,
+        retry_policy=None,
+        circuit_breaker=None,
+        rate_limiter=None,
+        metrics=None,
     ):
         """Initialize request object."""
         self.base_url = base_url
@@ -33,18 +53,37 @@ class PIDsLinkRequest(object):
         self.password = password.encode("utf8")
         self.default_params = default_params or {}
         self.timeout = timeout
-
-    def request(self, url, method="GET", body=None, params=None, headers=None):
+        self.session_pool = session_pool or get_session_pool()
+        self.auth = HTTPBasicAuth(self.username, self.password)
+        self.retry_policy = retry_policy
+        self.circuit_breaker = circuit_breaker
+        self.rate_limiter = rate_limiter
+        self.metrics = metrics
+
+    def request(
+        self, url, method="GET", body=None, params=None, headers=None, operation=None
+    ):
         """Make a request.
 
-        If the request was successful (i.e no exceptions), you can find the
-        HTTP response code in self.code and the response body in self.value.
+        HTTP error responses are returned as is, so that callers can map
+        them to a :py:exc:`PIDsLinkError` through
+        :py:meth:`PIDsLinkError.factory`. Connection problems raise
+        :py:exc:`HttpError`, and :py:exc:`PIDsLinkCircuitOpenError` is raised
+        without contacting PIDsLink while the circuit breaker is open.
+        Every attempt first waits for the rate limiter, which raises
+        :py:exc:`PIDsLinkRateLimitError` if no token becomes available.
+
+        Timeouts, connection errors, 429 and 5xx responses are retried
+        according to the retry policy; the last response or error is
+        returned or raised when giving up.
 
         :param url: Request URL (relative to base_url if set)
         :param method: Request method (GET, POST, PATCH) supported
         :param body: Request body
         :param params: Request parameters
         :param headers: Request headers
+        :param operation: Name of the PIDsLink operation (e.g. ``mint``) in
+            the metrics; defaults to the request method.
         """
         params = params or {}
         headers = headers or {}
@@ -55,9 +94,8 @@ class PIDsLinkRequest(object):
         if self.base_url:
             url = self.base_url + url
 
-        request_func = getattr(requests, method.lower())
         kwargs = dict(
-            auth=HTTPBasicAuth(self.username, self.password),
+            auth=self.auth,
             params=params,
             headers=headers,
         )
@@ -68,47 +106,76 @@ class PIDsLinkRequest(object):
         if self.timeout is not None:
             kwargs["timeout"] = self.timeout
 
-        try:
-            response = request_func(url, **kwargs)
-            response.raise_for_status()  # Raise an error for bad status codes
-            return response
-        except RequestException as e:
-            raise HttpError(e)
-        except ssl.SSLError as e:
-            raise HttpError(e)
+        session = self.session_pool.session(url)
+        if self.retry_policy:
+            self.retry_policy.budget.deposit()
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            if self.circuit_breaker and not self.circuit_breaker.allow():
+                raise PIDsLinkCircuitOpenError(
+                    f"PIDsLink is unavailable, not sending {method} {url}."
+                )
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+
+            response = error = None
+            try:
+                if self.metrics:
+                    with self.metrics.in_flight():
+                        response = session.request(method, url, **kwargs)
+                else:
+                    response = session.request(method, url, **kwargs)
+            except (RequestException, ssl.SSLError) as e:
+                error = e
+
+            failed = error is not None or response.status_code in RETRY_STATUSES
+            if self.circuit_breaker:
+                if failed:
+                    self.circuit_breaker.record_failure()
+                else:
+                    self.circuit_breaker.record_success()
+
+            delay = None
+            if failed and self.retry_policy:
+                delay = self.retry_policy.delay(
+                    attempt, started, method, response=response, error=error
+                )
+            if delay is None:
+                if error is not None:
+                    raise HttpError(error)
+                return response
+            if self.metrics:
+                self.metrics.inc(
+                    "pidslink_retries_total", operation=operation or method.lower()
+                )
+            time.sleep(delay)
+
+    def get(self, url, params=None, headers=None, operation=None):
+        """Make a GET request."""
+        return self.request(
+            url, params=params, headers=headers, operation=operation
+        )
 
-    def post(self, url, naan, shoulder, url_value, metadata, type_, commitment, identifier, format_, relation, source, headers=None):
+    def post(self, url, body=None, params=None, headers=None, operation=None):
         """Make a POST request."""
-        body = json.dumps({
-            "naan": naan,
-            "shoulder": shoulder,
-            "url": url_value,
-            "metadata": metadata,
-            "type": type_,
-            "commitment": commitment,
-            "identifier": identifier,
-            "format": format_,
-            "relation": relation,
-            "source": source
-        })
-        headers = headers or {"Content-Type": "application/json"}
         return self.request(
-            url, method="POST", body=body, headers=headers
+            url,
+            method="POST",
+            body=body,
+            params=params,
+            headers=headers,
+            operation=operation,
         )
 
-    def patch(self, url, url_value, metadata, type_, commitment, identifier, format_, relation, source, headers=None):
+    def patch(self, url, body=None, params=None, headers=None, operation=None):
         """Make a PATCH request."""
-        body = json.dumps({
-            "url": url_value,
-            "metadata": metadata,
-            "type": type_,
-            "commitment": commitment,
-            "identifier": identifier,
-            "format": format_,
-            "relation": relation,
-            "source": source
-        })
-        headers = headers or {"Content-Type": "application/json"}
         return self.request(
-            url, method="PATCH", body=body, headers=headers
+            url,
+            method="PATCH",
+            body=body,
+            params=params,
+            headers=headers,
+            operation=operation,
         )
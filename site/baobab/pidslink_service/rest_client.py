@@ -1,7 +1,9 @@
 import json
+from contextlib import nullcontext
+
 import requests
 
-from .errors import PIDsLinkError
+from .errors import PIDsLinkError, PIDsLinkServerError
 from .request import PIDsLinkRequest
 
 HTTP_OK = requests.codes["ok"]
@@ -11,7 +13,19 @@ class PIDsLinkRESTClient(object):
     """PIDsLink REST API client wrapper."""
 
     def __init__(
-        self, username, password, prefix, test_mode=False, url=None, timeout=None
+        self,
+        username,
+        password,
+        prefix,
+        test_mode=False,
+        url=None,
+        timeout=None,
+        session_pool=None,
+        retry_policy=None,
+        circuit_breaker=None,
+        cache=None,
+        rate_limiter=None,
+        metrics=None,
     ):
         """Initialize the REST client wrapper.
 
@@ -22,6 +36,14 @@ class PIDsLinkRESTClient(object):
         :param url: PIDsLink API base URL.
         :param timeout: Connect and read timeout in seconds. Specify a tuple
             (connect, read) to specify each timeout individually.
+        :param session_pool: :py:class:`PIDsLinkSessionPool` shared by all
+            requests of this client. Defaults to the process-wide pool.
+        :param retry_policy: :py:class:`RetryPolicy` for failed requests.
+        :param circuit_breaker: :py:class:`CircuitBreaker` guarding PIDsLink.
+        :param cache: :py:class:`ResolutionCache` for :py:meth:`get_pids`.
+        :param rate_limiter: :py:class:`RateLimiter` of the requests.
+        :param metrics: :py:class:`MetricsRegistry` recording the latency and
+            errors of every operation.
         """
         self.username = str(username)
         self.password = str(password)
@@ -36,6 +58,13 @@ class PIDsLinkRESTClient(object):
             self.api_url += "/"
 
         self.timeout = timeout
+        self.session_pool = session_pool
+        self.retry_policy = retry_policy
+        self.circuit_breaker = circuit_breaker
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self.metrics = metrics
+        self._request = self._create_request()
 
     def __repr__(self):
         """Create string representation of object."""
@@ -48,19 +77,40 @@ class PIDsLinkRESTClient(object):
             username=self.username,
             password=self.password,
             timeout=self.timeout,
+            session_pool=self.session_pool,
+            retry_policy=self.retry_policy,
+            circuit_breaker=self.circuit_breaker,
+            rate_limiter=self.rate_limiter,
+            metrics=self.metrics,
         )
 
+    def _track(self, operation):
+        """Record the latency and errors of an operation in the metrics."""
+        if self.metrics is None:
+            return nullcontext()
+        return self.metrics.track(operation)
+
     def get_pids(self, pidsId):
         """Get details of a PIDs.
 
+        Results are served from the cache when the client has one.
+
         :param pidsId: ID of the PIDs.
         """
-        request = self._create_request()
-        resp = request.get(f"api/pids/query/{pidsId}")
-        if resp.status_code == HTTP_OK:
-            return resp.json()["data"]
-        else:
-            raise PIDsLinkError.factory(resp.status_code, resp.text)
+        if self.cache is not None:
+            return self.cache.get(pidsId, self._get_pids)
+        return self._get_pids(pidsId)
+
+    def _get_pids(self, pidsId):
+        """Query PIDsLink for the details of a PIDs."""
+        with self._track("query"):
+            resp = self._request.get(
+                f"api/pids/query/{pidsId}", operation="query"
+            )
+            if resp.status_code == HTTP_OK:
+                return resp.json()["data"]
+            else:
+                raise PIDsLinkError.factory(resp.status_code, resp.text)
 
     def post_pids(self, naan, shoulder, url, metadata, type_, commitment, identifier, format_, relation, source):
         """Post a new JSON payload to mint PIDs."""
@@ -80,38 +130,31 @@ class PIDsLinkRESTClient(object):
             "relation": relation,
             "source": source
         }
-        print("data")
-        
-        full_url = f"{self.api_url}api/pids/mint/baobab"
-        
-        try:
-            response = requests.post(
-                full_url,
-                json=data,
-                headers=headers
+        with self._track("mint"):
+            resp = self._request.post(
+                "api/pids/mint/baobab",
+                body=json.dumps(data),
+                headers=headers,
+                operation="mint",
             )
-            
-            response.raise_for_status()  # Raises an HTTPError for bad responses
-            
-            response_data = response.json()
-            
+            if resp.status_code not in (HTTP_OK, HTTP_CREATED):
+                raise PIDsLinkError.factory(resp.status_code, resp.text)
+
+            response_data = resp.json()
             # Check for application-level errors
             if not response_data.get("status", True):
                 raise PIDsLinkServerError(
                     f"Server error: {response_data.get('message', 'Unknown error')}"
                 )
-            
-            return response_data
-        
-        except requests.RequestException as e:
-            print(f"Request failed: {e}")
-            raise
-        except ValueError as e:
-            print(f"Failed to decode JSON response: {e}")
-            raise
-
-    def patch_pids(self, pidsId, url=None, metadata=None, type_=None, commitment=None, identifier=None, format_=None, relation=None, source=None):
-        """Patch an existing PIDs with new data."""
+        return response_data
+
+    def patch_pids(self, pidsId, url=None, metadata=None, type_=None, commitment=None, identifier=None, format_=None, relation=None, source=None, operation="patch"):
+        """Patch an existing PIDs with new data.
+
+        The cached details of the PIDs are invalidated.
+
+        :param operation: Name of the operation in the metrics (e.g. ``hide``).
+        """
         headers = {
             'content-type': 'application/json',
             'accept': 'application/json',
@@ -126,30 +169,16 @@ class PIDsLinkRESTClient(object):
             "relation": relation,
             "source": source
         }
-        print("data")
         # Remove keys with value None to avoid sending empty fields
         data = {k: v for k, v in data.items() if v is not None}
-        request = self._create_request()
         url_path = f"api/pids/update/{pidsId}"
-        resp = request.patch(url_path, body=json.dumps(data), headers=headers)
-        if resp.status_code == HTTP_OK:
-            return resp.json()["data"]["pidsId"]
-        else:
-            raise PIDsLinkError.factory(resp.status_code, resp.text)
-    print("patch_pids")
-
-# client = PIDsLinkRESTClient(username="", password="", prefix="")
-
-# response = client.post_pids(
-#     naan="50962",
-#     shoulder="/bb67854",
-#     url="",
-#     metadata="",
-#     type_="",
-#     commitment="",
-#     identifier="",
-#     format_="",
-#     relation="",
-#     source=""
-# )
-# print(f"PID created: {response}")
\ No newline at end of file
+        with self._track(operation):
+            resp = self._request.patch(
+                url_path, body=json.dumps(data), headers=headers, operation=operation
+            )
+            if self.cache is not None:
+                self.cache.invalidate(pidsId)
+            if resp.status_code == HTTP_OK:
+                return resp.json()["data"]["pidsId"]
+            else:
+                raise PIDsLinkError.factory(resp.status_code, resp.text)
@@ -0,0 +1,161 @@
+"""Retry policy for PIDsLink requests."""
+
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+from requests.exceptions import ConnectionError, ConnectTimeout, ReadTimeout
+from urllib3.exceptions import ProtocolError, ReadTimeoutError
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+"""HTTP status codes worth retrying."""
+
+
+class RetryBudget(object):
+    """Limit retries to a fraction of the requests made by the process.
+
+    Every request deposits ``ratio`` tokens and every retry withdraws one, so
+    that when PIDsLink is struggling, retries add at most ``ratio`` times the
+    normal load instead of multiplying it. ``min_tokens`` allows a few
+    retries right after startup.
+
+    :param ratio: Retries allowed per request.
+    :param min_tokens: Initial (and maximum idle) amount of tokens.
+    """
+
+    def __init__(self, ratio=0.2, min_tokens=10):
+        """Initialize the retry budget."""
+        self.ratio = ratio
+        self.min_tokens = min_tokens
+        self._tokens = float(min_tokens)
+        self._max_tokens = max(float(min_tokens), 100 * ratio)
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        """Account for a new request."""
+        with self._lock:
+            self._tokens = min(self._max_tokens, self._tokens + self.ratio)
+
+    def withdraw(self):
+        """Try to spend a retry; returns ``False`` if the budget is exhausted."""
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class RetryPolicy(object):
+    """Decide whether and when to retry a failed PIDsLink request.
+
+    Delays grow exponentially with "full jitter" (a random delay between
+    zero and the exponential backoff), so that workers failing at the same
+    time do not retry in lockstep. A ``Retry-After`` header sent by PIDsLink
+    takes precedence over the computed delay.
+
+    Non-idempotent requests (minting with POST) are only retried when they
+    certainly were not processed: the connection could not be established,
+    or PIDsLink answered 429/503 with a ``Retry-After`` header.
+
+    :param max_attempts: Maximum number of attempts, including the first one.
+    :param backoff_base: Backoff of the first retry in seconds.
+    :param backoff_max: Maximum backoff in seconds.
+    :param deadline: Time budget in seconds for a call and all its retries.
+    :param budget: :py:class:`RetryBudget` shared by all calls.
+    :param idempotent_methods: HTTP methods that are safe to repeat.
+    """
+
+    def __init__(
+        self,
+        max_attempts=3,
+        backoff_base=0.5,
+        backoff_max=8,
+        deadline=30,
+        budget=None,
+        idempotent_methods=("GET", "PATCH"),
+    ):
+        """Initialize the retry policy."""
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.deadline = deadline
+        self.budget = budget or RetryBudget()
+        self.idempotent_methods = idempotent_methods
+
+    def backoff(self, attempt):
+        """Get the jittered delay before retry number ``attempt``."""
+        cap = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+        return random.uniform(0, cap)
+
+    @staticmethod
+    def retry_after(response):
+        """Get the delay requested by a ``Retry-After`` header, if any."""
+        if response is None:
+            return None
+        value = response.headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def is_retryable(self, method, response=None, error=None):
+        """Check if a failed attempt may be repeated."""
+        if error is not None:
+            if method in self.idempotent_methods:
+                return True
+            return isinstance(
+                error, (ConnectTimeout, ConnectionError)
+            ) and not _is_read_error(error)
+        if response.status_code not in RETRY_STATUSES:
+            return False
+        if method in self.idempotent_methods:
+            return True
+        return response.status_code in (429, 503) and bool(
+            response.headers.get("Retry-After")
+        )
+
+    def delay(self, attempt, started, method, response=None, error=None):
+        """Get the delay before the next attempt, or ``None`` to give up.
+
+        :param attempt: Number of the attempt that just failed.
+        :param started: ``time.monotonic()`` when the call started.
+        """
+        if attempt >= self.max_attempts:
+            return None
+        if not self.is_retryable(method, response=response, error=error):
+            return None
+
+        delay = self.backoff(attempt)
+        retry_after = self.retry_after(response)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        if time.monotonic() - started + delay > self.deadline:
+            return None
+        if not self.budget.withdraw():
+            return None
+        return delay
+
+
+def _is_read_error(error):
+    """Check if a connection error happened after the request was sent."""
+    # requests raises ConnectionError for both failed connects and dropped
+    # connections; only the former guarantees the request was not sent. The
+    # urllib3 error it was raised from tells them apart.
+    if isinstance(error, ReadTimeout):
+        return True
+    if isinstance(error, ConnectTimeout):
+        return False
+    seen = set()
+    while error is not None and id(error) not in seen:
+        if isinstance(error, (ProtocolError, ReadTimeoutError)):
+            return True
+        seen.add(id(error))
+        error = error.__cause__ or error.__context__
+    return False
@@ -0,0 +1,148 @@
+"""Pooled keep-alive HTTP sessions for the PIDsLink API.
+
+All PIDsLink requests made by a process go through a shared connection pool,
+so minting and updating ARKs reuse open TCP/TLS connections to the PIDsLink
+host instead of paying for a new handshake on every call.
+"""
+
+import os
+import socket
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+
+
+class KeepAliveHTTPAdapter(HTTPAdapter):
+    """HTTP adapter enabling TCP keep-alive on pooled connections.
+
+    Idle connections kept in the pool are otherwise silently dropped by
+    firewalls and load balancers, which turns the next request on them into
+    a connection error instead of a reused connection.
+    """
+
+    def __init__(self, keepalive=True, **kwargs):
+        """Initialize the adapter."""
+        self.keepalive = keepalive
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        """Create the urllib3 pool manager with keep-alive socket options."""
+        if self.keepalive:
+            kwargs["socket_options"] = HTTPConnection.default_socket_options + [
+                (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+            ]
+        super().init_poolmanager(*args, **kwargs)
+
+
+class PIDsLinkSessionPool(object):
+    """Thread-safe registry of pooled HTTP sessions.
+
+    One :class:`KeepAliveHTTPAdapter` (i.e. one urllib3 pool manager) is kept
+    per host and shared by all threads of the process, while every thread
+    gets its own :class:`requests.Session` mounting that adapter. Connections
+    are therefore reused process wide, but session state is never shared
+    between threads.
+
+    The registry is reset in forked children (e.g. uWSGI workers forked from
+    the master process), as sockets must not be shared between processes.
+
+    :param pool_connections: Number of per-host pools to keep.
+    :param pool_maxsize: Maximum number of connections kept per host. It
+        should be at least the number of threads issuing requests (see
+        ``threads`` in ``uwsgi_rest.ini``).
+    :param pool_block: Block when no free connection is available instead of
+        opening a temporary one.
+    :param keepalive: Enable TCP keep-alive on pooled connections.
+    """
+
+    def __init__(
+        self, pool_connections=4, pool_maxsize=10, pool_block=False, keepalive=True
+    ):
+        """Initialize the session pool."""
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.keepalive = keepalive
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        """Drop all adapters and sessions owned by this process."""
+        self._pid = os.getpid()
+        self._adapters = {}
+        self._local = threading.local()
+
+    def _check_fork(self):
+        """Reset the registry if we are running in a forked child."""
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._reset()
+
+    @staticmethod
+    def origin(url):
+        """Get the ``scheme://host[:port]/`` part of a URL."""
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}/"
+
+    def adapter(self, url):
+        """Get the shared adapter for the host of a URL."""
+        self._check_fork()
+        base_url = self.origin(url)
+        adapter = self._adapters.get(base_url)
+        if adapter is None:
+            with self._lock:
+                adapter = self._adapters.get(base_url)
+                if adapter is None:
+                    adapter = KeepAliveHTTPAdapter(
+                        keepalive=self.keepalive,
+                        pool_connections=self.pool_connections,
+                        pool_maxsize=self.pool_maxsize,
+                        pool_block=self.pool_block,
+                    )
+                    self._adapters[base_url] = adapter
+        return adapter
+
+    def session(self, url):
+        """Get the calling thread's session for the host of a URL."""
+        self._check_fork()
+        base_url = self.origin(url)
+        sessions = getattr(self._local, "sessions", None)
+        if sessions is None:
+            sessions = self._local.sessions = {}
+        session = sessions.get(base_url)
+        if session is None:
+            session = requests.Session()
+            session.mount(base_url, self.adapter(base_url))
+            sessions[base_url] = session
+        return session
+
+    def close(self):
+        """Close all pooled connections of this process."""
+        with self._lock:
+            for adapter in self._adapters.values():
+                adapter.close()
+            self._reset()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_session_pool(
+    pool_connections=4, pool_maxsize=10, pool_block=False, keepalive=True
+):
+    """Get the process-wide session pool for the given settings.
+
+    Clients created with the same settings share the same pool, and thus the
+    same open connections.
+    """
+    key = (pool_connections, pool_maxsize, pool_block, keepalive)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = PIDsLinkSessionPool(*key)
+        return pool
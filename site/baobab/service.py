@@ -1,8 +1,29 @@
-from invenio_records_resources.services import ServiceComponent
+from flask import current_app
+from invenio_records_resources.services import Service
+from invenio_records_resources.services.uow import unit_of_work
 
-class PIDService(Service)
-    def create(self, identity, data):
-        self.run_components('create', identity, data)
+from .timing import time_component
 
-    def update(self, identity, data):
-        self.run_components('update', identity, data)
\ No newline at end of file
+
+class PIDService(Service):
+    @unit_of_work()
+    def create(self, identity, data, uow=None):
+        self.run_components('create', identity, data, uow=uow)
+
+    @unit_of_work()
+    def update(self, identity, data, uow=None):
+        self.run_components('update', identity, data, uow=uow)
+
+    def run_components(self, action, *args, **kwargs):
+        """Run components for a given action, timing them if enabled.
+
+        See :py:mod:`baobab.timing`; ``BAOBAB_COMPONENT_TIMING`` is only
+        checked once per call when disabled.
+        """
+        if not current_app.config.get("BAOBAB_COMPONENT_TIMING"):
+            return super().run_components(action, *args, **kwargs)
+
+        for component in self.components:
+            if hasattr(component, action):
+                with time_component(component, action):
+                    getattr(component, action)(*args, **kwargs)
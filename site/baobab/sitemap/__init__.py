@@ -0,0 +1,9 @@
+"""Sharded sitemaps of the published records.
+
+Each published public record has a :py:class:`SitemapEntry` with its
+landing URL, ARK and last modification date. Entries are assigned to a
+shard of at most ``BAOBAB_SITEMAP_SHARD_SIZE`` URLs when they are created
+and never move, so that updating a record only marks its shard as dirty.
+:py:func:`~baobab.sitemap.tasks.generate_sitemaps` rewrites the dirty shards
+and the sitemap index as static files, served by nginx.
+"""
@@ -0,0 +1,113 @@
+"""Database models of the sitemaps."""
+
+from datetime import datetime
+
+from invenio_db import db
+from sqlalchemy.dialects.postgresql import insert
+
+
+ALLOCATION_LOCK = 0x5173_6D70
+"""Key of the Postgres advisory lock serializing the allocation of slots."""
+
+
+class SitemapShard(db.Model):
+    """A sitemap file of at most ``BAOBAB_SITEMAP_SHARD_SIZE`` URLs."""
+
+    __tablename__ = "baobab_sitemap_shard"
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+
+    allocated = db.Column(db.Integer, nullable=False, default=0)
+    """Entries ever assigned to the shard; the shard is full at the shard size.
+
+    Removed entries do not free their slot, so shards fill up in order.
+    """
+
+    dirty = db.Column(db.Boolean, nullable=False, default=True)
+    """Entries changed since the file was last written."""
+
+    lastmod = db.Column(db.DateTime, nullable=True)
+    """Time the file was last written."""
+
+    @staticmethod
+    def lock():
+        """Serialize the allocations until the current transaction ends.
+
+        Entries stored by concurrent allocations are visible once the lock
+        is taken, so that they are not given another slot.
+        """
+        db.session.execute(db.select(db.func.pg_advisory_xact_lock(ALLOCATION_LOCK)))
+
+    @classmethod
+    def allocate(cls, count, shard_size):
+        """Assign slots to new entries, in the current transaction.
+
+        Must be called with the allocation lock held (see :py:meth:`lock`),
+        so that concurrent allocations do not overfill the last shard.
+
+        :returns: List of ``count`` shard ids, one per new entry.
+        """
+        shards = []
+        if not count:
+            return shards
+        shard = cls.query.order_by(cls.id.desc()).first()
+        while len(shards) < count:
+            if shard is None or shard.allocated >= shard_size:
+                shard = cls(id=shard.id + 1 if shard else 0, allocated=0)
+                db.session.add(shard)
+            taken = min(count - len(shards), shard_size - shard.allocated)
+            shard.allocated += taken
+            shard.dirty = True
+            shards.extend([shard.id] * taken)
+        return shards
+
+    @classmethod
+    def mark_dirty(cls, ids):
+        """Mark shards as dirty in the current transaction."""
+        if ids:
+            cls.query.filter(cls.id.in_(ids)).update(
+                {cls.dirty: True}, synchronize_session=False
+            )
+
+
+class SitemapEntry(db.Model):
+    """URL of a published record in the sitemaps."""
+
+    __tablename__ = "baobab_sitemap_entry"
+
+    recid = db.Column(db.String(255), primary_key=True)
+
+    shard_id = db.Column(
+        db.Integer, db.ForeignKey(SitemapShard.id), nullable=False, index=True
+    )
+
+    ark = db.Column(db.String(255), nullable=True)
+
+    lastmod = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    """Last modification of the record."""
+
+    @classmethod
+    def shards_of(cls, recids):
+        """Get the shards of the entries of records, by record PID."""
+        if not recids:
+            return {}
+        rows = db.session.query(cls.recid, cls.shard_id).filter(cls.recid.in_(recids))
+        return dict(rows)
+
+    @classmethod
+    def store_many(cls, rows):
+        """Insert or update entries in the current transaction.
+
+        Existing entries keep their shard.
+
+        :param rows: List of dicts with ``recid``, ``shard_id``, ``ark`` and
+            ``lastmod``.
+        """
+        if not rows:
+            return
+        statement = insert(cls.__table__).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=[cls.recid],
+            set_=dict(ark=statement.excluded.ark, lastmod=statement.excluded.lastmod),
+        )
+        db.session.execute(statement)
@@ -0,0 +1,137 @@
+"""Celery tasks maintaining the sitemaps."""
+
+from datetime import datetime
+
+from celery import shared_task
+from flask import current_app
+from invenio_db import db
+from invenio_rdm_records.proxies import current_rdm_records_service
+
+from ..pidslink.provider.pidslink import PIDsLinkClient
+from .models import SitemapEntry, SitemapShard
+from .writer import (
+    INDEX_FILENAME,
+    render_index,
+    render_shard,
+    shard_filename,
+    write_file,
+)
+
+
+def _is_listed(record):
+    """Check if a record is published and public."""
+    return (
+        not record.deletion_status.is_deleted
+        and record["access"]["record"] == "public"
+    )
+
+
+@shared_task(ignore_result=True)
+def update_sitemap_entries(record_ids):
+    """Add, update or remove the sitemap entries of records.
+
+    New entries are assigned to the last shard with free slots; the shards
+    of the changed entries are marked as dirty, to be rewritten by
+    :py:func:`generate_sitemaps`.
+
+    :param record_ids: UUIDs of the records.
+    """
+    records = current_rdm_records_service.record_cls.get_records(
+        record_ids, with_deleted=True
+    )
+    listed, removed = {}, set()
+    for record in records:
+        recid = record.pid.pid_value
+        if _is_listed(record):
+            listed[recid] = dict(
+                recid=recid,
+                ark=record.get("pids", {}).get("ark", {}).get("identifier"),
+                lastmod=record.updated,
+            )
+        else:
+            removed.add(recid)
+
+    existing = SitemapEntry.shards_of(set(listed) | removed)
+    new = [recid for recid in listed if recid not in existing]
+    if new:
+        SitemapShard.lock()
+        # entries stored by a concurrent task meanwhile keep their slot
+        existing.update(SitemapEntry.shards_of(new))
+        new = [recid for recid in new if recid not in existing]
+        shard_size = current_app.config["BAOBAB_SITEMAP_SHARD_SIZE"]
+        existing.update(zip(new, SitemapShard.allocate(len(new), shard_size)))
+    rows = [{**row, "shard_id": existing[recid]} for recid, row in listed.items()]
+    SitemapEntry.store_many(rows)
+
+    removed &= set(existing)
+    if removed:
+        SitemapEntry.query.filter(SitemapEntry.recid.in_(removed)).delete(
+            synchronize_session=False
+        )
+    SitemapShard.mark_dirty({existing[recid] for recid in set(listed) | removed})
+    db.session.commit()
+
+
+def _shard_entries(shard_id, client):
+    """Stream the entries of a shard, in URL order."""
+    query = (
+        db.session.query(SitemapEntry.recid, SitemapEntry.ark, SitemapEntry.lastmod)
+        .filter_by(shard_id=shard_id)
+        .order_by(SitemapEntry.recid)
+        .yield_per(1000)
+    )
+    site_ui_url = current_app.config["SITE_UI_URL"]
+    for recid, ark, lastmod in query:
+        # ARKs resolve locally (see baobab.pidslink.resolver)
+        ark_url = f"{site_ui_url}/{ark}" if ark else None
+        yield client.record_url(recid), ark_url, lastmod
+
+
+@shared_task(ignore_result=True)
+def generate_sitemaps(full=False):
+    """Rewrite the dirty shards and the sitemap index.
+
+    A shard is marked as clean before its entries are read, so that entries
+    changed while it is written mark it as dirty again for the next run.
+
+    :param full: Rewrite all the shards.
+    """
+    query = SitemapShard.query
+    if not full:
+        query = query.filter_by(dirty=True)
+    shard_ids = [shard.id for shard in query.order_by(SitemapShard.id)]
+    client = PIDsLinkClient("pidslink")
+    for shard_id in shard_ids:
+        SitemapShard.query.filter_by(id=shard_id).update({SitemapShard.dirty: False})
+        db.session.commit()
+        try:
+            write_file(
+                shard_filename(shard_id),
+                render_shard(_shard_entries(shard_id, client)),
+            )
+        except Exception:
+            db.session.rollback()
+            SitemapShard.mark_dirty([shard_id])
+            db.session.commit()
+            raise
+        SitemapShard.query.filter_by(id=shard_id).update(
+            {SitemapShard.lastmod: datetime.utcnow()}
+        )
+        db.session.commit()
+
+    if shard_ids or full:
+        shards = db.session.query(SitemapShard.id, SitemapShard.lastmod).filter(
+            SitemapShard.lastmod.isnot(None)
+        )
+        write_file(INDEX_FILENAME, render_index(shards.order_by(SitemapShard.id)))
+        db.session.commit()
+    current_app.logger.info(f"{len(shard_ids)} sitemap shards written.")
+
+
+def update_published_record(sender, record_id, **kwargs):
+    """Update the sitemap entry of a record once its ARK is registered or updated.
+
+    Receiver of :py:data:`~baobab.pidslink.signals.ark_registered` and
+    :py:data:`~baobab.pidslink.signals.ark_updated`.
+    """
+    update_sitemap_entries.delay([record_id])
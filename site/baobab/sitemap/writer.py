@@ -0,0 +1,101 @@
+"""Sitemap files, written to ``BAOBAB_SITEMAP_DIR``.
+
+Files are written to a temporary file and moved in place, so that nginx
+never serves a partially written sitemap.
+"""
+
+import os
+import tempfile
+from xml.sax.saxutils import escape, quoteattr
+
+from flask import current_app
+
+SITEMAP_NS = "http://www.sitemaps.org/schemas/sitemap/0.9"
+
+XHTML_NS = "http://www.w3.org/1999/xhtml"
+
+INDEX_FILENAME = "sitemap.xml"
+
+
+def sitemap_dir():
+    """Get the directory of the sitemap files."""
+    return current_app.config["BAOBAB_SITEMAP_DIR"] or os.path.join(
+        current_app.instance_path, "sitemaps"
+    )
+
+
+def shard_filename(shard_id):
+    """Get the file name of a shard."""
+    return f"sitemap-{shard_id}.xml"
+
+
+def sitemap_url(filename):
+    """Get the public URL of a sitemap file."""
+    base_url = current_app.config["BAOBAB_SITEMAP_URL"].format(
+        site_ui_url=current_app.config["SITE_UI_URL"]
+    )
+    return f"{base_url.rstrip('/')}/{filename}"
+
+
+def format_lastmod(value):
+    """Format a (naive UTC) datetime as a W3C datetime."""
+    return value.strftime("%Y-%m-%dT%H:%M:%S+00:00")
+
+
+def render_shard(entries):
+    """Render the entries of a shard.
+
+    :param entries: Iterable of ``(url, ark_url, lastmod)``; ``ark_url`` may
+        be ``None``.
+    :returns: Iterator of chunks of the file.
+    """
+    yield (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<urlset xmlns="{SITEMAP_NS}" xmlns:xhtml="{XHTML_NS}">\n'
+    )
+    for url, ark_url, lastmod in entries:
+        alternate = ""
+        if ark_url:
+            alternate = f'<xhtml:link rel="alternate" href={quoteattr(ark_url)}/>'
+        yield (
+            f"<url><loc>{escape(url)}</loc>"
+            f"<lastmod>{format_lastmod(lastmod)}</lastmod>{alternate}</url>\n"
+        )
+    yield "</urlset>\n"
+
+
+def render_index(shards):
+    """Render the sitemap index.
+
+    :param shards: Iterable of ``(shard_id, lastmod)``.
+    :returns: Iterator of chunks of the file.
+    """
+    yield (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<sitemapindex xmlns="{SITEMAP_NS}">\n'
+    )
+    for shard_id, lastmod in shards:
+        yield (
+            f"<sitemap><loc>{escape(sitemap_url(shard_filename(shard_id)))}</loc>"
+            f"<lastmod>{format_lastmod(lastmod)}</lastmod></sitemap>\n"
+        )
+    yield "</sitemapindex>\n"
+
+
+def write_file(filename, chunks):
+    """Atomically replace a sitemap file.
+
+    :param chunks: Iterator of chunks of the file.
+    """
+    directory = sitemap_dir()
+    os.makedirs(directory, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".xml")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as fp:
+            fp.writelines(chunks)
+        # readable by nginx, mkstemp creates the file as private
+        os.chmod(path, 0o644)
+        os.replace(path, os.path.join(directory, filename))
+    except BaseException:
+        os.unlink(path)
+        raise
@@ -0,0 +1,93 @@
+"""Timing of the service components.
+
+When ``BAOBAB_COMPONENT_TIMING`` is enabled, every component hook run by
+:py:class:`baobab.service.PIDService` is timed. Timings are:
+
+* attached to the current request (``g.baobab_component_timings``) and
+  returned in a ``Server-Timing`` header;
+* logged with the request ID set by nginx (``X-Request-ID``) when a hook is
+  slower than ``BAOBAB_COMPONENT_TIMING_SLOW``;
+* aggregated across processes in the PIDsLink metrics registry, and exposed
+  with the other metrics at ``/pidslink/metrics``.
+"""
+
+import time
+from contextlib import contextmanager
+
+from flask import current_app, g, has_app_context, has_request_context, request
+
+from .pidslink.provider.pidslink import PIDsLinkClient
+from .pidslink_service.metrics import COUNTER, HISTOGRAM, METRICS
+
+METRICS["baobab_component_duration_seconds"] = (
+    HISTOGRAM,
+    "Duration of the service component hooks.",
+)
+METRICS["baobab_component_slow_total"] = (
+    COUNTER,
+    "Service component hooks slower than BAOBAB_COMPONENT_TIMING_SLOW.",
+)
+
+
+def get_request_id():
+    """Get the ID of the current request, as passed by nginx."""
+    if not has_request_context():
+        return None
+    # set by Invenio-App from APP_REQUESTID_HEADER
+    request_id = g.get("request_id")
+    if request_id:
+        return request_id
+    return request.headers.get("X-Request-ID") or request.environ.get(
+        "X-Request-ID"
+    )
+
+
+@contextmanager
+def time_component(component, action):
+    """Time a component hook.
+
+    :param component: The service component.
+    :param action: The hook (e.g. ``create``).
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(type(component).__name__, action, time.perf_counter() - start)
+
+
+def record_timing(name, action, duration):
+    """Record the duration of a component hook."""
+    if has_app_context():
+        g.setdefault("baobab_component_timings", []).append((name, action, duration))
+
+    metrics = PIDsLinkClient("pidslink").metrics
+    if metrics is not None:
+        metrics.observe(
+            "baobab_component_duration_seconds",
+            duration,
+            component=name,
+            action=action,
+        )
+
+    if duration >= current_app.config["BAOBAB_COMPONENT_TIMING_SLOW"]:
+        if metrics is not None:
+            metrics.inc("baobab_component_slow_total", component=name, action=action)
+        current_app.logger.warning(
+            f"Slow service component {name}.{action}: {duration * 1000:.1f} ms "
+            f"(request {get_request_id() or '-'})"
+        )
+
+
+def add_server_timing(response):
+    """Return the component timings of the request in a ``Server-Timing`` header."""
+    timings = g.get("baobab_component_timings")
+    if timings:
+        response.headers.add(
+            "Server-Timing",
+            ", ".join(
+                f"{name}.{action};dur={duration * 1000:.1f}"
+                for name, action, duration in timings
+            ),
+        )
+    return response
@@ -1,6 +1,187 @@
 """Additional views."""
 
-from flask import Blueprint
+import hmac
+import os
+import socket
+from datetime import datetime
+
+from flask import (
+    Blueprint,
+    Response,
+    abort,
+    current_app,
+    g,
+    redirect,
+    request,
+    stream_with_context,
+    url_for,
+)
+from invenio_db import db
+
+from .autocomplete import search_vocabulary, suggest
+from .export import export_records
+from .oai.response import (
+    OAIError,
+    error_response,
+    get_record,
+    is_own_token,
+    list_metadata_formats,
+    list_records,
+)
+from .pidslink.models import OutboxStatus, PIDsLinkOutbox
+from .pidslink.provider.pidslink import PIDsLinkClient
+from .pidslink.resolver import get_ark_index, is_resolvable
+from .pidslink.serializers import serializer_cache_stats
+
+
+def pidslink_metrics():
+    """Expose the PIDsLink client metrics in Prometheus text format.
+
+    Requires the ``PIDSLINK_METRICS_TOKEN`` bearer token; the metrics are
+    disabled without it.
+    """
+    token = current_app.config.get("PIDSLINK_METRICS_TOKEN")
+    if not token:
+        abort(404)
+    expected = f"Bearer {token}"
+    if not hmac.compare_digest(request.headers.get("Authorization", ""), expected):
+        abort(401)
+
+    metrics = PIDsLinkClient("pidslink").metrics
+    if metrics is None:
+        abort(404)
+
+    # sent operations are kept for auditing, only count the backlog
+    rows = (
+        db.session.query(PIDsLinkOutbox.status, db.func.count(PIDsLinkOutbox.id))
+        .filter(PIDsLinkOutbox.status != OutboxStatus.DONE)
+        .group_by(PIDsLinkOutbox.status)
+        .all()
+    )
+    extra = {
+        ("pidslink_outbox_entries", (("status", status.name.lower()),)): count
+        for status, count in rows
+    }
+    # the serializer cache lives in each process, only this one is reported
+    stats = serializer_cache_stats()
+    process = (("process", f"{socket.gethostname()}:{os.getpid()}"),)
+    extra[("pidslink_serializer_cache_hits_total", process)] = stats["hits"]
+    extra[("pidslink_serializer_cache_misses_total", process)] = stats["misses"]
+    extra[("pidslink_serializer_cache_entries", process)] = stats["size"]
+    return Response(
+        metrics.render(extra=extra),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+def autocomplete(vocabulary):
+    """Suggest the names or subjects starting with ``?q=``, from memory.
+
+    ``?size=`` suggestions at most (10 by default). Vocabularies that are
+    not in memory, or whose index is still being built, are searched.
+    """
+    query = request.args.get("q", "")
+    size = request.args.get("size", 10, type=int)
+    size = max(1, min(size, current_app.config["BAOBAB_AUTOCOMPLETE_MAX_SIZE"]))
+    hits = suggest(vocabulary, query, size=size)
+    if hits is None:
+        hits = search_vocabulary(g.identity, vocabulary, query, size=size)
+    return {"hits": {"hits": hits, "total": len(hits)}}
+
+
+def resolve_ark(value):
+    """Redirect an ARK to the landing page of its record.
+
+    Path qualifiers are kept, e.g. ``/ark:/50962/bb67854xt5k2/files/a.pdf``
+    redirects to the file ``a.pdf`` of the record; variant qualifiers
+    (``.v2``) are ignored. ARKs of deleted or restricted records do not
+    resolve.
+    """
+    try:
+        recid, qualifier = get_ark_index().resolve(f"ark:/{value}")
+    except ValueError:
+        abort(404)
+    # the index of the process may not know the record changed yet
+    if recid is None or not is_resolvable(recid):
+        abort(404)
+
+    url = PIDsLinkClient("pidslink").record_url(recid)
+    if qualifier.startswith("/"):
+        url += qualifier
+    return redirect(url, code=302)
+
+
+def export(fmt, gzip=False):
+    """Stream an export of the published records.
+
+    Served as ``/export/records.jsonl`` or ``/export/records.csv``, gzip
+    compressed with a ``.gz`` suffix. ``?since=YYYY-MM-DD`` only exports the
+    records updated since that date. Requests must be authorized with the
+    ``BAOBAB_EXPORT_TOKEN`` bearer token; the export is disabled without it.
+    """
+    token = current_app.config.get("BAOBAB_EXPORT_TOKEN")
+    if not token:
+        abort(404)
+    expected = f"Bearer {token}"
+    if not hmac.compare_digest(request.headers.get("Authorization", ""), expected):
+        abort(401)
+
+    since = request.args.get("since")
+    if since:
+        try:
+            since = datetime.fromisoformat(since).isoformat()
+        except ValueError:
+            abort(400)
+
+    filename = f"records.{fmt}" + (".gz" if gzip else "")
+    content_type = {
+        "jsonl": "application/x-ndjson; charset=utf-8",
+        "csv": "text/csv; charset=utf-8",
+    }[fmt]
+    response = Response(
+        stream_with_context(export_records(fmt, since=since, gzip=gzip)),
+        content_type="application/gzip" if gzip else content_type,
+    )
+    response.headers["Content-Disposition"] = f"attachment; filename={filename}"
+    return response
+
+
+OAI_VERBS = ("GetRecord", "ListIdentifiers", "ListMetadataFormats", "ListRecords")
+"""OAI-PMH verbs served from the pre-rendered records."""
+
+
+def oai_pmh():
+    """Serve OAI-PMH harvests from the pre-rendered records.
+
+    Identify, ListSets, selective harvesting by set and the formats that are
+    not pre-rendered are redirected to the OAI-PMH server of Invenio, and so
+    are the next pages of these harvests, whose resumption tokens were
+    issued by Invenio.
+    """
+    args = request.args.to_dict()
+    verb = args.get("verb")
+    formats = current_app.config["BAOBAB_OAI_METADATA_FORMATS"]
+    token = args.get("resumptionToken")
+    if (
+        verb not in OAI_VERBS
+        or "set" in args
+        or args.get("metadataPrefix", next(iter(formats))) not in formats
+        or (token is not None and not is_own_token(token))
+    ):
+        query = request.query_string.decode("utf-8")
+        return redirect(f"{url_for('invenio_oaiserver.response')}?{query}")
+
+    content_type = "text/xml; charset=utf-8"
+    try:
+        if verb == "ListMetadataFormats":
+            return Response(list_metadata_formats(args), content_type=content_type)
+        if verb == "GetRecord":
+            return Response(get_record(args), content_type=content_type)
+        chunks = list_records(args)
+    except OAIError as error:
+        return Response(error_response(args, error), content_type=content_type)
+    return Response(stream_with_context(chunks), content_type=content_type)
+
 
 #
 # Registration
@@ -14,4 +195,18 @@ def create_blueprint(app):
     )
 
     # Add URL rules
+    blueprint.add_url_rule("/pidslink/metrics", view_func=pidslink_metrics)
+    # both the ark:/NAAN/name and ark:NAAN/name forms
+    blueprint.add_url_rule("/ark:/<path:value>", view_func=resolve_ark)
+    blueprint.add_url_rule("/ark:<path:value>", view_func=resolve_ark)
+    blueprint.add_url_rule("/oai", view_func=oai_pmh)
+    blueprint.add_url_rule(
+        "/autocomplete/<any(names, subjects):vocabulary>", view_func=autocomplete
+    )
+    blueprint.add_url_rule("/export/records.<any(jsonl, csv):fmt>", view_func=export)
+    blueprint.add_url_rule(
+        "/export/records.<any(jsonl, csv):fmt>.gz",
+        view_func=export,
+        defaults={"gzip": True},
+    )
     return blueprint
@@ -0,0 +1,312 @@
+"""Local stand-in for the PIDsLink API.
+
+The fake server implements the endpoints used by
+:py:class:`PIDsLinkRESTClient` (mint, query and update) on top of an
+in-memory store, and can slow down or fail requests on purpose. It is meant
+for benchmarks and manual testing, so it is not part of the ``baobab``
+package::
+
+    with FakePIDsLinkServer(latency=0.05, error_rate=0.01) as server:
+        client = PIDsLinkRESTClient("user", "pass", "50962/bb", url=server.url)
+        client.post_pids(...)
+
+It can also be run on its own, e.g. to point a development instance at it
+with ``PIDSLINK_URL``::
+
+    python benchmarks/fakeserver.py --port 5050 --latency 0.05
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MINT_PATH = "/api/pids/mint/"
+QUERY_PATH = "/api/pids/query/"
+UPDATE_PATH = "/api/pids/update/"
+
+NOID_ALPHABET = "0123456789bcdfghjkmnpqrstvwxz"
+
+
+class FakePIDsLinkHandler(BaseHTTPRequestHandler):
+    """Handle a request to the fake PIDsLink API."""
+
+    protocol_version = "HTTP/1.1"
+
+    # headers and body are written separately, Nagle's algorithm would delay
+    # the body until the client acknowledges the headers
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        """Log requests only if the server is verbose."""
+        if self.server.fake.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, body, headers=None):
+        """Send a JSON response."""
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_json(self):
+        """Read the JSON body of the request."""
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length))
+        except ValueError:
+            return None
+
+    def _handle(self, method):
+        """Apply latency and faults, then dispatch the request."""
+        fake = self.server.fake
+        body = self._read_json() if method in ("POST", "PATCH") else {}
+        fake.wait()
+
+        fault = fake.fault()
+        if fault is not None:
+            status, headers = fault
+            fake.count(method, status)
+            return self._send_json(
+                status, {"status": False, "message": "Injected error"}, headers
+            )
+
+        status, response = fake.dispatch(method, self.path, body)
+        fake.count(method, status)
+        self._send_json(status, response)
+
+    def do_GET(self):
+        """Query a PIDs."""
+        self._handle("GET")
+
+    def do_POST(self):
+        """Mint a PIDs."""
+        self._handle("POST")
+
+    def do_PATCH(self):
+        """Update a PIDs."""
+        self._handle("PATCH")
+
+
+class FakePIDsLinkServer(object):
+    """In-memory PIDsLink API served on a background thread.
+
+    :param host: Interface to listen on.
+    :param port: Port to listen on; ``0`` picks a free port.
+    :param naan: NAAN of the minted ARKs.
+    :param latency: Base delay of every response in seconds.
+    :param jitter: Random delay (uniform, in seconds) added to ``latency``.
+    :param error_rate: Probability of answering with ``error_status``.
+    :param error_status: Status of injected server errors (5xx).
+    :param throttle_rate: Probability of answering 429 Too Many Requests.
+    :param retry_after: ``Retry-After`` header of injected 429 and 503
+        responses, or ``None`` to omit it.
+    :param seed: Seed of the fault injection, for reproducible runs.
+    :param verbose: Log every request.
+    """
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=0,
+        naan="50962",
+        latency=0.0,
+        jitter=0.0,
+        error_rate=0.0,
+        error_status=503,
+        throttle_rate=0.0,
+        retry_after=1,
+        seed=None,
+        verbose=False,
+    ):
+        """Initialize the server."""
+        self.naan = naan
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.verbose = verbose
+        self.pids = {}
+        self.requests = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._sequence = 0
+        self._thread = None
+
+        self.httpd = ThreadingHTTPServer((host, port), FakePIDsLinkHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.fake = self
+
+    def __repr__(self):
+        """Create string representation of object."""
+        return "<FakePIDsLinkServer: {0}>".format(self.url)
+
+    def __enter__(self):
+        """Start the server."""
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        """Stop the server."""
+        self.stop()
+
+    @property
+    def url(self):
+        """Base URL of the API, for ``PIDsLinkRESTClient(url=...)``."""
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self):
+        """Serve requests on a background thread."""
+        self._thread = threading.Thread(
+            target=self.httpd.serve_forever, name="fake-pidslink", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving requests."""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def reset(self):
+        """Forget all PIDs and request counters."""
+        with self._lock:
+            self.pids.clear()
+            self.requests.clear()
+
+    def wait(self):
+        """Sleep for the configured latency."""
+        with self._lock:
+            delay = self.latency + self._random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def fault(self):
+        """Draw an injected fault.
+
+        :returns: ``(status, headers)`` of the fault or ``None``.
+        """
+        with self._lock:
+            draw = self._random.random()
+        if draw < self.throttle_rate:
+            status = 429
+        elif draw < self.throttle_rate + self.error_rate:
+            status = self.error_status
+        else:
+            return None
+
+        headers = {}
+        if status in (429, 503) and self.retry_after is not None:
+            headers["Retry-After"] = str(self.retry_after)
+        return status, headers
+
+    def count(self, method, status):
+        """Count a response."""
+        with self._lock:
+            self.requests[(method, status)] += 1
+
+    def _next_name(self):
+        """Get the next unique name (blade) in the NOID alphabet."""
+        with self._lock:
+            self._sequence += 1
+            n = self._sequence
+        name = ""
+        while n:
+            n, digit = divmod(n, len(NOID_ALPHABET))
+            name = NOID_ALPHABET[digit] + name
+        return name.rjust(6, "0")
+
+    def dispatch(self, method, path, body):
+        """Apply a request to the store.
+
+        :returns: ``(status, response body)``.
+        """
+        if body is None:
+            return 400, {"status": False, "message": "Invalid JSON body."}
+        if method == "POST" and path.startswith(MINT_PATH):
+            return self.mint(body)
+        if method == "GET" and path.startswith(QUERY_PATH):
+            return self.query(path[len(QUERY_PATH) :])
+        if method == "PATCH" and path.startswith(UPDATE_PATH):
+            return self.update(path[len(UPDATE_PATH) :], body)
+        return 404, {"status": False, "message": f"No route for {method} {path}"}
+
+    def mint(self, body):
+        """Mint an ARK."""
+        naan = body.get("naan") or self.naan
+        shoulder = (body.get("shoulder") or "").strip("/")
+        ark = f"ark:/{naan}/{shoulder}{self._next_name()}"
+        data = {k: v for k, v in body.items() if k not in ("naan", "shoulder")}
+        data.update({"pidsId": ark, "ark": ark})
+        with self._lock:
+            self.pids[ark] = data
+        return 201, {"status": True, "message": "PIDs minted.", "ark": ark}
+
+    def _key(self, pids_id):
+        """Get the store key of a PIDs ID."""
+        if pids_id.startswith("ark:") and not pids_id.startswith("ark:/"):
+            return "ark:/" + pids_id[len("ark:") :]
+        return pids_id
+
+    def query(self, pids_id):
+        """Get a PIDs."""
+        with self._lock:
+            data = self.pids.get(self._key(pids_id))
+        if data is None:
+            return 404, {"status": False, "message": f"{pids_id} not found."}
+        return 200, {"status": True, "data": dict(data)}
+
+    def update(self, pids_id, body):
+        """Update a PIDs."""
+        key = self._key(pids_id)
+        with self._lock:
+            data = self.pids.get(key)
+            if data is not None:
+                data.update(body)
+        if data is None:
+            return 404, {"status": False, "message": f"{pids_id} not found."}
+        return 200, {"status": True, "data": {"pidsId": key}}
+
+
+def main(argv=None):
+    """Run the fake server in the foreground."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5050)
+    parser.add_argument("--naan", default="50962")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    server = FakePIDsLinkServer(**vars(args))
+    print(f"Fake PIDsLink API listening on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+"""Benchmark the PIDsLink client against the fake PIDsLink API.
+
+Runs the PIDsLink calls made by ``PIDsLinkPIDProvider`` against a local
+:py:class:`~fakeserver.FakePIDsLinkServer` (or any PIDsLink API given with
+``--url``) and reports throughput and latency percentiles for each
+scenario:
+
+* ``register``: mint an ARK and bind it to its landing page (a mint and an
+  update, as when a record is published without a reserved ARK);
+* ``update``: update the target and metadata of an ARK;
+* ``query``: query an ARK, bypassing the cache;
+* ``bulk-mint``: mint ARKs concurrently with the asyncio client, as when
+  the reservation pool is refilled.
+
+Usage::
+
+    python benchmarks/pidslink.py --requests 2000 --concurrency 16 \\
+        --latency 0.02 --jitter 0.01 --error-rate 0.01 --throttle-rate 0.01
+
+Compare the output before and after changing the client to catch
+regressions; use ``--seed`` so that both runs inject the same faults. The
+embedded fake server shares the interpreter (and the GIL) with the client,
+which inflates latencies at high concurrency; start it in its own process
+(``python benchmarks/fakeserver.py``) and pass ``--url`` for more realistic
+numbers.
+"""
+
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from baobab.pidslink_service import (
+    CircuitBreaker,
+    PIDsLinkAsyncRESTClient,
+    PIDsLinkRESTClient,
+    PIDsLinkSessionPool,
+    RetryPolicy,
+)
+from baobab.pidslink_service.async_client import collect
+from fakeserver import FakePIDsLinkServer
+
+PREFIX = "50962/bb"
+
+SCENARIOS = ("register", "update", "query", "bulk-mint")
+
+
+def mint_data(url):
+    """Get the minting payload of ``PIDsLinkClient.mint_data``."""
+    naan, _, shoulder = PREFIX.partition("/")
+    return dict(
+        naan=naan,
+        shoulder=f"/{shoulder}",
+        url=url,
+        metadata="",
+        type_="",
+        commitment="",
+        identifier="",
+        format_="",
+        relation="",
+        source=url,
+    )
+
+
+def metadata(i):
+    """Get the ERC metadata of the i-th benchmark record."""
+    return {
+        "who": f"Doe, Jane; Roe, Richard {i}",
+        "what": f"Benchmark record {i}",
+        "when": "2024-01-01",
+        "publisher": "BAOBAB",
+        "event": "publish",
+    }
+
+
+class TimedClient(PIDsLinkRESTClient):
+    """REST client recording the latency of every call."""
+
+    def __init__(self, *args, **kwargs):
+        """Initialize the client."""
+        super().__init__(*args, **kwargs)
+        self.latencies = []
+
+    def _timed(self, func, *args, **kwargs):
+        """Call ``func`` and record its latency."""
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            # list.append is atomic, no lock needed across threads
+            self.latencies.append(time.perf_counter() - start)
+
+    def post_pids(self, **kwargs):
+        """Mint PIDs."""
+        return self._timed(super().post_pids, **kwargs)
+
+
+def percentile(values, p):
+    """Get the p-th percentile (nearest rank) of sorted values."""
+    if not values:
+        return float("nan")
+    rank = max(1, int(round(p / 100 * len(values) + 0.5)))
+    return values[min(rank, len(values)) - 1]
+
+
+def report(name, latencies, errors, elapsed):
+    """Summarize a scenario run."""
+    latencies = sorted(latencies)
+    calls = len(latencies)
+    return {
+        "scenario": name,
+        "calls": calls,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput": round(calls / elapsed, 1) if elapsed else float("nan"),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def run_threaded(name, func, n, concurrency):
+    """Run ``func(i)`` n times on a thread pool and time each call."""
+
+    def _call(i):
+        start = time.perf_counter()
+        try:
+            func(i)
+            error = None
+        except Exception as e:
+            error = e
+        return time.perf_counter() - start, error
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(_call, range(n)))
+    elapsed = time.perf_counter() - start
+
+    errors = {}
+    for _, error in results:
+        if error is not None:
+            errors[type(error).__name__] = errors.get(type(error).__name__, 0) + 1
+    return report(name, [latency for latency, _ in results], errors, elapsed)
+
+
+def run_bulk_mint(client, n, concurrency):
+    """Mint n ARKs with the asyncio client."""
+    client.latencies = []
+    async_client = PIDsLinkAsyncRESTClient(client, max_concurrency=concurrency)
+    data = mint_data("https://baobab.example.org/records/placeholder")
+
+    start = time.perf_counter()
+    try:
+        results = collect(async_client.mint_many((i, data) for i in range(n)))
+    finally:
+        async_client.close()
+    elapsed = time.perf_counter() - start
+
+    errors = {}
+    for result in results:
+        if result.error is not None:
+            name = type(result.error).__name__
+            errors[name] = errors.get(name, 0) + 1
+    return report("bulk-mint", client.latencies, errors, elapsed)
+
+
+def seed_arks(client, n, concurrency):
+    """Mint ARKs to update and query."""
+    data = mint_data("https://baobab.example.org/records/seed")
+    async_client = PIDsLinkAsyncRESTClient(client, max_concurrency=concurrency)
+    try:
+        results = collect(async_client.mint_many((i, data) for i in range(n)))
+    finally:
+        async_client.close()
+    arks = [r.value["ark"] for r in results if r.error is None]
+    if not arks:
+        raise RuntimeError("Could not mint any ARK to benchmark with.")
+    return arks
+
+
+def run(args, url, server=None):
+    """Run the selected scenarios against the API at ``url``.
+
+    :param server: The :py:class:`FakePIDsLinkServer` serving ``url``, if any.
+    """
+    pool = PIDsLinkSessionPool(pool_maxsize=args.concurrency)
+    client = TimedClient(
+        "benchmark",
+        "benchmark",
+        PREFIX,
+        url=url,
+        timeout=(3.05, 30),
+        session_pool=pool,
+        retry_policy=RetryPolicy(max_attempts=args.max_attempts),
+        circuit_breaker=CircuitBreaker() if args.breaker else None,
+    )
+
+    results = []
+    arks = None
+    for scenario in args.scenarios:
+        if scenario in ("update", "query") and arks is None:
+            # faults would make the seeding itself flaky
+            if server is not None:
+                server.throttle_rate, server.error_rate = 0.0, 0.0
+            arks = seed_arks(client, min(args.requests, 1000), args.concurrency)
+            if server is not None:
+                server.throttle_rate = args.throttle_rate
+                server.error_rate = args.error_rate
+
+        if scenario == "register":
+
+            def register(i):
+                target = f"https://baobab.example.org/records/{i}"
+                ark = client.post_pids(**mint_data(target))["ark"]
+                client.patch_pids(ark, url=target, metadata=metadata(i), source=target)
+
+            result = run_threaded(scenario, register, args.requests, args.concurrency)
+        elif scenario == "update":
+
+            def update(i):
+                ark = arks[i % len(arks)]
+                target = f"https://baobab.example.org/records/{i}"
+                client.patch_pids(ark, url=target, metadata=metadata(i), source=target)
+
+            result = run_threaded(scenario, update, args.requests, args.concurrency)
+        elif scenario == "query":
+
+            def query(i):
+                client.get_pids(arks[i % len(arks)])
+
+            result = run_threaded(scenario, query, args.requests, args.concurrency)
+        else:
+            result = run_bulk_mint(client, args.requests, args.concurrency)
+        results.append(result)
+
+    pool.close()
+    return results
+
+
+def print_results(results):
+    """Print the results as a table."""
+    header = ("scenario", "calls", "seconds", "throughput", "p50_ms", "p95_ms",
+              "p99_ms", "errors")
+    print("{:<10} {:>7} {:>8} {:>11} {:>8} {:>8} {:>8}  {}".format(*header))
+    for r in results:
+        errors = ", ".join(f"{k}={v}" for k, v in sorted(r["errors"].items()))
+        print(
+            "{scenario:<10} {calls:>7} {seconds:>8} {throughput:>11} "
+            "{p50_ms:>8} {p95_ms:>8} {p99_ms:>8}  ".format(**r) + (errors or "-")
+        )
+
+
+def parse_args(argv=None):
+    """Parse the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="PIDsLink API to use instead of the fake one")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS,
+                        default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=1000,
+                        help="calls per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--max-attempts", type=int, default=3,
+                        help="attempts per call, including retries")
+    parser.add_argument("--breaker", action="store_true",
+                        help="guard the calls with a circuit breaker")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=int, default=None,
+                        help="Retry-After header of injected 429/503 responses")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", action="store_true",
+                        help="print the results as JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Run the benchmark."""
+    args = parse_args(argv)
+
+    if args.url:
+        results = run(args, args.url)
+    else:
+        server = FakePIDsLinkServer(
+            latency=args.latency,
+            jitter=args.jitter,
+            error_rate=args.error_rate,
+            error_status=args.error_status,
+            throttle_rate=args.throttle_rate,
+            retry_after=args.retry_after,
+            seed=args.seed,
+        )
+        with server:
+            results = run(args, server.url, server)
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        print_results(results)
+
+
+if __name__ == "__main__":
+    main()
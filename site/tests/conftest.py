@@ -0,0 +1,26 @@
+"""Pytest fixtures of BAOBAB, see pytest-invenio."""
+
+import pytest
+from flask import Flask
+from invenio_db import InvenioDB
+
+
+@pytest.fixture(scope="module")
+def app_config(app_config):
+    """Application configuration."""
+    app_config["PIDSLINK_OUTBOX_QUIET_WINDOW"] = 10
+    app_config["PIDSLINK_OUTBOX_MAX_DELAY"] = 120
+    return app_config
+
+
+@pytest.fixture(scope="module")
+def create_app(instance_path):
+    """Application factory with the database only."""
+
+    def factory(**config):
+        app = Flask("testapp", instance_path=instance_path)
+        app.config.update(**config)
+        InvenioDB(app)
+        return app
+
+    return factory
@@ -0,0 +1,80 @@
+"""Tests of the ARK syntax."""
+
+import pytest
+
+from baobab.pidslink.ark import noid_check_char, normalize_ark, parse_ark, validate_ark
+
+
+def test_noid_check_char():
+    # reference example of the NOID documentation
+    assert noid_check_char("13030/xf93gt2") == "q"
+
+
+def test_validate_check_char():
+    ark = validate_ark("ark:/13030/xf93gt2q", check_char=True)
+    assert ark.base == "ark:/13030/xf93gt2q"
+
+
+def test_validate_invalid_check_char():
+    with pytest.raises(ValueError):
+        validate_ark("ark:/13030/xf93gt2r", check_char=True)
+    # transposed characters are caught too
+    with pytest.raises(ValueError):
+        validate_ark("ark:/13030/xf39gt2q", check_char=True)
+
+
+def test_validate_prefix():
+    assert validate_ark("ark:/13030/xf93gt2q", prefix="13030/xf")
+    with pytest.raises(ValueError):
+        validate_ark("ark:/13030/xf93gt2q", prefix="99999/xf")
+    with pytest.raises(ValueError):
+        validate_ark("ark:/13030/xf93gt2q", prefix="13030/bb")
+    with pytest.raises(ValueError):
+        validate_ark("ark:/13030/xf", prefix="13030/xf")
+
+
+@pytest.mark.parametrize(
+    "value,qualifier",
+    [
+        ("ark:/13030/xf93gt2q", ""),
+        ("ark:/13030/xf93gt2q/files/report.pdf", "/files/report.pdf"),
+        ("ark:/13030/xf93gt2q.v2", ".v2"),
+        ("ark:/13030/xf93gt2q/sub.v2/", "/sub.v2"),
+        # trailing structural characters are not significant
+        ("ark:/13030/xf93gt2q./", ""),
+    ],
+)
+def test_parse_qualifiers(value, qualifier):
+    ark = parse_ark(value)
+    assert ark.naan == "13030"
+    assert ark.name == "xf93gt2q"
+    assert ark.qualifier == qualifier
+    assert str(ark) == "ark:/13030/xf93gt2q" + qualifier
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        "ark:/13030/xf93gt2q",
+        "ark:13030/xf93gt2q",
+        "ARK:/13030/xf93gt2q",
+        "ark:/13030/xf9-3gt-2q",
+        " ark:/13030/xf93gt2q ",
+        "https://n2t.net/ark:/13030/xf93gt2q",
+    ],
+)
+def test_normalize(value):
+    assert normalize_ark(value) == "ark:/13030/xf93gt2q"
+
+
+def test_normalize_keeps_name_case():
+    assert normalize_ark("ark:/13030/XF93gt2q") == "ark:/13030/XF93gt2q"
+
+
+@pytest.mark.parametrize(
+    "value",
+    ["", "13030/xf93gt2q", "ark:/13030", "ark:/130/xf93gt2q", "ark:/13030/xf 93"],
+)
+def test_parse_invalid(value):
+    with pytest.raises(ValueError):
+        parse_ark(value)
@@ -0,0 +1,97 @@
+"""Tests of the ARKs assigned to already published records."""
+
+from types import SimpleNamespace
+
+import pytest
+
+from baobab.pidslink.provider import pidslink
+from baobab.pidslink.provider.pidslink import PIDsLinkPIDProvider
+
+ARK = "ark:/13030/xf93gt2q"
+
+
+class Record(dict):
+    """Stored record or draft."""
+
+    def __init__(self, id_, pids=None):
+        """Constructor."""
+        super().__init__(pids=pids or {})
+        self.id = id_
+        self.commits = 0
+
+    @property
+    def pids(self):
+        """PIDs of the record."""
+        return self["pids"]
+
+    @pids.setter
+    def pids(self, value):
+        """Set the PIDs of the record."""
+        self["pids"] = value
+
+    def commit(self):
+        """Store the record."""
+        self.commits += 1
+
+
+@pytest.fixture()
+def drafts(monkeypatch):
+    """Open drafts, by record id."""
+    drafts = {}
+    draft_cls = SimpleNamespace(
+        get_records=lambda ids: [drafts[id_] for id_ in ids if id_ in drafts]
+    )
+    monkeypatch.setattr(
+        pidslink,
+        "current_rdm_records_service",
+        SimpleNamespace(draft_cls=draft_cls),
+    )
+    return drafts
+
+
+@pytest.fixture()
+def provider(monkeypatch):
+    """ARK provider that does not store PIDs."""
+    provider = PIDsLinkPIDProvider("ark", client=SimpleNamespace(name="pidslink"))
+    monkeypatch.setattr(provider, "create", lambda record, pid_value: None)
+    monkeypatch.setattr(
+        provider,
+        "register_many",
+        lambda items: {str(record.id): True for record, _ in items},
+    )
+    return provider
+
+
+def test_ark_is_stored_in_record(provider, drafts):
+    record = Record("1")
+
+    registered, draft_ids = provider.create_and_register_many(
+        [(record, ARK, "https://x.org/records/1")]
+    )
+
+    assert registered == {"1": True}
+    assert draft_ids == []
+    assert record.pids["ark"] == {
+        "identifier": ARK,
+        "provider": "ark",
+        "client": "pidslink",
+    }
+    assert record.commits == 1
+
+
+def test_edit_after_backfill_keeps_ark(provider, drafts):
+    # the record was being edited when its ARK was backfilled
+    doi = {"identifier": "10.1234/1", "provider": "external"}
+    record = Record("1", pids={"doi": doi})
+    draft = drafts["1"] = Record("1", pids={"doi": doi})
+
+    _, draft_ids = provider.create_and_register_many(
+        [(record, ARK, "https://x.org/records/1")]
+    )
+
+    assert draft_ids == ["1"]
+    assert draft.commits == 1
+    assert draft.pids == {"doi": doi, "ark": record.pids["ark"]}
+    # publishing the draft sets the PIDs of the record from the draft
+    record.pids = dict(draft.pids)
+    assert record.pids["ark"]["identifier"] == ARK
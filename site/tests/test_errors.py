@@ -0,0 +1,42 @@
+"""Tests of the PIDsLink errors."""
+
+import pytest
+
+from baobab.pidslink_service.errors import (
+    PIDsLinkBadRequestError,
+    PIDsLinkError,
+    PIDsLinkForbiddenError,
+    PIDsLinkGoneError,
+    PIDsLinkNoContentError,
+    PIDsLinkNotFoundError,
+    PIDsLinkPreconditionError,
+    PIDsLinkRequestError,
+    PIDsLinkServerError,
+    PIDsLinkTooManyRequestsError,
+    PIDsLinkUnauthorizedError,
+)
+
+
+@pytest.mark.parametrize(
+    "status, error_cls",
+    [
+        (204, PIDsLinkNoContentError),
+        (400, PIDsLinkBadRequestError),
+        (401, PIDsLinkUnauthorizedError),
+        (403, PIDsLinkForbiddenError),
+        (404, PIDsLinkNotFoundError),
+        (410, PIDsLinkGoneError),
+        (412, PIDsLinkPreconditionError),
+        (429, PIDsLinkTooManyRequestsError),
+    ],
+)
+def test_factory_request_errors(status, error_cls):
+    error = PIDsLinkError.factory(status, "message")
+    assert type(error) is error_cls
+    assert isinstance(error, PIDsLinkRequestError)
+    assert error.args == ("message",)
+
+
+@pytest.mark.parametrize("status", [500, 502, 503])
+def test_factory_server_errors(status):
+    assert type(PIDsLinkError.factory(status)) is PIDsLinkServerError
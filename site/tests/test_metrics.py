@@ -0,0 +1,67 @@
+"""Tests of the PIDsLink client metrics."""
+
+import fakeredis
+import pytest
+
+from baobab.pidslink_service.metrics import MetricsRegistry
+
+
+class CountingRedis(fakeredis.FakeRedis):
+    """Redis client counting the pipelines executed."""
+
+    executed = 0
+
+    def pipeline(self, *args, **kwargs):
+        pipe = super().pipeline(*args, **kwargs)
+        execute = pipe.execute
+
+        def _execute(*args, **kwargs):
+            CountingRedis.executed += 1
+            return execute(*args, **kwargs)
+
+        pipe.execute = _execute
+        return pipe
+
+
+@pytest.fixture(params=["local", "redis"])
+def registry(request):
+    """Metrics registry aggregating in process or in Redis."""
+    if request.param == "local":
+        return MetricsRegistry(buckets=(0.1, 1))
+    return MetricsRegistry(redis=fakeredis.FakeRedis(), buckets=(0.1, 1))
+
+
+def test_empty_buckets_are_rendered(registry):
+    registry.observe("pidslink_request_duration_seconds", 0.5, operation="get")
+
+    name = "pidslink_request_duration_seconds"
+    lines = registry.render().splitlines()
+    assert f'{name}_bucket{{le="0.1",operation="get"}} 0' in lines
+    assert f'{name}_bucket{{le="1",operation="get"}} 1' in lines
+    assert f'{name}_bucket{{le="+Inf",operation="get"}} 1' in lines
+    assert f'{name}_count{{operation="get"}} 1' in lines
+
+
+def test_track_records_error_and_duration(registry):
+    with pytest.raises(ValueError):
+        with registry.track("get"):
+            raise ValueError()
+
+    samples = registry.collect()
+    assert samples[
+        ("pidslink_errors_total", (("error", "ValueError"), ("operation", "get")))
+    ] == 1
+    assert samples[
+        ("pidslink_request_duration_seconds_count", (("operation", "get"),))
+    ] == 1
+
+
+def test_track_uses_a_single_round_trip():
+    registry = MetricsRegistry(redis=CountingRedis())
+    CountingRedis.executed = 0
+
+    with pytest.raises(ValueError):
+        with registry.track("get"):
+            raise ValueError()
+
+    assert CountingRedis.executed == 1
@@ -0,0 +1,29 @@
+"""Tests of the pre-rendered OAI-PMH responses."""
+
+from datetime import datetime
+
+import pytest
+
+from baobab.oai.response import OAIError, decode_token, encode_token, is_own_token
+
+
+def test_token_roundtrip():
+    token = encode_token({"after": [datetime(2024, 5, 1, 12).isoformat(), 42]})
+
+    assert is_own_token(token)
+    assert decode_token(token)["after"] == [datetime(2024, 5, 1, 12), 42]
+
+
+@pytest.mark.parametrize(
+    "token",
+    [
+        # issued by the OAI-PMH server of Invenio
+        "eyJzZXEiOjF9.ZmxhdGVzdA.x1y2z3",
+        "baobab.not-base64!",
+        "baobab.e30=",
+    ],
+)
+def test_foreign_or_invalid_token(token):
+    with pytest.raises(OAIError) as error:
+        decode_token(token)
+    assert error.value.code == "badResumptionToken"
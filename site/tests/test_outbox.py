@@ -0,0 +1,159 @@
+"""Tests of the merging of PIDsLink outbox operations."""
+
+from datetime import datetime, timedelta
+
+from baobab.pidslink.models import OutboxOperation, OutboxStatus, PIDsLinkOutbox
+from baobab.pidslink.tasks import _sent_fields
+
+ARK = "ark:/13030/xf93gt2q"
+
+
+def _entries(ark=ARK):
+    """Get the operations of an ARK, in order."""
+    return PIDsLinkOutbox.query.filter_by(ark=ark).order_by(PIDsLinkOutbox.id).all()
+
+
+def test_updates_are_merged(db):
+    PIDsLinkOutbox.add(ARK, OutboxOperation.UPDATE, {"metadata": {"what": "a"}})
+    PIDsLinkOutbox.add(ARK, OutboxOperation.UPDATE, {"url": "https://x.org/a"})
+    PIDsLinkOutbox.add(ARK, OutboxOperation.UPDATE, {"metadata": {"what": "b"}})
+    db.session.flush()
+
+    (entry,) = _entries()
+    assert entry.operation == OutboxOperation.UPDATE
+    assert entry.payload == {"metadata": {"what": "b"}, "url": "https://x.org/a"}
+
+
+def test_update_then_hide_is_merged(db):
+    PIDsLinkOutbox.add(ARK, OutboxOperation.UPDATE, {"metadata": {"what": "a"}})
+    PIDsLinkOutbox.add(ARK, OutboxOperation.HIDE, {"url": "https://x.org/a"})
+    db.session.flush()
+
+    (entry,) = _entries()
+    assert entry.operation == OutboxOperation.HIDE
+
+
+def test_update_is_merged_into_registration(db):
+    PIDsLinkOutbox.add(ARK, OutboxOperation.REGISTER, {"url": "https://x.org/a"})
+    PIDsLinkOutbox.add(ARK, OutboxOperation.UPDATE, {"metadata": {"what": "a"}})
+    db.session.flush()
+
+    (entry,) = _entries()
+    assert entry.operation == OutboxOperation.REGISTER
+    assert entry.payload == {"url": "https://x.org/a", "metadata": {"what": "a"}}
+
+
+def test_hide_is_not_merged_into_registration(db):
+    PIDsLinkOutbox.add(ARK, OutboxOperation.REGISTER, {"url": "https://x.org/a"})
+    PIDsLinkOutbox.add(ARK, OutboxOperation.HIDE)
+    db.session.flush()
+
+    register, hide = _entries()
+    assert register.operation == OutboxOperation.REGISTER
+    assert hide.operation == OutboxOperation.HIDE
+
+
+def test_registration_is_never_merged(db):
+    PIDsLinkOutbox.add(ARK, OutboxOperation.UPDATE, {"metadata": {"what": "a"}})
+    PIDsLinkOutbox.add(ARK, OutboxOperation.REGISTER, {"url": "https://x.org/a"})
+    db.session.flush()
+
+    assert [e.operation for e in _entries()] == [
+        OutboxOperation.UPDATE,
+        OutboxOperation.REGISTER,
+    ]
+
+
+def test_attempted_operation_is_not_merged(db):
+    first = PIDsLinkOutbox.add(ARK, OutboxOperation.UPDATE, {"url": "https://x.org/a"})
+    db.session.flush()
+    first.attempts = 1
+    PIDsLinkOutbox.add(ARK, OutboxOperation.UPDATE, {"url": "https://x.org/b"})
+    db.session.flush()
+
+    first, second = _entries()
+    assert first.payload == {"url": "https://x.org/a"}
+    assert second.payload == {"url": "https://x.org/b"}
+
+
+def test_sent_operation_is_not_merged(db):
+    first = PIDsLinkOutbox.add(ARK, OutboxOperation.UPDATE, {"url": "https://x.org/a"})
+    db.session.flush()
+    first.status = OutboxStatus.DONE
+    PIDsLinkOutbox.add(ARK, OutboxOperation.UPDATE, {"url": "https://x.org/b"})
+    db.session.flush()
+
+    assert len(_entries()) == 2
+
+
+def test_only_the_latest_operation_is_merged_into(db):
+    PIDsLinkOutbox.add(ARK, OutboxOperation.REGISTER, {"url": "https://x.org/a"})
+    PIDsLinkOutbox.add(ARK, OutboxOperation.HIDE)
+    PIDsLinkOutbox.add(ARK, OutboxOperation.UPDATE, {"metadata": {"what": "a"}})
+    db.session.flush()
+
+    register, update = _entries()
+    assert register.payload == {"url": "https://x.org/a"}
+    # the update after the hide makes the ARK visible again
+    assert update.operation == OutboxOperation.UPDATE
+    assert update.payload == {"metadata": {"what": "a"}}
+
+
+def test_debounce_is_bounded(db):
+    entry = PIDsLinkOutbox.add(ARK, OutboxOperation.UPDATE, {"url": "https://x.org/a"})
+    entry.created = datetime.utcnow() - timedelta(seconds=115)
+    entry.available_at = entry.created + timedelta(seconds=10)
+    db.session.flush()
+    PIDsLinkOutbox.add(ARK, OutboxOperation.UPDATE, {"url": "https://x.org/b"})
+    db.session.flush()
+
+    (entry,) = _entries()
+    # quiet window of 10 seconds, capped 120 seconds after the first write
+    assert entry.available_at == entry.created + timedelta(seconds=120)
+
+
+def test_add_many(db):
+    other = "ark:/13030/xf93gt3r"
+    entries = PIDsLinkOutbox.add_many(
+        [
+            (ARK, OutboxOperation.UPDATE, {"url": "https://x.org/a"}),
+            (other, OutboxOperation.UPDATE, {"url": "https://x.org/c"}),
+            (ARK, OutboxOperation.UPDATE, {"url": "https://x.org/b"}),
+        ]
+    )
+    db.session.flush()
+
+    assert entries[0] is entries[2]
+    assert [e.payload for e in _entries()] == [{"url": "https://x.org/b"}]
+    assert [e.payload for e in _entries(other)] == [{"url": "https://x.org/c"}]
+
+
+def test_pending_operations(db):
+    other = "ark:/13030/xf93gt3r"
+    PIDsLinkOutbox.add(ARK, OutboxOperation.REGISTER, {"url": "https://x.org/a"})
+    PIDsLinkOutbox.add(ARK, OutboxOperation.HIDE)
+    sent = PIDsLinkOutbox.add(other, OutboxOperation.UPDATE, {"url": "https://x.org/c"})
+    sent.status = OutboxStatus.DONE
+    db.session.flush()
+
+    assert PIDsLinkOutbox.pending_operations([ARK, other]) == {
+        ARK: OutboxOperation.HIDE
+    }
+
+
+def test_sent_fields():
+    update = PIDsLinkOutbox(
+        operation=OutboxOperation.UPDATE,
+        payload={
+            "url": "https://x.org/a",
+            "metadata": {"what": "a", "event": "publish"},
+        },
+    )
+    hide = PIDsLinkOutbox(
+        operation=OutboxOperation.HIDE,
+        payload={"url": "https://x.org/a", "metadata": {"what": "a"}},
+    )
+
+    # PIDsLink is not sent the metadata of a hide, nor holds the event
+    assert _sent_fields(update) == {"url": "https://x.org/a", "metadata": {"what": "a"}}
+    assert _sent_fields(hide) == {"url": "https://x.org/a"}
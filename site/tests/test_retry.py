@@ -0,0 +1,137 @@
+"""Tests of the retry policy of the PIDsLink client."""
+
+import time
+from email.utils import formatdate
+
+from http.client import RemoteDisconnected
+
+import pytest
+from requests.exceptions import ConnectionError, ConnectTimeout, ReadTimeout
+from urllib3.exceptions import MaxRetryError, NewConnectionError, ProtocolError
+
+from baobab.pidslink_service.retry import RetryBudget, RetryPolicy
+
+
+class Response(object):
+    """Minimal response of a failed attempt."""
+
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+def _raised_from(error, cause):
+    """Raise ``error`` while handling ``cause``, as requests does."""
+    try:
+        try:
+            raise cause
+        except Exception:
+            raise error
+    except Exception as e:
+        return e
+
+
+@pytest.fixture()
+def policy(monkeypatch):
+    """Retry policy backing off by the maximum of the jitter."""
+    monkeypatch.setattr("random.uniform", lambda low, high: high)
+    return RetryPolicy(
+        max_attempts=3,
+        backoff_base=0.5,
+        backoff_max=8,
+        deadline=30,
+        budget=RetryBudget(ratio=0.2, min_tokens=10),
+    )
+
+
+def test_backoff_is_capped(policy):
+    assert policy.backoff(1) == 0.5
+    assert policy.backoff(2) == 1
+    assert policy.backoff(10) == 8
+
+
+def test_backoff_jitter():
+    policy = RetryPolicy(backoff_base=1, backoff_max=8)
+    delays = [policy.backoff(3) for _ in range(100)]
+    assert all(0 <= delay <= 4 for delay in delays)
+
+
+def test_delay_gives_up_after_max_attempts(policy):
+    started = time.monotonic()
+    assert policy.delay(2, started, "GET", response=Response(503)) == 1
+    assert policy.delay(3, started, "GET", response=Response(503)) is None
+
+
+@pytest.mark.parametrize("status", [400, 401, 403, 404, 410])
+def test_delay_client_errors(policy, status):
+    assert policy.delay(1, time.monotonic(), "GET", response=Response(status)) is None
+
+
+def test_delay_idempotent_errors(policy):
+    started = time.monotonic()
+    assert policy.delay(1, started, "PATCH", error=ReadTimeout()) == 0.5
+    assert policy.delay(1, started, "GET", response=Response(502)) == 0.5
+
+
+def test_delay_non_idempotent(policy):
+    started = time.monotonic()
+    # the request may have been processed
+    assert policy.delay(1, started, "POST", error=ReadTimeout()) is None
+    assert policy.delay(1, started, "POST", response=Response(500)) is None
+    assert policy.delay(1, started, "POST", response=Response(503)) is None
+    dropped = ProtocolError("Connection aborted.", RemoteDisconnected("closed"))
+    error = _raised_from(ConnectionError(dropped), dropped)
+    assert policy.delay(1, started, "POST", error=error) is None
+    # the request was certainly not processed
+    assert policy.delay(1, started, "POST", error=ConnectTimeout()) == 0.5
+    refused = MaxRetryError(None, "/", NewConnectionError(None, "refused"))
+    error = _raised_from(ConnectionError(refused), refused)
+    assert policy.delay(1, started, "POST", error=error) == 0.5
+    response = Response(429, {"Retry-After": "2"})
+    assert policy.delay(1, started, "POST", response=response) == 2
+
+
+def test_delay_retry_after(policy):
+    started = time.monotonic()
+    response = Response(503, {"Retry-After": "5"})
+    assert policy.delay(1, started, "GET", response=response) == 5
+    # the backoff wins when longer
+    response = Response(503, {"Retry-After": "0"})
+    assert policy.delay(1, started, "GET", response=response) == 0.5
+    response = Response(503, {"Retry-After": formatdate(time.time() + 10)})
+    assert 8 <= policy.delay(1, started, "GET", response=response) <= 10
+    response = Response(503, {"Retry-After": "soon"})
+    assert policy.delay(1, started, "GET", response=response) == 0.5
+
+
+def test_delay_deadline(policy):
+    started = time.monotonic() - 29.9
+    assert policy.delay(1, started, "GET", response=Response(503)) is None
+    response = Response(503, {"Retry-After": "60"})
+    assert policy.delay(1, time.monotonic(), "GET", response=response) is None
+
+
+def test_delay_budget(policy):
+    policy.budget = RetryBudget(ratio=0.5, min_tokens=1)
+    started = time.monotonic()
+    assert policy.delay(1, started, "GET", response=Response(503)) is not None
+    assert policy.delay(1, started, "GET", response=Response(503)) is None
+
+
+def test_budget():
+    budget = RetryBudget(ratio=0.2, min_tokens=2)
+    assert budget.withdraw()
+    assert budget.withdraw()
+    assert not budget.withdraw()
+    for _ in range(4):
+        budget.deposit()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert budget.withdraw()
+
+
+def test_budget_is_bounded():
+    budget = RetryBudget(ratio=0.5, min_tokens=2)
+    for _ in range(1000):
+        budget.deposit()
+    assert sum(budget.withdraw() for _ in range(100)) == 50
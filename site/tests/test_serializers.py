@@ -0,0 +1,86 @@
+"""Tests of the serializers of the metadata registered with ARKs."""
+
+from invenio_rdm_records.utils import ChainObject
+
+from baobab.pidslink.serializers import CachedSerializer
+from baobab.pidslink_service.cache import LRUCache
+
+
+class Record(dict):
+    """Stored record."""
+
+    def __init__(self, data, id_, revision_id):
+        """Constructor."""
+        super().__init__(data)
+        self.id = id_
+        self.revision_id = revision_id
+
+
+class CountingSerializer(object):
+    """Serializer counting its calls."""
+
+    def __init__(self):
+        """Constructor."""
+        self.calls = 0
+
+    def dump_obj(self, record):
+        """Dump the title of a record."""
+        self.calls += 1
+        return {"what": record.get("title")}
+
+
+def _serializer():
+    serializer = CountingSerializer()
+    return serializer, CachedSerializer(serializer, cache=LRUCache(maxsize=10))
+
+
+def test_revision_is_serialized_once():
+    serializer, cached = _serializer()
+    record = Record({"title": "A"}, "1", 1)
+
+    assert cached.dump_obj(record) == {"what": "A"}
+    assert cached.dump_obj(record) == {"what": "A"}
+    assert serializer.calls == 1
+
+
+def test_new_revision_is_serialized():
+    serializer, cached = _serializer()
+    cached.dump_obj(Record({"title": "A"}, "1", 1))
+
+    assert cached.dump_obj(Record({"title": "B"}, "1", 2)) == {"what": "B"}
+    assert serializer.calls == 2
+
+
+def test_record_without_revision_is_not_cached():
+    serializer, cached = _serializer()
+    record = Record({"title": "A"}, None, None)
+
+    cached.dump_obj(record)
+    cached.dump_obj(record)
+    assert serializer.calls == 2
+
+
+def test_dump_is_a_copy():
+    _, cached = _serializer()
+    record = Record({"title": "A"}, "1", 1)
+
+    cached.dump_obj(record)["what"] = "changed"
+    assert cached.dump_obj(record) == {"what": "A"}
+
+
+def test_chain_is_keyed_by_both_revisions():
+    serializer, cached = _serializer()
+    parent = Record({}, "p", 1)
+
+    def chain(record):
+        return ChainObject(
+            parent, record, aliases={"_parent": parent, "_child": record}
+        )
+
+    assert cached.dump_obj(chain(Record({"title": "A"}, "1", 1))) == {"what": "A"}
+    assert cached.dump_obj(chain(Record({"title": "A"}, "1", 1))) == {"what": "A"}
+    assert serializer.calls == 1
+    assert cached.dump_obj(chain(Record({"title": "B"}, "1", 2))) == {"what": "B"}
+    parent.revision_id = 2
+    cached.dump_obj(chain(Record({"title": "B"}, "1", 2)))
+    assert serializer.calls == 3